@@ -0,0 +1,2 @@
+# -*- coding: utf-8 -*-
+"""Расчетное ядро АРС: аналитические решения, обратное преобразование Лапласа и вспомогательные модули."""
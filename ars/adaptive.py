@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""Адаптивная сетка карты давления: сгущение к скважинам по логарифму радиуса.
+
+Давление вблизи скважины меняется как ln r, а вдали - медленно, поэтому вместо
+равномерной сетки узлы ставятся кольцами с постоянным отношением радиусов от rw
+(для горизонтальных стволов и трещин ГРП - софокусными эллипсами вокруг отрезка)
+в пределах области, где скважина ближайшая, и дополняются редкой фоновой сеткой
+по области. Источники вычисляются только в этих узлах, и значения линейно
+интерполируются по триангуляции узлов на равномерную сетку карты: карта (go.Contour),
+линии тока и передача в браузер работают с регулярной сеткой. Логарифмическая
+особенность вертикальных скважин (log_singularity) вычитается до интерполяции и
+добавляется в узлах сетки точно, так что интерполируется только гладкий остаток.
+Сетка окупается для дорогих источников (ограниченные пласты, трещины ГРП, горизонтальные
+стволы); линейный источник в бесконечном пласте дешевле считать в каждом узле карты.
+scipy.interpolate импортируется при первой интерполяции.
+"""
+
+import numpy as np
+
+from ars.sources import FRACTURE, HORIZONTAL
+
+# колец на декаду радиуса, лучей на кольцо и фоновых узлов по стороне области
+RINGS_PER_DECADE = 5
+RAYS = 16
+BACKGROUND = 20
+# радиус колец в шагах фоновой сетки
+RING_REACH = 2
+# число узлов на границе кругового пласта
+BOUNDARY_POINTS = 96
+
+
+# Полудлина отрезка источника вдоль оси x (горизонтальный ствол, трещина ГРП), м
+def source_half_length(item):
+    if not item:
+        return 0.0
+    if item.get('kind') == FRACTURE:
+        return float(item.get('half_length') or 0.0)
+    if item.get('kind') == HORIZONTAL:
+        return float(item.get('length') or 0.0) / 2
+    return 0.0
+
+
+# Радиусы колец от r_min до r_max по rings_per_decade на декаду
+def ring_radii(r_min, r_max, rings_per_decade=RINGS_PER_DECADE):
+    count = max(2, int(np.ceil(np.log10(r_max / r_min) * rings_per_decade)) + 1)
+    return np.logspace(np.log10(r_min), np.log10(r_max), count)
+
+
+# Узлы на краях квадрата [-extent, extent] в точках пересечения с кольцами радиусов radii вокруг
+# (x0, y0) и в основаниях перпендикуляров: у скважины рядом с краем кольца обрезаются краем,
+# и шаг узлов вдоль края должен сгущаться так же, как кольца
+def edge_points(x0, y0, radii, extent):
+    parts = []
+    for along, across in ((x0, y0), (y0, x0)):
+        for side in (-extent, extent):
+            d = abs(side - across)
+            r = radii[radii > d]
+            if r.size == 0:
+                continue
+            u = np.clip(along + np.concatenate([[0.0], np.sqrt(r ** 2 - d ** 2), -np.sqrt(r ** 2 - d ** 2)]),
+                        -extent, extent)
+            v = np.full(u.size, side)
+            parts.append(np.column_stack([u, v]) if across is y0 else np.column_stack([v, u]))
+    return np.concatenate(parts) if parts else np.zeros((0, 2))
+
+
+# Узлы вокруг скважины (x0, y0): софокусные эллипсы с фокусами (x0 +- half_length, y0),
+# малые полуоси - от r_min до r_max по RINGS_PER_DECADE на декаду (при half_length = 0 - окружности)
+def well_points(x0, y0, r_min, r_max, half_length=0.0, rings_per_decade=RINGS_PER_DECADE, rays=RAYS):
+    radii = ring_radii(r_min, r_max, rings_per_decade)
+    count = radii.size
+    # вдоль отрезка лучей больше, чтобы шаг у ствола был не крупнее шага по окружности r_max
+    rays = int(rays * (1 + 2 * half_length / r_max)) if half_length else rays
+    angle = np.linspace(0, 2 * np.pi, rays, endpoint=False)
+    # соседние кольца повернуты на полшага: треугольники ближе к равносторонним
+    angle = angle[None, :] + (np.arange(count)[:, None] % 2) * np.pi / rays
+    major = np.hypot(radii, half_length)[:, None]
+    return np.column_stack([(x0 + major * np.cos(angle)).ravel(), (y0 + radii[:, None] * np.sin(angle)).ravel()])
+
+
+class AdaptiveGrid:
+    # wells (W, 2) [м]; extent - полуширина квадратной области карты с центром в (0, 0);
+    # reservoir, r_e, a, b - модель пласта (узлы только внутри ограниченного пласта);
+    # geometry - описания скважин (ars/sources.py), rw - радиус первого кольца
+    def __init__(self, wells, extent, reservoir='infinite', r_e=500, a=1000, b=1000, geometry=None, rw=0.1,
+                 rings_per_decade=RINGS_PER_DECADE, rays=RAYS, background=BACKGROUND):
+        wells = np.asarray(wells, dtype=float)[:, :2]
+        self.extent = extent
+        self.reservoir, self.r_e, self.a, self.b = reservoir, r_e, a, b
+        half = np.array([source_half_length(item) for item in geometry or [{}] * len(wells)])
+
+        # фон - равномерная сетка с шагом step; кольца нужны, пока шаг между ними меньше фонового
+        # (до RING_REACH шагов фона). Из колец скважины остаются узлы, для которых она ближайшая
+        # (с учетом длины стволов), - сгущение к каждой скважине без наложения соседних колец
+        step = 2 * extent / background
+        r_max = max(RING_REACH * step, 10 * rw)
+        radii = ring_radii(rw, r_max, rings_per_decade)
+        parts = []
+        for i, ((x0, y0), l) in enumerate(zip(wells, half)):
+            points = np.concatenate([well_points(x0, y0, rw, r_max, l, rings_per_decade, rays),
+                                     edge_points(x0, y0, radii, extent)])
+            parts.append(points[np.argmin(self._distance(points, wells, half), axis=1) == i])
+
+        # узлы фона внутри колец не нужны; узлы на краях области остаются всегда
+        axis = np.linspace(-extent, extent, background + 1)
+        X, Y = np.meshgrid(axis, axis)
+        grid = np.column_stack([X.ravel(), Y.ravel()])
+        near = (self._distance(grid, wells, half) < r_max).any(axis=1)
+        edge = (np.abs(grid) >= extent).any(axis=1)
+        parts.append(grid[edge | ~near])
+        # узлы на границе ограниченного пласта: оболочка триангуляции повторяет контур
+        if reservoir == 'circle':
+            angle = np.linspace(0, 2 * np.pi, BOUNDARY_POINTS, endpoint=False)
+            parts.append(r_e * (1 - 1e-9) * np.column_stack([np.cos(angle), np.sin(angle)]))
+        elif reservoir == 'rectangle':
+            u = np.linspace(-a / 2, a / 2, int(np.ceil(a / step)) + 1)
+            v = np.linspace(-b / 2, b / 2, int(np.ceil(b / step)) + 1)
+            parts += [np.column_stack([u, np.full(u.size, side * b / 2)]) for side in (-1, 1)]
+            parts += [np.column_stack([np.full(v.size, side * a / 2), v]) for side in (-1, 1)]
+
+        points = np.concatenate(parts)
+        points = points[self.inside(points[:, 0], points[:, 1])
+                        & (np.abs(points) <= extent * (1 + 1e-9)).all(axis=1)]
+        # совпадающие узлы (кольца соседних скважин, фон) - один раз
+        self.points = np.unique(np.round(points, 9), axis=0)
+
+    # Расстояния (P, W) от точек до отрезков скважин полудлины half вдоль оси x
+    @staticmethod
+    def _distance(points, wells, half):
+        du = np.abs(points[:, None, 0] - wells[None, :, 0]) - half[None, :]
+        return np.hypot(np.maximum(du, 0), points[:, None, 1] - wells[None, :, 1])
+
+    # Маска точек внутри пласта (для бесконечного - все)
+    def inside(self, x, y):
+        if self.reservoir == 'circle':
+            return np.hypot(x, y) <= self.r_e
+        if self.reservoir == 'rectangle':
+            return (np.abs(x) <= self.a / 2) & (np.abs(y) <= self.b / 2)
+        return np.ones(np.shape(x), dtype=bool)
+
+    @property
+    def size(self):
+        return len(self.points)
+
+    # Значения func(x, y) в узлах сетки (x, y - одномерные массивы узлов)
+    def evaluate(self, func):
+        return np.asarray(func(self.points[:, 0], self.points[:, 1]))
+
+    # Линейная интерполяция значений в узлах (по триангуляции Делоне) на равномерную сетку осей x, y:
+    # массив (y.size, x.size); за пределами пласта - NaN, узлы у границы вне оболочки триангуляции -
+    # по ближайшему узлу.
+    # singular(x, y) - известная особая часть поля (см. log_singularity): интерполируется только
+    # гладкий остаток, а особая часть вычисляется в узлах сетки точно
+    def interpolate(self, values, x, y, dtype=np.float64, singular=None):
+        from scipy.interpolate import LinearNDInterpolator, NearestNDInterpolator
+        X, Y = np.meshgrid(x, y)
+        values = np.asarray(values, dtype=float)
+        if singular is not None:
+            values = values - singular(self.points[:, 0], self.points[:, 1])
+        result = LinearNDInterpolator(self.points, values)(X, Y)
+        inside = self.inside(X, Y)
+        missing = inside & ~np.isfinite(result)
+        if missing.any():
+            valid = np.isfinite(values)
+            result[missing] = NearestNDInterpolator(self.points[valid], values[valid])(X[missing], Y[missing])
+        if singular is not None:
+            result += singular(X, Y)
+        result[~inside] = np.nan
+        return result.astype(dtype)
+
+
+# Логарифмическая особенность вертикальных скважин: sum_i strength_i * ln(max(r_i, rw)),
+# где strength_i = -q_i B mu / (2 pi k h) - наклон депрессии по ln r у скважины i
+# (0 - скважина без такой особенности: горизонтальный ствол, трещина ГРП)
+def log_singularity(wells, strengths, rw=0.1):
+    wells = np.asarray(wells, dtype=float)[:, :2]
+    strengths = np.asarray(strengths, dtype=float)
+    active = strengths != 0
+
+    def singular(x, y):
+        result = np.zeros(np.shape(x))
+        for (x0, y0), strength in zip(wells[active], strengths[active]):
+            result += strength * np.log(np.maximum(np.hypot(x - x0, y - y0), rw))
+        return result
+    return singular
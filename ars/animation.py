@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""Кадры анимации карты давления во времени.
+
+TimeLapse считает карты депрессии на логарифмической шкале времени порциями по
+несколько кадров (compute), так что первые кадры можно показывать, пока остальные
+еще не рассчитаны. В интерфейсе каждая порция - задача фоновой очереди (ars/jobs.py),
+готовые порции собираются в frames через collect; advance считает следующую порцию
+в текущем потоке. Расстояния от узлов карты до вертикальных скважин в бесконечном
+пласте вычисляются один раз при создании и используются для всех времен: порция
+кадров - одно broadcast-вычисление ядра (скважины x узлы x времена порции).
+Скважины со сложной геометрией и ограниченные пласты считаются через reservoir_pressure
+сразу для всех времен порции.
+"""
+
+import threading
+
+import numpy as np
+
+from ars.bounded import NO_FLOW
+from ars.grid import Grid
+from ars.model import MAP_DTYPE, MAP_SIZE, MAP_TIME, map_extent, reservoir_pressure
+from ars.solutions import pd_ei
+from ars.sources import VERTICAL
+
+# число кадров, кадров в порции и начальный момент шкалы времени, с
+FRAME_COUNT = 24
+FRAME_BATCH = 4
+FIRST_TIME = 3600
+
+
+class TimeLapse:
+    # Параметры модели - как у run_model; times - моменты кадров [с]
+    # (по умолчанию FRAME_COUNT моментов от часа до MAP_TIME в логарифмическом масштабе)
+    def __init__(self, B, k, h, f, ct, mu, PI, wells, rates, reservoir='infinite', boundary=NO_FLOW, r_e=500,
+                 a=1000, b=1000, geometry=None, times=None, map_size=MAP_SIZE, batch=FRAME_BATCH, rw=0.1):
+        self.times = np.logspace(np.log10(FIRST_TIME), np.log10(MAP_TIME), FRAME_COUNT) if times is None \
+            else np.asarray(times, dtype=float)
+        self.batch = batch
+        self.rw = rw
+        wells = np.asarray(wells, dtype=float)
+        rates = np.asarray(rates, dtype=float)
+        grid = Grid.from_extent(map_extent(reservoir, wells, r_e, a, b), nx=map_size, dtype=MAP_DTYPE)
+        self.x, self.y = grid.x, grid.y
+        self.kernel = dict(B=B, k=k, h=h, mu=mu, eta=k / (mu * f * ct), f=f)
+        geometry = list(geometry or [{}] * len(rates))
+
+        # вертикальные скважины на всю толщину в бесконечном пласте - через сетку расстояний,
+        # остальные (и все скважины ограниченного пласта) - через reservoir_pressure
+        plain = np.array([reservoir == 'infinite' and item.get('kind', VERTICAL) == VERTICAL
+                          and not 0 < (item.get('penetration') or h) < h for item in geometry], dtype=bool)
+        self.rates = rates[plain]
+        self.distances = np.stack([np.maximum(grid.distance(w)[0], rw) for w in wells[plain]]) if plain.any() \
+            else None
+        self.others = None
+        if not plain.all():
+            self.others = dict(reservoir=reservoir, boundary=boundary, wells=wells[~plain, :2], rates=rates[~plain],
+                               r_e=r_e, a=a, b=b, geometry=[g for g, p in zip(geometry, plain) if not p] or None)
+        self.frames = []
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    # в процесс очереди передаются параметры и расстояния, без кадров и блокировки
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['frames'] = []
+        state.pop('_lock')
+        state.pop('_pending')
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self._pending = {}
+
+    @property
+    def done(self):
+        return len(self.frames) >= self.times.size
+
+    # Порции кадров: пары (start, stop) по batch кадров
+    def batches(self):
+        return [(start, min(start + self.batch, self.times.size)) for start in range(0, self.times.size, self.batch)]
+
+    # Кадры [МПа] для моментов times[start:stop]
+    def compute(self, start, stop):
+        t = self.times[start:stop]
+        p = np.zeros((self.y.size, self.x.size, t.size))
+        with np.errstate(under='ignore'):
+            if self.distances is not None:
+                unit = pd_ei(self.distances[..., None], t, q=1.0, **self.kernel)
+                p += np.tensordot(self.rates, unit, axes=1)
+            if self.others is not None:
+                X, Y = np.meshgrid(self.x, self.y)
+                p += reservoir_pressure(x=X, y=Y, t=t, r_min=self.rw, **self.others, **self.kernel)
+        return [(p[..., i] / 1000000).astype(MAP_DTYPE) for i in range(t.size)]
+
+    # Добавить рассчитанную порцию, начинающуюся с кадра start (порции могут приходить
+    # в любом порядке); возвращает число готовых кадров подряд с начала
+    def collect(self, start, frames):
+        with self._lock:
+            if start >= len(self.frames):
+                self._pending[start] = frames
+            while len(self.frames) in self._pending:
+                self.frames.extend(self._pending.pop(len(self.frames)))
+            return len(self.frames)
+
+    # Расчет следующей порции кадров в текущем потоке; возвращает число готовых кадров
+    def advance(self):
+        with self._lock:
+            if self.done:
+                return len(self.frames)
+            start = len(self.frames)
+            self.frames.extend(self.compute(start, start + self.batch))
+            return len(self.frames)
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""Пакетный расчет сценариев без интерфейса.
+
+    python -m ars.batch scenarios.json -o results.npz -j 8
+
+Файл сценариев - JSON (список сценариев или {"defaults": {...}, "scenarios": [...]})
+или CSV (строка - сценарий с одной скважиной). Поля называются так же, как в
+table-geo и params_model_well_table, плюс 'Название', 'Модель пласта', 'Модель границ'
+и 'Скважины' (список словарей с полями table_wells и params_model_well_table).
+Сценарии распределяются по процессам; кривые давления и карты пишутся в npz
+(или Parquet при установленном pyarrow) столбцами по всем сценариям, в конце
+выводится производительность.
+"""
+
+import argparse
+import csv
+import json
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from ars.model import MAP_DTYPE, MAP_SIZE, run_model
+from ars.scenarios import GEO_FIELDS, model_params, scenario_tables
+
+# поля сценария, не относящиеся к скважине (для CSV с одной скважиной)
+SCENARIO_FIELDS = {name for name, *_ in GEO_FIELDS} | {'Название', 'Модель пласта', 'Модель границ'}
+
+
+# Сценарии из файла JSON или CSV; каждому без 'Название' присваивается номер
+def load_scenarios(path):
+    if path.lower().endswith('.csv'):
+        with open(path, encoding='utf-8-sig', newline='') as f:
+            sample = f.read(4096)
+            f.seek(0)
+            dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+            scenarios = []
+            for row in csv.DictReader(f, dialect=dialect):
+                row = {name: value for name, value in row.items() if value not in (None, '')}
+                well = {name: value for name, value in row.items() if name not in SCENARIO_FIELDS}
+                scenario = {name: value for name, value in row.items() if name in SCENARIO_FIELDS}
+                if well:
+                    scenario['Скважины'] = [well]
+                scenarios.append(scenario)
+    else:
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            defaults = data.get('defaults', {})
+            scenarios = [dict(defaults, **scenario) for scenario in data.get('scenarios', [])]
+        else:
+            scenarios = list(data)
+    for i, scenario in enumerate(scenarios):
+        scenario.setdefault('Название', 'scenario_{}'.format(i + 1))
+    return scenarios
+
+
+# Расчет одного сценария в процессе-исполнителе: (результат, ошибка)
+def run_scenario(scenario, map_size=MAP_SIZE):
+    start = time.perf_counter()
+    try:
+        params = model_params(*scenario_tables(scenario))
+        curve, contour, _ = run_model(map_size=map_size, **params)
+    except Exception as error:
+        return None, '{}: {}'.format(type(error).__name__, error)
+    return {'t': np.asarray(curve[0]), 'p': np.asarray(curve[1]), 'x': np.asarray(contour[0]),
+            'y': np.asarray(contour[1]), 'map': np.asarray(contour[2], dtype=MAP_DTYPE),
+            'elapsed': time.perf_counter() - start}, None
+
+
+# Расчет списка сценариев на workers процессах (workers=1 - в текущем процессе).
+# progress(done, total) вызывается по мере готовности. Возвращает (результаты, ошибки, время)
+def run_batch(scenarios, workers=None, map_size=MAP_SIZE, progress=None):
+    results = [None] * len(scenarios)
+    errors = {}
+    start = time.perf_counter()
+
+    def collect(i, outcome, done):
+        results[i], error = outcome
+        if error is not None:
+            errors[i] = error
+        if progress is not None:
+            progress(done, len(scenarios))
+
+    if workers == 1:
+        for i, scenario in enumerate(scenarios):
+            collect(i, run_scenario(scenario, map_size), i + 1)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(run_scenario, scenario, map_size): i for i, scenario in enumerate(scenarios)}
+            for done, future in enumerate(as_completed(futures), 1):
+                collect(futures[future], future.result(), done)
+    return results, errors, time.perf_counter() - start
+
+
+# Столбцы результатов: массивы по всем сценариям (NaN для сценариев с ошибкой)
+def _columns(scenarios, results, errors):
+    ok = [r for r in results if r is not None]
+    n = len(scenarios)
+    t = ok[0]['t'] if ok else np.zeros(0)
+    ny, nx = ok[0]['map'].shape if ok else (0, 0)
+    columns = {
+        'name': np.array([str(s['Название']) for s in scenarios]),
+        'ok': np.array([r is not None for r in results]),
+        'error': np.array([errors.get(i, '') for i in range(n)]),
+        'elapsed': np.array([r['elapsed'] if r is not None else np.nan for r in results]),
+        't': t,
+        'p_well': np.full((n, t.size), np.nan, dtype=np.float32),
+        'x': np.full((n, nx), np.nan, dtype=np.float32),
+        'y': np.full((n, ny), np.nan, dtype=np.float32),
+        'map': np.full((n, ny, nx), np.nan, dtype=MAP_DTYPE),
+    }
+    for i, r in enumerate(results):
+        if r is not None:
+            columns['p_well'][i] = r['p']
+            if r['map'].size:
+                columns['x'][i], columns['y'][i], columns['map'][i] = r['x'], r['y'], r['map']
+    return columns
+
+
+def write_npz(path, scenarios, results, errors, compress=False):
+    (np.savez_compressed if compress else np.savez)(path, **_columns(scenarios, results, errors))
+
+
+# Parquet: строка - сценарий, кривые и карты - списки; pyarrow подключается только здесь
+def write_parquet(path, scenarios, results, errors):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError('Для записи Parquet нужен пакет pyarrow (pip install pyarrow) - используйте .npz')
+    columns = _columns(scenarios, results, errors)
+    n = columns['name'].size
+    table = pa.table({
+        'name': columns['name'].tolist(),
+        'ok': columns['ok'].tolist(),
+        'error': columns['error'].tolist(),
+        'elapsed': columns['elapsed'],
+        't': [columns['t']] * n,
+        'p_well': list(columns['p_well']),
+        'x': list(columns['x']),
+        'y': list(columns['y']),
+        'map': [m.ravel() for m in columns['map']],
+    })
+    pq.write_table(table, path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m ars.batch', description='Пакетный расчет сценариев АРС')
+    parser.add_argument('scenarios', help='файл сценариев (.json или .csv)')
+    parser.add_argument('-o', '--output', default='results.npz', help='файл результатов (.npz или .parquet)')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='число процессов (по умолчанию - все ядра)')
+    parser.add_argument('--map-size', type=int, default=MAP_SIZE, help='узлов карты по оси, 0 - без карт')
+    parser.add_argument('--compress', action='store_true', help='сжатый npz')
+    parser.add_argument('-q', '--quiet', action='store_true', help='без индикатора выполнения')
+    args = parser.parse_args(argv)
+
+    scenarios = load_scenarios(args.scenarios)
+    if not scenarios:
+        print('В файле {} нет сценариев'.format(args.scenarios), file=sys.stderr)
+        return 1
+
+    def progress(done, total):
+        if not args.quiet and (done == total or done % max(1, total // 100) == 0):
+            print('\r{}/{}'.format(done, total), end='', file=sys.stderr, flush=True)
+
+    results, errors, elapsed = run_batch(scenarios, args.workers, args.map_size, progress)
+    if not args.quiet:
+        print(file=sys.stderr)
+    if args.output.lower().endswith('.parquet'):
+        write_parquet(args.output, scenarios, results, errors)
+    else:
+        write_npz(args.output, scenarios, results, errors, args.compress)
+
+    cpu = sum(r['elapsed'] for r in results if r is not None)
+    print('Сценариев: {}, ошибок: {}, время {:.2f} с, {:.2f} сценариев/с, {:.3f} с на сценарий в процессе'.format(
+        len(scenarios), len(errors), elapsed, len(scenarios) / elapsed, cpu / max(1, len(scenarios) - len(errors))))
+    for i, error in sorted(errors.items())[:10]:
+        print('  {}: {}'.format(scenarios[i]['Название'], error), file=sys.stderr)
+    print('Результаты: {}'.format(args.output))
+    return 0 if not errors else 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
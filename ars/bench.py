@@ -0,0 +1,345 @@
+# -*- coding: utf-8 -*-
+"""Набор замеров скорости и точности расчетных ядер.
+
+    python -m ars.bench [--quick] [-o bench.json] [--baseline base.json] [--save-baseline base.json] [--strict]
+
+Замеряются: ядра pd_ei и pd_lapl на сетках времени 10^2..10^6, скалярные ядра на mpmath
+(pd_lapl_1, pd_line_source_lapl), обращение Лапласа pd_ls_func каждым методом
+(stehfest, talbot, dehoog) и anaflow.get_lap_inv (если установлен), построение карты
+давления (как в run_model) на сетках 100^2..2000^2 для 1..500 скважин, в том числе через
+адаптивную сетку (ars/adaptive.py), расчет модели целиком и цепочку обратных вызовов
+Dash (запрос HTTP к серверу приложения main.py: постановка расчета on_data, опрос
+задания on_job, карта graph_contur). Точность - максимальная
+относительная ошибка по эталону mpmath с 30 знаками (для адаптивной сетки - отклонение
+от равномерной в долях размаха давления).
+Результаты пишутся в JSON и сравниваются с baseline (по умолчанию BASELINE_PATH -
+замеры --quick, сохраненные в пакете; на другой машине его следует пересохранить через
+--save-baseline): замедление больше допуска или рост ошибки считаются регрессией
+(код возврата 1). Без baseline сравнение пропускается с предупреждением, а с --strict
+(режим CI) это ошибка (код возврата 2).
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+import scipy
+
+from ars.adaptive import AdaptiveGrid, log_singularity
+from ars.grid import Grid
+from ars.laplace import DEFAULT_DEGREE, METHODS, get_lap_inv
+from ars.model import MAP_DTYPE, MAP_TIME, reservoir_pressure, run_model
+from ars.solutions import B, eta, h, k, mu, pd_ei, pd_lapl, pd_lapl_1, pd_line_source_lapl, pd_ls_func, q, rw
+
+TIME_SIZES = (10 ** 2, 10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6)
+MESH_SIZES = (100, 250, 500, 1000, 2000)
+WELL_COUNTS = (1, 10, 50, 100, 500)
+QUICK_TIME_SIZES = (10 ** 2, 10 ** 3, 10 ** 4)
+QUICK_MESH_SIZES = (100, 250)
+QUICK_WELL_COUNTS = (1, 10)
+# сетка карты при замере числа скважин
+WELL_MESH = 200
+# предельное число узлов обращения (времена x узлы метода) для одного вызова
+MAX_INVERSION_NODES = 2 * 10 ** 7
+# время на один замер: повторы до MIN_SECONDS, но не больше MAX_REPEATS
+MIN_SECONDS = 0.2
+MAX_REPEATS = 5
+# моменты для сравнения с эталоном, с
+REFERENCE_TIMES = np.logspace(1, 6, 16)
+REFERENCE_DPS = 30
+# допуск на замедление относительно baseline и порог шума по времени, с
+TOLERANCE = 1.5
+NOISE_SECONDS = 1e-3
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'bench_baseline.json')
+# пауза между опросами задания в замере обратных вызовов, с
+POLL_SECONDS = 0.01
+GROUPS = ('kernels', 'scalar_kernels', 'inversion', 'meshes', 'model', 'callbacks')
+
+
+# Время выполнения func (минимум по повторам), с
+def measure(func):
+    times = []
+    while len(times) < MAX_REPEATS and sum(times) < MIN_SECONDS:
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times), len(times)
+
+
+# Максимальная относительная ошибка
+def relative_error(values, reference):
+    values = np.asarray(values, dtype=float)
+    reference = np.asarray(reference, dtype=float)
+    return float(np.max(np.abs(values - reference) / np.abs(reference)))
+
+
+# Эталон линейного источника и решения с конечным радиусом скважины (mpmath, REFERENCE_DPS знаков)
+def reference_values(t):
+    import mpmath
+    with mpmath.workdps(REFERENCE_DPS):
+        scale = mpmath.mpf(q) * B * mu / (2 * mpmath.pi * k * h)
+        ei = [float(-scale / 2 * mpmath.ei(-mpmath.mpf(rw) ** 2 / (4 * mpmath.mpf(eta) * ti))) for ti in t]
+
+        def kernel(s):
+            u = mpmath.sqrt(s / eta)
+            return scale * mpmath.besselk(0, rw * u) / (s * rw * u * mpmath.besselk(1, rw * u))
+
+        lapl = [float(mpmath.invertlaplace(kernel, ti, method='talbot')) for ti in t]
+    return np.array(ei), np.array(lapl)
+
+
+class Bench:
+    def __init__(self, quick=False, log=print):
+        self.quick = quick
+        self.log = log
+        self.results = []
+        self._reference = None
+
+    @property
+    def reference(self):
+        if self._reference is None:
+            self._reference = reference_values(REFERENCE_TIMES)
+        return self._reference
+
+    def record(self, group, label, size, func, error=None, **extra):
+        seconds, repeats = measure(func)
+        entry = dict(name='{}/{}/{}'.format(group, label, size), group=group, label=label, size=size,
+                     seconds=seconds, repeats=repeats, error=error, **extra)
+        self.results.append(entry)
+        self.log('{:<42} {:>12.6f} с{}'.format(entry['name'], seconds,
+                                                '' if error is None else '   ошибка {:.2e}'.format(error)))
+        return entry
+
+    def skip(self, group, label, size, reason):
+        self.results.append(dict(name='{}/{}/{}'.format(group, label, size), group=group, label=label, size=size,
+                                 seconds=None, skipped=reason))
+        self.log('{:<42} {:>14}   {}'.format('{}/{}/{}'.format(group, label, size), '-', reason))
+
+    # Векторизованные ядра на сетках времени
+    def kernels(self):
+        ref_ei, _ = self.reference
+        error = relative_error(pd_ei(rw, REFERENCE_TIMES), ref_ei)
+        for n in QUICK_TIME_SIZES if self.quick else TIME_SIZES:
+            t = np.logspace(1, 6, n)
+            self.record('kernel', 'pd_ei', n, lambda: pd_ei(rw, t), error=error)
+            s = np.log(2) / t
+            self.record('kernel', 'pd_lapl', n, lambda: pd_lapl(s))
+
+    # Скалярные ядра на mpmath (цикл по точкам)
+    def scalar_kernels(self):
+        _, ref_lapl = self.reference
+        n = 10 if self.quick else 50
+        t = np.logspace(1, 6, n)
+        self.record('scalar', 'pd_lapl_1', n, lambda: [pd_lapl_1(np.log(2) / ti) for ti in t])
+        error = relative_error([float(pd_line_source_lapl(rw, ti)) for ti in REFERENCE_TIMES], ref_lapl)
+        self.record('scalar', 'pd_line_source_lapl', n, lambda: [pd_line_source_lapl(rw, ti) for ti in t],
+                    error=error)
+
+    # Обращение Лапласа каждым методом и anaflow.get_lap_inv
+    def inversion(self):
+        _, ref_lapl = self.reference
+        sizes = QUICK_TIME_SIZES if self.quick else TIME_SIZES
+        for method in METHODS:
+            error = relative_error(pd_ls_func(rw, REFERENCE_TIMES, method=method), ref_lapl)
+            for n in sizes:
+                if n * DEFAULT_DEGREE[method] > MAX_INVERSION_NODES:
+                    self.skip('inversion', method, n, 'больше {} узлов обращения'.format(MAX_INVERSION_NODES))
+                    continue
+                t = np.logspace(1, 6, n)
+                self.record('inversion', method, n, lambda: pd_ls_func(rw, t, method=method), error=error)
+        inverse = get_lap_inv(pd_lapl, r=rw)
+        error = relative_error(inverse(REFERENCE_TIMES), ref_lapl)
+        for n in sizes[:2]:
+            t = np.logspace(1, 6, n)
+            self.record('inversion', 'get_lap_inv', n, lambda: inverse(t), error=error)
+        try:
+            from anaflow import get_lap_inv as anaflow_lap_inv
+        except ImportError:
+            self.skip('inversion', 'anaflow', sizes[0], 'anaflow не установлен')
+            return
+        inverse = anaflow_lap_inv(pd_lapl, r=rw)
+        error = relative_error(inverse(REFERENCE_TIMES), ref_lapl)
+        for n in sizes[:2]:
+            t = np.logspace(1, 6, n)
+            self.record('inversion', 'anaflow', n, lambda: inverse(t), error=error)
+
+    # Карта давления на сетке (как в run_model) для разных размеров сетки и числа скважин
+    def meshes(self):
+        rng = np.random.default_rng(0)
+        params = dict(reservoir='infinite', boundary=None, r_e=500, a=1000, b=1000, t=MAP_TIME, r_min=rw,
+                      B=B, k=k, h=h, mu=mu, eta=eta)
+
+        def build(n, wells):
+            grid = Grid.from_extent(500, nx=n, dtype=MAP_DTYPE)
+            rates = np.full(len(wells), q)
+            return grid.evaluate(lambda X, Y, Z: reservoir_pressure(wells=wells, rates=rates, x=X, y=Y, **params))
+
+        # адаптивная сетка (ars/adaptive.py): ошибка - максимум отклонения от равномерной сетки
+        # в долях размаха давления на карте
+        def build_adaptive(n, wells):
+            grid = Grid.from_extent(500, nx=n, dtype=MAP_DTYPE)
+            rates = np.full(len(wells), q)
+            mesh = AdaptiveGrid(wells, 500, rw=rw)
+            values = mesh.evaluate(lambda x, y: reservoir_pressure(wells=wells, rates=rates, x=x, y=y, **params).ravel())
+            singular = log_singularity(wells, -rates * B * mu / (2 * np.pi * k * h), rw)
+            return mesh.interpolate(values, grid.x, grid.y, singular=singular)
+
+        for n in QUICK_MESH_SIZES if self.quick else MESH_SIZES:
+            wells = np.zeros((1, 2))
+            self.record('mesh', 'wells_1', n, lambda: build(n, wells))
+            uniform = build(n, wells)[0]
+            error = float(np.max(np.abs(build_adaptive(n, wells) - uniform)) / np.ptp(uniform))
+            self.record('mesh', 'adaptive_1', n, lambda: build_adaptive(n, wells), error=error,
+                        points=AdaptiveGrid(wells, 500, rw=rw).size)
+        for count in QUICK_WELL_COUNTS if self.quick else WELL_COUNTS:
+            wells = rng.uniform(-400, 400, (count, 2))
+            self.record('mesh', 'mesh_{}'.format(WELL_MESH), count, lambda: build(WELL_MESH, wells))
+
+    # Расчет модели целиком (кривая, карта и линии тока - задача обратного вызова on_data)
+    def model(self):
+        rng = np.random.default_rng(1)
+        for count in (1, 10):
+            wells = np.column_stack([rng.uniform(-200, 200, (count, 2)), np.zeros(count)])
+            wells[0] = 0
+            rates = np.full(count, q)
+            self.record('model', 'run_model', count,
+                        lambda: run_model(B, k, h, 0.3, 2.47e-9, mu, 34.47e6, wells, rates))
+
+    # Обратные вызовы Dash через тестовый клиент сервера приложения (с сериализацией JSON):
+    # расчет от нажатия Start до готовой карты без кэша и повторные запросы с готовым результатом
+    def callbacks(self):
+        try:
+            import main
+        except ImportError as error:
+            self.skip('callback', 'submit_to_map', 1, 'приложение недоступно: {}'.format(error))
+            return
+        client = DashClient(main.app)
+        geo = [{'Parameter': name, 'Value': value} for name, value in zip(main.params_geo_table,
+                                                                           main.values_geo_table)]
+
+        def submit():
+            job = client.call('local_job.data', geo, [], 1, [], None, 'Бесконечный', 'Непротекаемые')
+            return job['local_job']['data']
+
+        def poll(job):
+            while True:
+                response = client.call(JOB_OUTPUT, 0, job)
+                if response['job_poll']['disabled']:
+                    return response
+                time.sleep(POLL_SECONDS)
+
+        def contour(result):
+            return client.call('graph_contur.figure', 'Контурная карта', 1, time.time(), None,
+                               result['local_contur']['data'], result['local_line']['data'])
+
+        def cold():
+            main.model_cache.clear()
+            contour(poll(submit()))
+
+        try:
+            self.record('callback', 'submit_to_map', 1, cold)
+            job = submit()
+            result = poll(job)
+            self.record('callback', 'on_data_cached', 1, submit)
+            self.record('callback', 'on_job_cached', 1, lambda: poll(job))
+            self.record('callback', 'contour', 1, lambda: contour(result))
+        finally:
+            main.job_queue.shutdown()
+
+    def run(self, groups=None):
+        for name in groups or GROUPS:
+            getattr(self, name)()
+        return self.results
+
+
+# Ключ обратного вызова on_job в app.callback_map (несколько выходов)
+JOB_OUTPUT = '..local_param.data...local_contur.data...local_line.data...job_poll.disabled...job-status.children..'
+
+
+# Вызов обратных вызовов Dash запросом HTTP, как из браузера: входы и состояния - по порядку
+# объявления, результат - словарь {id: {свойство: значение}}
+class DashClient:
+    def __init__(self, app):
+        self.app = app
+        self.client = app.server.test_client()
+
+    def call(self, output, *values):
+        spec = self.app.callback_map[output]
+        count = len(spec['inputs'])
+        targets = [dict(zip(('id', 'property'), item.rsplit('.', 1))) for item in output.strip('.').split('...')]
+        payload = {'output': output, 'outputs': targets if output.startswith('..') else targets[0],
+                   'inputs': [dict(item, value=value) for item, value in zip(spec['inputs'], values[:count])],
+                   'state': [dict(item, value=value) for item, value in zip(spec['state'], values[count:])],
+                   'changedPropIds': ['{id}.{property}'.format(**spec['inputs'][0])]}
+        response = self.client.post('/_dash-update-component', json=payload)
+        if response.status_code != 200:
+            raise RuntimeError('Обратный вызов {}: HTTP {}'.format(output, response.status_code))
+        return response.get_json()['response']
+
+
+# Сведения об окружении для файла результатов
+def environment():
+    return {'python': platform.python_version(), 'numpy': np.__version__, 'scipy': scipy.__version__,
+            'platform': platform.platform(), 'processor': platform.processor(), 'cpus': os.cpu_count(),
+            'date': time.strftime('%Y-%m-%d %H:%M:%S')}
+
+
+# Сравнение с baseline: список (имя, отношение времен, ошибка, baseline ошибка, регрессия)
+def compare(results, baseline, tolerance=TOLERANCE):
+    previous = {entry['name']: entry for entry in baseline.get('results', [])}
+    rows = []
+    for entry in results:
+        old = previous.get(entry['name'])
+        if old is None or entry.get('seconds') is None or old.get('seconds') is None:
+            continue
+        ratio = entry['seconds'] / old['seconds']
+        slower = ratio > tolerance and entry['seconds'] - old['seconds'] > NOISE_SECONDS
+        error, old_error = entry.get('error'), old.get('error')
+        worse = error is not None and old_error is not None and error > 10 * old_error + 1e-15
+        rows.append((entry['name'], ratio, error, old_error, slower or worse))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m ars.bench', description='Замеры скорости и точности ядер АРС')
+    parser.add_argument('-o', '--output', default='bench.json', help='файл результатов JSON')
+    parser.add_argument('--quick', action='store_true', help='малые размеры задач')
+    parser.add_argument('--group', action='append', choices=GROUPS, help='только указанные группы')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='baseline для сравнения')
+    parser.add_argument('--strict', action='store_true', help='отсутствие baseline - ошибка (режим CI)')
+    parser.add_argument('--save-baseline', default=None, help='сохранить результаты как baseline')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE, help='допустимое замедление, раз')
+    args = parser.parse_args(argv)
+
+    bench = Bench(quick=args.quick)
+    results = bench.run(args.group)
+    report = {'environment': environment(), 'quick': args.quick, 'results': results}
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=1)
+
+    if args.save_baseline:
+        return 0
+    baseline_path = args.baseline
+    if not os.path.exists(baseline_path):
+        print('Baseline {} не найден, сравнение не выполнено'.format(baseline_path), file=sys.stderr)
+        return 2 if args.strict else 0
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    rows = compare(results, baseline, args.tolerance)
+    print('\nСравнение с {} ({})'.format(baseline_path, baseline.get('environment', {}).get('date', '')))
+    for name, ratio, error, old_error, regression in rows:
+        accuracy = '' if error is None else '   ошибка {:.2e} (было {:.2e})'.format(error, old_error or 0)
+        print('{:<42} {:>7.2f}x{}{}'.format(name, ratio, accuracy, '   РЕГРЕССИЯ' if regression else ''))
+    regressions = sum(row[-1] for row in rows)
+    print('Регрессий: {} из {}'.format(regressions, len(rows)))
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
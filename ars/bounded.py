@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""Решения для ограниченных пластов: круговой и прямоугольный.
+
+Круговой пласт радиуса r_e с центром в (0, 0): решение в пространстве Лапласа -
+линейный источник K0 плюс ряд по функциям Бесселя (теорема сложения Графа), который
+обеспечивает условие на границе (непротекаемая или постоянное давление). Члены ряда
+убывают как (r r0 / r_e^2)^n, поэтому хватает нескольких десятков.
+
+Прямоугольный пласт a x b с центром в (0, 0): функция Грина - произведение одномерных
+функций Грина по x и по y. Интеграл по времени делится на два участка (по аналогии
+с разбиением Эвальда): до tau* одномерные функции записываются суммой нескольких
+отражений (интеграл - сумма E1 по двумерным отражениям), после tau* - несколькими
+членами ряда Фурье (интеграл от экспонент берется аналитически). Число членов обоих
+рядов определяется заранее по точности tol, поэтому поздние времена не требуют
+тысяч отражений.
+"""
+
+import numpy as np
+import scipy.special as sc
+
+from ars.laplace import invert_laplace
+from ars.metrics import timed
+
+NO_FLOW = 'no_flow'
+CONSTANT_PRESSURE = 'constant_pressure'
+# смешанные: x-границы непротекаемые, y-границы - постоянное давление
+MIXED = 'mixed'
+BOUNDARIES = (NO_FLOW, CONSTANT_PRESSURE, MIXED)
+# граничные условия кругового пласта (смешанные для окружности не определены)
+CIRCLE_BOUNDARIES = (NO_FLOW, CONSTANT_PRESSURE)
+
+# бюджет памяти на блок расчета, байт
+CHUNK_BYTES = 64 * 2 ** 20
+
+
+def _check_boundary(boundary, allowed=BOUNDARIES):
+    if boundary not in allowed:
+        raise ValueError('Неподдерживаемое граничное условие {!r}, доступны: {}'.format(boundary, ', '.join(allowed)))
+
+
+# Изображение депрессии в круговом пласте [Па*с] для скважины в точке (x0, y0) и точек (x, y).
+# Массивы координат точек должны транслироваться с s
+def circle_lapl(s, x, y, x0, y0, r_e, boundary=NO_FLOW, q=1.0, B=1.0, k=1.0, h=1.0, mu=1.0, eta=1.0,
+                r_min=0.0, n_terms=30, tol=1e-8):
+    _check_boundary(boundary, CIRCLE_BOUNDARIES)
+    u = (s / eta) ** 0.5
+    d = np.maximum(np.hypot(x - x0, y - y0), r_min)
+    r = np.hypot(x, y)
+    r0 = np.hypot(x0, y0)
+    dtheta = np.arctan2(y, x) - np.arctan2(y0, x0)
+    # линейный источник
+    result = sc.kv(0, u * d)
+    # поправка от границы: sum eps_n cos(n dtheta) A_n I_n(u r0) I_n(u r),
+    # все функции Бесселя масштабированы (ive, kve), суммарный показатель экспоненты <= 0.
+    # Члены убывают не медленнее (r0 / r_e)^n - число членов выбирается по tol
+    if r0 == 0:
+        n_terms = 1
+    else:
+        n_terms = int(min(n_terms, np.ceil(np.log(tol) / np.log(min(r0 / r_e, 0.999))) + 1))
+    z = u * r_e
+    # в центре (r = 0) отличен от нуля только член n = 0: I_0(0) = 1
+    center = r == 0
+    zr = u * np.where(center, r_e, r)
+    # I_n(u r) по n - обратной рекуррентностью I_{n-1} = I_{n+1} + 2n / z I_n (устойчива для I_n),
+    # ряд суммируется от старших членов к младшим; общий масштабный множитель вынесен
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        i_next, i_cur = sc.ive(n_terms, zr), sc.ive(n_terms - 1, zr)
+        two_over_zr = 2 / zr
+        correction = 0
+        for n in range(n_terms - 1, -1, -1):
+            # множители, не зависящие от точки, считаются один раз на узел s
+            if boundary == NO_FLOW:
+                ratio = (sc.kve(abs(n - 1), z) + sc.kve(n + 1, z)) / (sc.ive(abs(n - 1), z) + sc.ive(n + 1, z))
+            else:
+                ratio = -sc.kve(n, z) / sc.ive(n, z)
+            coef = (1 if n == 0 else 2) * sc.ive(n, u * r0) * ratio
+            # переполнение возможно лишь при u r_e -> 0 (t много больше времени дренирования)
+            coef = np.where(np.isfinite(coef), coef, 0)
+            correction = correction + coef * np.cos(n * dtheta) * i_cur
+            if n > 0:
+                i_next, i_cur = i_cur, i_next + n * two_over_zr * i_cur
+        # ive масштабирована на exp(-|Re z|), kve - на exp(z)
+        correction = np.where(center, coef, correction) * np.exp(np.real(u) * (r0 + r - r_e) - u * r_e)
+    result = result + correction
+    return q * B * mu / (2 * np.pi * k * h) * result / s
+
+
+# Депрессия [Па] в круговом пласте от группы скважин в точках (x, y) на моменты t.
+# Результат имеет форму x.shape + t.shape
+@timed('kernel:circle_pressure')
+def circle_pressure(wells, rates, x, y, t, r_e, boundary=NO_FLOW, B=1.0, k=1.0, h=1.0, mu=1.0, eta=1.0,
+                    r_min=0.0, n_terms=30, method='stehfest', degree=None, chunk_bytes=CHUNK_BYTES, **kwargs):
+    wells = np.asarray(wells, dtype=float)
+    x = np.asarray(x, dtype=float)
+    y = np.broadcast_to(np.asarray(y, dtype=float), x.shape)
+    t = np.asarray(t, dtype=float)
+    px, py = x.ravel(), y.ravel()
+    tt = np.atleast_1d(t).ravel()
+    result = np.zeros((px.size, tt.size))
+    # времена не транслируются по точкам: множители ряда, зависящие только от s,
+    # считаются один раз на узел обращения, а не на каждую точку
+    positive = tt > 0
+    tp = tt[positive]
+    nodes = 2 * (degree or 20) + 1
+    chunk = int(max(1, chunk_bytes // (16 * nodes * max(tp.size, 1) * 4)))
+    for (x0, y0), q in zip(wells[:, :2], rates):
+        for p0 in range(0, px.size if tp.size else 0, chunk):
+            cx = px[p0:p0 + chunk, None, None]
+            cy = py[p0:p0 + chunk, None, None]
+            F = lambda s: circle_lapl(s, cx, cy, x0, y0, r_e, boundary, q=q, B=B, k=k, h=h, mu=mu, eta=eta,
+                                      r_min=r_min, n_terms=n_terms)
+            result[p0:p0 + chunk, positive] += invert_laplace(F, tp, method=method, degree=degree)
+    outside = np.hypot(px, py) > r_e
+    result[outside] = np.nan
+    return result.reshape(x.shape + t.shape)
+
+
+# Число отражений и гармоник для стороны L при границе tau*: хвосты рядов меньше tol
+def _series_sizes(L, eta, tau, tol):
+    log_tol = -np.log(tol)
+    n_images = int(np.ceil(np.sqrt(log_tol * eta * tau) / L)) + 1
+    n_modes = int(np.ceil(L / np.pi * np.sqrt(log_tol / (eta * tau)))) + 1
+    return n_images, n_modes
+
+
+# Отражения одномерной функции Грина на отрезке [0, L]: смещения u - u0 и знаки.
+# no_flow - отражения с +, constant_pressure - нечетные отражения с -
+def _images_1d(u, u0, L, n_images, no_flow):
+    shifts = 2 * L * np.arange(-n_images, n_images + 1)
+    direct = u[..., None] - u0 + shifts
+    mirror = u[..., None] + u0 + shifts
+    sign = 1.0 if no_flow else -1.0
+    return np.concatenate([direct, mirror], axis=-1), np.concatenate(
+        [np.ones(shifts.size), sign * np.ones(shifts.size)])
+
+
+# Моды ряда Фурье одномерной функции Грина на [0, L]: коэффициенты (..., n) и собственные числа
+def _modes_1d(u, u0, L, n_modes, eta, no_flow):
+    if no_flow:
+        n = np.arange(n_modes + 1)
+        coef = np.where(n == 0, 1.0, 2.0) / L * np.cos(n * np.pi * u[..., None] / L) * np.cos(n * np.pi * u0 / L)
+    else:
+        n = np.arange(1, n_modes + 1)
+        coef = 2.0 / L * np.sin(n * np.pi * u[..., None] / L) * np.sin(n * np.pi * u0 / L)
+    return coef, eta * (n * np.pi / L) ** 2
+
+
+# Депрессия [Па] в прямоугольном пласте a x b (центр в (0, 0)) от группы скважин.
+# Результат имеет форму x.shape + t.shape
+@timed('kernel:rectangle_pressure')
+def rectangle_pressure(wells, rates, x, y, t, a, b, boundary=NO_FLOW, B=1.0, k=1.0, h=1.0, mu=1.0, eta=1.0,
+                       f=1.0, r_min=0.0, tol=1e-8, split=0.05, chunk_bytes=CHUNK_BYTES, **kwargs):
+    _check_boundary(boundary)
+    wells = np.asarray(wells, dtype=float)
+    x = np.asarray(x, dtype=float)
+    y = np.broadcast_to(np.asarray(y, dtype=float), x.shape)
+    t = np.asarray(t, dtype=float)
+    tt = np.atleast_1d(t).ravel()
+    px, py = x.ravel() + a / 2, y.ravel() + b / 2
+    x_no_flow = boundary in (NO_FLOW, MIXED)
+    y_no_flow = boundary == NO_FLOW
+    # ct выражается через eta: qB / (f ct h) = q B mu eta / (k h)
+    c = B * mu * eta / (k * h)
+
+    # граница участков: tau* = split * min(a, b)^2 / eta, но не позже t
+    tau_star = split * min(a, b) ** 2 / eta
+    tau_s = np.minimum(tt, tau_star)
+    nix, nmx = _series_sizes(a, eta, tau_star, tol)
+    niy, nmy = _series_sizes(b, eta, tau_star, tol)
+
+    result = np.zeros((px.size, tt.size))
+    per_point = 8 * tt.size * max(4 * (2 * nix + 1) * (2 * niy + 1), (nmx + 1) * (nmy + 1))
+    chunk = int(max(1, chunk_bytes // per_point))
+    for (x0, y0), q in zip(wells[:, :2] + [a / 2, b / 2], rates):
+        for p0 in range(0, px.size, chunk):
+            cx, cy = px[p0:p0 + chunk], py[p0:p0 + chunk]
+            # ранний участок: сумма по двумерным отражениям, int exp(-d^2/4 eta tau) / (4 pi eta tau) dtau;
+            # E1 считается только там, где он не пренебрежимо мал
+            dx, sx = _images_1d(cx, x0, a, nix, x_no_flow)
+            dy, sy = _images_1d(cy, y0, b, niy, y_no_flow)
+            d2 = np.maximum(dx[:, :, None] ** 2 + dy[:, None, :] ** 2, r_min ** 2)
+            arg = d2[..., None] / (4 * eta * tau_s)
+            mask = arg < -np.log(tol) + 5
+            e1 = np.zeros(arg.shape)
+            e1[mask] = sc.exp1(arg[mask])
+            sign = sx[:, None] * sy[None, :]
+            early = np.einsum('ij,pijt->pt', sign, e1) / (4 * np.pi * eta)
+            # поздний участок: ряд Фурье, int_{tau_s}^{t} exp(-lambda tau) dtau
+            ax, lx = _modes_1d(cx, x0, a, nmx, eta, x_no_flow)
+            ay, ly = _modes_1d(cy, y0, b, nmy, eta, y_no_flow)
+            lam = lx[:, None] + ly[None, :]
+            with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+                span = np.where(lam[..., None] > 0,
+                                (np.exp(-lam[..., None] * tau_s) - np.exp(-lam[..., None] * tt)) / lam[..., None],
+                                tt - tau_s)
+            late = np.einsum('pi,pj,ijt->pt', ax, ay, span)
+            result[p0:p0 + chunk] += q * c * (early + late)
+    outside = (px < 0) | (px > a) | (py < 0) | (py > b)
+    result[outside] = np.nan
+    return result.reshape(x.shape + t.shape)
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""Кэш результатов расчета давления с вытеснением по LRU.
+
+Ключ строится из нормализованных параметров пласта и скважины (B, k, h, f, ct, mu, rw, q),
+временной сетки и названия модели (pd_ei, pd_lapl, pd_lapl_2), поэтому повторные
+нажатия Start / Stop и одинаковые сценарии разных пользователей не пересчитываются.
+Функции и классы входят в ключ по модулю и полному имени; лямбды, замыкания и связанные
+методы по имени не различаются, поэтому в ключе не допускаются (TypeError).
+"""
+
+import hashlib
+import sys
+import threading
+import types
+from collections import OrderedDict
+
+import numpy as np
+
+# число значащих цифр при нормализации параметров: 50e-15 и 5.0000000000001e-14 дают один ключ
+KEY_DIGITS = 12
+
+
+def _normalize(value):
+    if isinstance(value, np.ndarray):
+        arr = np.ascontiguousarray(value)
+        return ('array', arr.dtype.str, arr.shape, hashlib.sha1(arr.tobytes()).hexdigest())
+    if isinstance(value, (list, tuple)):
+        return tuple(_normalize(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((name, _normalize(v)) for name, v in value.items()))
+    if isinstance(value, (float, np.floating)):
+        return float('{:.{}g}'.format(float(value), KEY_DIGITS))
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    if callable(value):
+        return _callable_key(value)
+    return value
+
+
+# Функция или класс в ключе: (модуль, полное имя). Лямбды, вложенные функции и связанные методы
+# с одинаковым именем - разные объекты, ключ по имени их бы смешал
+def _callable_key(func):
+    qualname = getattr(func, '__qualname__', None)
+    owner = getattr(func, '__self__', None)
+    if qualname is None or '<' in qualname or (owner is not None and not isinstance(owner, types.ModuleType)):
+        raise TypeError('{!r} нельзя использовать в ключе кэша: нужна функция или класс верхнего уровня '
+                        'модуля'.format(func))
+    return ('callable', getattr(func, '__module__', None), qualname)
+
+
+# Ключ кэша: модель (функция или ее имя), временная сетка и именованные параметры
+def make_key(model, t, **params):
+    return (_normalize(model), _normalize(t)) + tuple((name, _normalize(params[name])) for name in sorted(params))
+
+
+# Короткий строковый ключ (для передачи в браузер, например в dcc.Store)
+def digest(key):
+    return hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+
+
+# Оценка объема результата в байтах: массивы numpy, вложенные списки/кортежи/словари, таблицы
+# pandas (memory_usage), фигуры plotly (по словарю to_plotly_json), объекты с атрибутом nbytes;
+# прочие объекты - sys.getsizeof без вложенных объектов
+def _nbytes(value):
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (list, tuple)):
+        return sum(_nbytes(v) for v in value) + 8 * len(value)
+    if isinstance(value, dict):
+        return sum(_nbytes(v) for v in value.values()) + 8 * len(value)
+    if hasattr(value, 'memory_usage'):
+        return int(np.sum(value.memory_usage(deep=True)))
+    if hasattr(value, 'to_plotly_json'):
+        return _nbytes(value.to_plotly_json())
+    if isinstance(getattr(value, 'nbytes', None), (int, np.integer)):
+        return int(value.nbytes)
+    return sys.getsizeof(value)
+
+
+class ResultCache:
+    # maxsize - предельное число записей, max_bytes - предельный объем хранимых результатов
+    # (оценка _nbytes при сохранении; рост объекта после put не учитывается)
+    def __init__(self, maxsize=128, max_bytes=256 * 2 ** 20):
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.nbytes = 0
+        self._data = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key][0]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        size = _nbytes(value)
+        with self._lock:
+            if key in self._data:
+                self.nbytes -= self._data.pop(key)[1]
+            if size > self.max_bytes:
+                # результат больше всего кэша не сохраняем
+                return value
+            self._data[key] = (value, size)
+            self.nbytes += size
+            while len(self._data) > self.maxsize or self.nbytes > self.max_bytes:
+                _, (_, old_size) = self._data.popitem(last=False)
+                self.nbytes -= old_size
+        return value
+
+    # Вернуть результат из кэша или рассчитать его через compute() и сохранить
+    def get_or_compute(self, key, compute):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key][0]
+            self.misses += 1
+        return self.put(key, compute())
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._data),
+                    'nbytes': self.nbytes, 'maxsize': self.maxsize, 'max_bytes': self.max_bytes}
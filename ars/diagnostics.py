@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""Диагностический график: производная Бурде и определение режимов течения.
+
+Ряд давления сначала прореживается в логарифме времени (средние по равным интервалам
+log t, один проход np.bincount), поэтому замеры манометра в 10^6 точек сводятся к
+нескольким сотням узлов и шум усредняется до дифференцирования. Производная Бурде
+dp' = d(dp)/d(ln t) считается по точкам, отстоящим от текущей не меньше чем на окно
+сглаживания L в ln t слева и справа (поиск соседей - np.searchsorted), одним
+векторизованным проходом. Режимы течения определяются по наклону производной
+в двойных логарифмических координатах.
+"""
+
+import numpy as np
+
+STORAGE = 'storage'
+RADIAL = 'radial'
+BOUNDARY = 'boundary'
+TRANSITION = 'transition'
+
+# окно сглаживания по ln t и число узлов на декаду после прореживания
+DEFAULT_WINDOW = 0.1
+POINTS_PER_DECADE = 40
+# допуск на наклон производной и минимальная длина участка режима, декад
+SLOPE_TOL = 0.15
+MIN_DECADES = 0.3
+
+
+# Прореживание ряда (t, p) в логарифме времени: средние t и p по интервалам
+# шириной 1 / points_per_decade декады; пустые интервалы отбрасываются
+def decimate_log(t, p, points_per_decade=POINTS_PER_DECADE):
+    t = np.asarray(t, dtype=float).ravel()
+    p = np.asarray(p, dtype=float).ravel()
+    valid = (t > 0) & np.isfinite(t) & np.isfinite(p)
+    t, p = t[valid], p[valid]
+    if t.size == 0:
+        return t, p
+    log_t = np.log10(t)
+    index = np.floor((log_t - log_t.min()) * points_per_decade).astype(np.int64)
+    count = np.bincount(index)
+    filled = count > 0
+    # время - среднее геометрическое, чтобы узлы оставались равномерными в log t
+    t_mean = 10 ** (np.bincount(index, weights=log_t)[filled] / count[filled])
+    p_mean = np.bincount(index, weights=p)[filled] / count[filled]
+    return t_mean, p_mean
+
+
+# Производная Бурде dp / d(ln t) с окном сглаживания window по ln t.
+# producing_time - длительность работы до остановки для КВД (эквивалентное время Агарвала)
+def bourdet_derivative(t, dp, window=DEFAULT_WINDOW, producing_time=None):
+    t = np.asarray(t, dtype=float)
+    dp = np.asarray(dp, dtype=float)
+    if t.size < 3:
+        return np.full(t.shape, np.nan)
+    if producing_time is not None:
+        t = t * producing_time / (t + producing_time)
+    x = np.log(t)
+    index = np.arange(x.size)
+    # ближайшие точки, отстоящие не меньше чем на window; у краев - крайние точки ряда
+    left = np.searchsorted(x, x - window, side='right') - 1
+    left = np.where(left < 0, 0, left)
+    left = np.where(left == index, np.maximum(index - 1, 0), left)
+    right = np.searchsorted(x, x + window, side='left')
+    right = np.where(right > x.size - 1, x.size - 1, right)
+    right = np.where(right == index, np.minimum(index + 1, x.size - 1), right)
+    dx_l, dx_r = x - x[left], x[right] - x
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope_l = (dp - dp[left]) / dx_l
+        slope_r = (dp[right] - dp) / dx_r
+        derivative = (slope_l * dx_r + slope_r * dx_l) / (dx_l + dx_r)
+    # на краях - односторонняя разность
+    derivative = np.where(dx_l == 0, slope_r, derivative)
+    derivative = np.where(dx_r == 0, slope_l, derivative)
+    return derivative
+
+
+# Начала и концы (включительно) участков с одинаковым значением
+def _runs(values):
+    edges = np.flatnonzero(values[1:] != values[:-1]) + 1
+    return np.concatenate(([0], edges)), np.concatenate((edges, [values.size])) - 1
+
+
+# Участки режимов течения по наклону производной в двойных логарифмических координатах:
+# ВСС - наклон 1 при dp' ~ dp с первого замера, радиальный - горизонтальный участок, граница -
+# отклонение производной вверх или вниз после радиального режима или после ухода с ВСС
+# (в том числе наклон 1 псевдоустановившегося режима закрытого пласта). Список (режим, t_начала, t_конца)
+def detect_regimes(t, dp, derivative, slope_tol=SLOPE_TOL, min_decades=MIN_DECADES):
+    t = np.asarray(t, dtype=float)
+    valid = (t > 0) & (dp > 0) & (derivative > 0) & np.isfinite(derivative)
+    t, dp, derivative = t[valid], np.asarray(dp)[valid], np.asarray(derivative)[valid]
+    if t.size < 3:
+        return []
+    log_t = np.log10(t)
+    slope = np.gradient(np.log10(derivative), log_t)
+    # сглаживание наклона скользящим средним по 5 точкам
+    slope = np.convolve(np.pad(slope, 2, mode='edge'), np.ones(5) / 5, mode='valid')
+    flat = np.abs(slope) < slope_tol
+    ratio = np.abs(derivative / dp - 1) < 2 * slope_tol
+    unit = (np.abs(slope - 1) < slope_tol) & ratio
+    # ВСС ищется только на начальном участке, где dp' ~ dp с первого замера; первый достаточно
+    # длинный горизонтальный участок после него - радиальный режим, граница - все, что отклоняется
+    # с горизонтали после радиального режима, и наклон 1 после ухода с ВСС
+    storage = _runs(ratio)[1][0] + 1 if ratio[0] else 0
+    start = t.size
+    for i, j in zip(*_runs(flat)):
+        if flat[i] and i >= storage and log_t[j] - log_t[i] >= min_decades:
+            start = i
+            break
+    index = np.arange(t.size)
+    label = np.full(t.size, TRANSITION, dtype=object)
+    label[(index < storage) & unit] = STORAGE
+    label[(index >= storage) & (index < start) & unit] = BOUNDARY
+    label[(index >= start) & flat] = RADIAL
+    label[(index >= start) & ~flat] = BOUNDARY
+    # слияние соседних точек с одинаковым режимом; короткие участки - переходные
+    regimes = []
+    for i, j in zip(*_runs(label)):
+        if label[i] == TRANSITION or log_t[j] - log_t[i] < min_decades:
+            continue
+        if regimes and regimes[-1][0] == label[i]:
+            regimes[-1] = (label[i], regimes[-1][1], t[j])
+        else:
+            regimes.append((label[i], t[i], t[j]))
+    return regimes
+
+
+# Проницаемость [м2] по уровню производной на радиальном участке: dp' = q B mu / (4 pi k h)
+def radial_permeability(derivative_level, q, B, mu, h):
+    return q * B * mu / (4 * np.pi * h * derivative_level)
+
+
+# Полный расчет диагностического графика для ряда депрессии dp(t):
+# прореживание, производная Бурде и режимы течения
+def diagnostic(t, dp, window=DEFAULT_WINDOW, points_per_decade=POINTS_PER_DECADE, producing_time=None):
+    t, dp = decimate_log(t, dp, points_per_decade)
+    derivative = bourdet_derivative(t, dp, window, producing_time)
+    return {'t': t, 'dp': dp, 'derivative': derivative, 'regimes': detect_regimes(t, dp, derivative)}
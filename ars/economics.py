@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""Экономическая оценка прогноза добычи.
+
+Профили дебитов (сценарии x скважины x времена - любое число ведущих осей) переводятся
+в накопленную добычу, выручку, дисконтированный денежный поток, NPV и срок окупаемости
+затрат на ГТМ. Все величины считаются операциями над массивами сразу по всем
+сценариям и шагам времени, поэтому отбор сотен вариантов ГТМ - один вызов evaluate.
+"""
+
+import numpy as np
+
+# год, с
+YEAR = 365.25 * 86400
+# плотность нефти, т/м3, и ставка дисконтирования, доли в год, по умолчанию
+DEFAULT_DENSITY = 0.85
+DEFAULT_DISCOUNT = 0.1
+
+# строки table_predict_econom: название, ключ evaluate, множитель перевода, значение по умолчанию
+ECONOMY_FIELDS = [
+    ('Стоимость нефти, руб/т', 'price', 1.0, None),
+    ('Стоимость проведения ГТМ, тыс. руб', 'capex', 1000.0, 0.0),
+    ('Плотность нефти, т/м3', 'density', 1.0, DEFAULT_DENSITY),
+    ('Ставка дисконтирования, %/год', 'discount', 0.01, DEFAULT_DISCOUNT * 100),
+]
+
+
+# Накопленная добыча [м3] по дебитам rates (..., T) [м3/с] на моменты t (T,) [с]:
+# метод трапеций, до первого момента дебит считается постоянным
+def cumulative_volume(t, rates):
+    t = np.asarray(t, dtype=float)
+    rates = np.asarray(rates, dtype=float)
+    dt = np.diff(t, prepend=0.0)
+    previous = np.concatenate([rates[..., :1], rates[..., :-1]], axis=-1)
+    return np.cumsum(0.5 * (previous + rates) * dt, axis=-1)
+
+
+# Экономические показатели для профилей добычи.
+# t (T,) [с]; rates (..., T) [м3/с] или cumulative (..., T) [м3] - накопленная добыча прогноза;
+# price [руб/т], capex [руб], density [т/м3], discount [доли в год] - скаляры или массивы,
+# согласованные с ведущими осями rates (например, (W,) для скважин).
+# Возвращает словарь: production (..., T) - накопленная добыча [т], cash_flow (..., T) -
+# накопленный дисконтированный поток за вычетом затрат [руб], revenue [руб], npv [руб],
+# payback [с] (NaN, если затраты не окупаются) - формы ведущих осей
+def evaluate(t, price, capex=0.0, density=DEFAULT_DENSITY, discount=DEFAULT_DISCOUNT, rates=None, cumulative=None):
+    t = np.asarray(t, dtype=float)
+    if cumulative is None:
+        cumulative = cumulative_volume(t, rates)
+    cumulative = np.asarray(cumulative, dtype=float)
+    # параметры не расширяются до формы профилей: множители (цена, плотность, дисконт)
+    # собираются в массив малой формы, и по профилям проходит одно умножение
+    price, capex, density, discount = (np.asarray(v, dtype=float)[..., None]
+                                       for v in (price, capex, density, discount))
+
+    production = cumulative * density
+    # дисконтирование на конец шага
+    factor = (1 + discount) ** (-t / YEAR)
+    cash_flow = np.diff(cumulative, axis=-1, prepend=0.0)
+    cash_flow *= density * price * factor
+    np.cumsum(cash_flow, axis=-1, out=cash_flow)
+    cash_flow -= capex
+    revenue = production[..., -1] * price[..., 0]
+    npv = cash_flow[..., -1]
+    capex = np.broadcast_to(capex, npv.shape + (1,))
+
+    # срок окупаемости: первый шаг с неотрицательным потоком, внутри шага - линейно
+    paid = cash_flow >= 0
+    index = np.argmax(paid, axis=-1)[..., None]
+    after = np.take_along_axis(cash_flow, index, axis=-1)[..., 0]
+    before = np.take_along_axis(np.concatenate([-capex, cash_flow[..., :-1]], axis=-1), index, axis=-1)[..., 0]
+    t_after = t[index[..., 0]]
+    t_before = np.concatenate([[0.0], t[:-1]])[index[..., 0]]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        share = np.where(after > before, -before / (after - before), 0.0)
+    payback = np.where(paid.any(axis=-1), t_before + np.clip(share, 0, 1) * (t_after - t_before), np.nan)
+    return {'production': production, 'cash_flow': cash_flow, 'revenue': revenue, 'npv': npv, 'payback': payback}
+
+
+# Параметры evaluate по скважинам из table_predict_econom (строки - ECONOMY_FIELDS, столбцы - скважины).
+# Незаданное для скважины значение берется из других столбцов строки, затем - по умолчанию.
+# Возвращает {ключ: массив (W,)}; цена нефти обязательна (ValueError, если не задана)
+def parse_economics(rows_in_econom, names):
+    rows = {row.get('Parameter'): row for row in rows_in_econom or []}
+    params = {}
+    for field, key, scale, default in ECONOMY_FIELDS:
+        row = rows.get(field, {})
+        values = {}
+        for name, value in row.items():
+            try:
+                values[name] = float(value)
+            except (TypeError, ValueError):
+                pass
+        values.pop('Parameter', None)
+        common = next(iter(values.values()), default)
+        if common is None:
+            raise ValueError('не задано значение "{}"'.format(field))
+        params[key] = np.array([values.get(name, common) for name in names], dtype=float) * scale
+    return params
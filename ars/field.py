@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""Ленивое трехмерное поле давления для срезов XY, XZ и YZ.
+
+PressureField хранит только параметры модели (как у run_model); объемный массив не
+строится. Давление считается лишь в узлах запрошенного среза - плоскости XY на высоте z,
+XZ при заданном y или YZ при заданном x - с нужным разрешением, а недавние срезы
+хранятся в кэше (ars/cache.py), поэтому повторный выбор вида или положения среза
+не требует расчета. Если давление не зависит от z (вертикальные скважины на всю
+толщину, ограниченные пласты), вертикальный срез считается по одной линии и
+размножается по высоте.
+"""
+
+import numpy as np
+
+from ars.bounded import NO_FLOW
+from ars.cache import ResultCache
+from ars.model import MAP_DTYPE, MAP_SIZE, MAP_TIME, map_extent, reservoir_pressure
+from ars.sources import HORIZONTAL, VERTICAL
+
+PLANES = ('XY', 'XZ', 'YZ')
+# шаг положения среза (доля размера области) для ключа кэша
+POSITION_STEP = 1e-3
+
+
+class PressureField:
+    # Параметры модели - как у run_model; t - момент времени [с], resolution - узлов среза
+    # по горизонтальной оси (по z - не меньше 2 и не больше resolution), cache_size - число
+    # хранимых срезов
+    def __init__(self, B, k, h, f, ct, mu, PI, wells, rates, reservoir='infinite', boundary=NO_FLOW, r_e=500,
+                 a=1000, b=1000, geometry=None, t=MAP_TIME, resolution=MAP_SIZE, cache_size=32, rw=0.1):
+        self.h = h
+        self.t = t
+        self.rw = rw
+        self.resolution = resolution
+        self.wells = np.asarray(wells, dtype=float)
+        self.extent = map_extent(reservoir, self.wells, r_e, a, b)
+        self.params = dict(reservoir=reservoir, boundary=boundary, wells=self.wells[:, :2], rates=rates, r_e=r_e,
+                           a=a, b=b, geometry=geometry, B=B, k=k, h=h, mu=mu, eta=k / (mu * f * ct), f=f)
+        # от z зависят только горизонтальные скважины и частичное вскрытие в бесконечном пласте
+        self.layered = reservoir == 'infinite' and any(
+            item['kind'] == HORIZONTAL or (item['kind'] == VERTICAL and 0 < (item.get('penetration') or h) < h)
+            for item in geometry or [])
+        self._cache = ResultCache(maxsize=cache_size, max_bytes=64 * 2 ** 20)
+
+    # Депрессия [МПа] в точках (x, y, z) одинаковой формы
+    def pressure(self, x, y, z=None):
+        with np.errstate(under='ignore'):
+            return reservoir_pressure(x=x, y=y, z=z, t=self.t, r_min=self.rw, **self.params) / 1000000
+
+    # Оси и значения среза: plane - 'XY', 'XZ' или 'YZ'; position - положение среза вдоль нормали
+    # в долях области (z от подошвы для XY, y или x для вертикальных срезов).
+    # Возвращает (u, v, values): горизонтальная ось, вертикальная ось, массив (v.size, u.size)
+    def slice(self, plane='XY', position=0.5, resolution=None):
+        if plane not in PLANES:
+            raise ValueError('Неизвестная плоскость среза {!r}, доступны: {}'.format(plane, ', '.join(PLANES)))
+        n = int(resolution or self.resolution)
+        position = round(float(np.clip(position, 0.0, 1.0)) / POSITION_STEP) * POSITION_STEP
+        return self._cache.get_or_compute((plane, position, n), lambda: self._slice(plane, position, n))
+
+    def _slice(self, plane, position, n):
+        axis = np.linspace(-self.extent, self.extent, n)
+        if plane == 'XY':
+            z = position * self.h if self.layered else None
+            X, Y = np.meshgrid(axis, axis)
+            values = self.pressure(X, Y, z)
+            return axis, axis.copy(), values.astype(MAP_DTYPE)
+        z = np.linspace(0.0, self.h, max(2, min(n, n // 4)))
+        other = np.full(axis.shape, -self.extent + 2 * self.extent * position)
+        x, y = (axis, other) if plane == 'XZ' else (other, axis)
+        if self.layered:
+            values = self.pressure(np.broadcast_to(x, (z.size, n)), np.broadcast_to(y, (z.size, n)), z[:, None])
+        else:
+            values = np.broadcast_to(self.pressure(x, y), (z.size, n))
+        return axis, z, np.array(values, dtype=MAP_DTYPE)
+
+    def stats(self):
+        return self._cache.stats()
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""Прогноз дебитов скважин при постоянном забойном давлении.
+
+Для скважины, работающей с постоянной депрессией dp в бесконечном пласте, изображение
+дебита q(s) = dp / (s^2 pw(s)), где pw(s) - изображение давления на забое при единичном
+дебите (pd_lapl). Для группы скважин депрессия на каждой - сумма вкладов всех
+дебитов, поэтому в каждом узле обращения s решается линейная система
+    G(s) q(s) = dp / s,    G_ij(s) = B mu / (2 pi k h) K0(r_ij u) / (rw u K1(rw u)),  u = sqrt(s / eta),
+где r_ii = rw. Матрицы G для всех узлов собираются одним broadcast-вычислением и
+решаются пакетом np.linalg.solve. Дебиты считаются на логарифмической сетке времени
+(узлы Стефеста s = j ln2 / t у соседних времен сетки с шагом в долю октавы совпадают,
+и такие системы решаются один раз), затем интерполируются на сетку прогноза.
+"""
+
+import numpy as np
+import scipy.special as sc
+
+from ars.laplace import DEFAULT_DEGREE, stehfest_weights
+from ars.metrics import timed
+from ars.superposition import well_rows
+
+# узлов логарифмической сетки на октаву времени
+POINTS_PER_OCTAVE = 6
+# горизонт прогноза по умолчанию, с (если время прогноза не задано)
+DEFAULT_HORIZON = 365 * 86400
+# бюджет памяти на блок матриц G, байт
+CHUNK_BYTES = 64 * 2 ** 20
+
+
+# Матрицы влияния G(s) (узлы, скважины, скважины) [Па*с/м3 в изображении без множителя 1/s]:
+# distances - расстояния между скважинами (W, W) с rw на диагонали
+def influence_matrix(s, distances, rw, B, k, h, mu, eta):
+    u = np.sqrt(np.asarray(s, dtype=float) / eta)[:, None, None]
+    # K0(r u) / K1(rw u) через масштабированные функции - без переполнения при больших s
+    ratio = sc.k0e(distances * u) / sc.k1e(rw * u) * np.exp(-(distances - rw) * u)
+    return B * mu / (2 * np.pi * k * h) * ratio / (rw * u)
+
+
+# Изображения дебитов q(s) (узлы, скважины) [м3/с] при постоянных депрессиях dp (W,) [Па]
+def rates_lapl(s, dp, distances, rw, B, k, h, mu, eta, chunk_bytes=CHUNK_BYTES):
+    s = np.asarray(s, dtype=float)
+    n = distances.shape[0]
+    rows = max(1, int(chunk_bytes // (8 * 4 * n * n)))
+    q = np.empty((s.size, n))
+    for start in range(0, s.size, rows):
+        block = s[start:start + rows]
+        G = influence_matrix(block, distances, rw, B, k, h, mu, eta)
+        q[start:start + rows] = np.linalg.solve(G, (dp / block[:, None])[..., None])[..., 0]
+    return q
+
+
+# Интерполяция значений на логарифмической сетке между узлами index - 1 и index с весом w:
+# в двойных логарифмических координатах (дебит и добыча близки к степенным функциям времени),
+# где соседние значения одного знака, иначе линейно
+def _interpolate(values, index, w):
+    left, right = values[index - 1], values[index]
+    same = left * right > 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        power = np.sign(left) * np.abs(left) ** (1 - w) * np.abs(right) ** w
+    return np.where(same, power, (1 - w) * left + w * right)
+
+
+# Дебиты (T, W) [м3/с] и накопленная добыча (T, W) [м3] скважин в точках wells (W, 2+)
+# с постоянными депрессиями dp (W,) [Па] на моменты t [с]
+@timed('kernel:constant_pressure_rates')
+def constant_pressure_rates(t, dp, wells, rw=0.1, B=1.25, k=50e-15, h=9.144, mu=3e-3, eta=None, f=0.3, ct=2.47e-9,
+                            degree=DEFAULT_DEGREE['stehfest'], points_per_octave=POINTS_PER_OCTAVE):
+    t = np.asarray(t, dtype=float)
+    dp = np.asarray(dp, dtype=float)
+    wells = np.asarray(wells, dtype=float)
+    if eta is None:
+        eta = k / (mu * f * ct)
+    if wells.shape[0] == 0 or t.size == 0:
+        return np.zeros((t.size, wells.shape[0])), np.zeros((t.size, wells.shape[0]))
+    distances = np.hypot(wells[:, None, 0] - wells[None, :, 0], wells[:, None, 1] - wells[None, :, 1])
+    distances = np.maximum(distances, rw)
+    np.fill_diagonal(distances, rw)
+
+    # логарифмическая сетка с шагом 2^(1/points_per_octave), покрывающая [t_min, t_max]
+    positive = t[t > 0]
+    lo, hi = np.log2(positive.min()), np.log2(positive.max())
+    start = int(np.floor(lo * points_per_octave))
+    m = start + np.arange(int(np.ceil(hi * points_per_octave - start)) + 2)
+    grid = 2.0 ** (m / points_per_octave)
+    # узлы Стефеста s = j ln2 / t всех времен сетки. При j = o 2^e (o - нечетное)
+    # s = o ln2 / 2^((m - e P) / P), поэтому пара (o, m - e P) однозначно задает узел:
+    # совпадающие узлы решаются один раз и считаются по одной формуле (веса Стефеста велики,
+    # и даже ошибки округления s заметны в результате)
+    j = np.arange(1, degree + 1)
+    e = np.log2(j & -j).astype(int)
+    odd = j >> e
+    shift = m[:, None] - e[None, :] * points_per_octave
+    keys = np.stack(np.broadcast_arrays(odd[None, :], shift), axis=-1).reshape(-1, 2)
+    unique, inverse = np.unique(keys, axis=0, return_inverse=True)
+    nodes = unique[:, 0] * np.log(2) / 2.0 ** (unique[:, 1] / points_per_octave)
+    s = nodes[inverse].reshape(m.size, degree)
+    q_s = rates_lapl(nodes, dp, distances, rw, B, k, h, mu, eta)[inverse.reshape(s.shape)]
+
+    # обращение по Стефесту: дебит - изображение q(s), накопленная добыча - q(s) / s
+    v = stehfest_weights(degree)
+    a = (np.log(2) / grid)[:, None]
+    rate = a * np.einsum('j,tjw->tw', v, q_s)
+    cumulative = a * np.einsum('j,tjw->tw', v, q_s / s[..., None])
+
+    # интерполяция с логарифмической сетки на моменты t
+    x = np.log(np.where(t > 0, t, grid[0]))
+    index = np.clip(np.searchsorted(np.log(grid), x), 1, grid.size - 1)
+    w = ((x - np.log(grid[index - 1])) / (np.log(grid[index]) - np.log(grid[index - 1])))[:, None]
+    rate_t = _interpolate(rate, index, w)
+    cumulative_t = _interpolate(cumulative, index, w)
+    cumulative_t[t <= 0] = 0.0
+    return rate_t, cumulative_t
+
+
+# Скважины прогноза из table_wells и table_predict_param (столбцы - скважины):
+# имена, координаты (W, 3) [м], забойные давления (W,) [Па] и горизонт прогноза [с].
+# В прогноз попадают скважины с заданным забойным давлением
+def parse_forecast(rows_in_wells, rows_in_predict):
+    values = {}
+    for row in rows_in_predict or []:
+        values[row.get('Parameter')] = row
+    pressures = values.get('Забойное давление, МПа', {})
+    horizons = values.get('Время прогноза, ч', {})
+    names, coords, pwf, horizon = [], [], [], 0.0
+    for row, xyz, kind in well_rows(rows_in_wells):
+        name = str(row.get('Скважина'))
+        try:
+            pressure = float(pressures.get(name))
+        except (TypeError, ValueError):
+            continue
+        try:
+            horizon = max(horizon, float(horizons.get(name)) * 3600)
+        except (TypeError, ValueError):
+            pass
+        names.append(name)
+        coords.append(xyz)
+        pwf.append(pressure * 1e6)
+    return names, np.array(coords, dtype=float).reshape(-1, 3), np.array(pwf, dtype=float), horizon
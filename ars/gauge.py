@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""Потоковое чтение файлов глубинных манометров.
+
+Файлы манометров (разделители - пробелы или запятая) читаются блоками через
+pandas.read_csv(chunksize=...), из каждого блока берутся только нужные столбцы.
+При прореживании в логарифме времени блок сразу сворачивается в суммы по интервалам
+log t (np.bincount), поэтому память ограничена размером блока и числом интервалов,
+а не длиной файла. Результат - компактные массивы NumPy; при заданном cache_dir он
+сохраняется в .npy и при повторном чтении того же файла открывается через memmap.
+Вместо пути можно передать открытый текстовый буфер (например, загруженный в интерфейсе
+файл в io.StringIO) - он читается так же, но без кэша.
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from ars.cache import digest, make_key
+
+# строк в блоке чтения
+CHUNK_ROWS = 10 ** 6
+# узлов на декаду времени при прореживании
+POINTS_PER_DECADE = 40
+
+
+# Накопитель средних по интервалам log10(t) шириной 1 / points_per_decade декады.
+# Интервалы привязаны к абсолютной шкале, поэтому суммы из разных блоков складываются
+class LogBinner:
+    def __init__(self, points_per_decade=POINTS_PER_DECADE):
+        self.points_per_decade = points_per_decade
+        self.offset = None
+        self.count = np.zeros(0)
+        self.log_t = np.zeros(0)
+        self.values = None
+
+    def add(self, t, values):
+        t = np.asarray(t, dtype=float)
+        values = np.asarray(values, dtype=float).reshape(t.size, -1)
+        valid = (t > 0) & np.isfinite(values).all(axis=1)
+        t, values = t[valid], values[valid]
+        if t.size == 0:
+            return
+        log_t = np.log10(t)
+        index = np.floor(log_t * self.points_per_decade).astype(np.int64)
+        lo, hi = index.min(), index.max()
+        if self.offset is None:
+            self.offset = lo
+            self.values = np.zeros((0, values.shape[1]))
+        # расширение накопителя на новые интервалы
+        if lo < self.offset:
+            pad = self.offset - lo
+            self.count = np.concatenate([np.zeros(pad), self.count])
+            self.log_t = np.concatenate([np.zeros(pad), self.log_t])
+            self.values = np.concatenate([np.zeros((pad, self.values.shape[1])), self.values])
+            self.offset = lo
+        size = hi - self.offset + 1
+        if size > self.count.size:
+            pad = size - self.count.size
+            self.count = np.concatenate([self.count, np.zeros(pad)])
+            self.log_t = np.concatenate([self.log_t, np.zeros(pad)])
+            self.values = np.concatenate([self.values, np.zeros((pad, self.values.shape[1]))])
+        index -= self.offset
+        self.count += np.bincount(index, minlength=self.count.size)
+        self.log_t += np.bincount(index, weights=log_t, minlength=self.count.size)
+        for j in range(values.shape[1]):
+            self.values[:, j] += np.bincount(index, weights=values[:, j], minlength=self.count.size)
+
+    # Средние по непустым интервалам: время (среднее геометрическое) и значения (n, k)
+    def result(self):
+        if self.offset is None:
+            return np.zeros(0), np.zeros((0, 0))
+        filled = self.count > 0
+        count = self.count[filled]
+        return 10 ** (self.log_t[filled] / count), self.values[filled] / count[:, None]
+
+
+# Время в секундах из столбца: числа (умножаются на time_scale) или дата/время
+def _seconds(column, time_scale):
+    if pd.api.types.is_numeric_dtype(column):
+        return column.to_numpy(dtype=float) * time_scale
+    stamps = pd.to_datetime(column, errors='coerce')
+    return (stamps - pd.Timestamp(0)).dt.total_seconds().to_numpy()
+
+
+# Строка заголовка файла: 0, если в первой непустой строке (без комментариев '#') нет ни одного
+# числа (подписи столбцов), иначе None - файл без заголовка, первая строка - замер.
+# source - путь или текстовый буфер (после проверки возвращается в начало)
+def detect_header(source, sep=None):
+    if hasattr(source, 'read'):
+        try:
+            return _header_row(source, sep)
+        finally:
+            source.seek(0)
+    with open(source, encoding='utf-8', errors='replace') as f:
+        return _header_row(f, sep)
+
+
+def _header_row(lines, sep):
+    for line in lines:
+        line = line.split('#', 1)[0].strip()
+        if not line:
+            continue
+        for field in (line.split() if sep is None else line.split(sep)):
+            try:
+                float(field.strip().strip('"\''))
+                return None
+            except ValueError:
+                pass
+        return 0
+    return None
+
+
+# Ключ кэша: файл (путь, размер, время изменения) и параметры чтения
+def _cache_key(path, **options):
+    stat = os.stat(path)
+    return digest(make_key('gauge', [], path=os.path.abspath(path), size=stat.st_size, mtime=stat.st_mtime,
+                           **options))
+
+
+# Чтение файла манометра блоками; path - путь или текстовый буфер (буфер не кэшируется).
+# sep=None - разделители-пробелы, иначе разделитель read_csv (например ',');
+# time_column и columns - имена или номера столбцов; time_scale - перевод времени в секунды
+# (3600 для часов); header - строка заголовка для read_csv ('auto' - по первой строке файла,
+# см. detect_header; None - без заголовка); t0 - начало исследования [с], по умолчанию первый замер;
+# points_per_decade=None - без прореживания.
+# Возвращает словарь: t [с от t0] (n,), values (n, k), columns (имена k столбцов)
+def read_gauge(path, columns=None, time_column=0, sep=None, header='auto', time_scale=1.0, t0=None,
+               points_per_decade=POINTS_PER_DECADE, chunk_rows=CHUNK_ROWS, cache_dir=None, dtype=np.float64):
+    if header == 'auto':
+        header = detect_header(path, sep)
+    options = dict(columns=columns, time_column=time_column, sep=sep, header=header, time_scale=time_scale,
+                   t0=t0, points_per_decade=points_per_decade, dtype=np.dtype(dtype).str)
+    if hasattr(path, 'read'):
+        cache_dir = None
+    if cache_dir is not None:
+        key = _cache_key(path, **options)
+        data_path = os.path.join(cache_dir, key + '.npy')
+        meta_path = os.path.join(cache_dir, key + '.json')
+        if os.path.exists(data_path) and os.path.exists(meta_path):
+            with open(meta_path, encoding='utf-8') as f:
+                names = json.load(f)['columns']
+            data = np.load(data_path, mmap_mode='r')
+            return {'t': data[:, 0], 'values': data[:, 1:], 'columns': names}
+
+    # выбор столбцов при разборе (usecols): номера или имена, без смешения
+    usecols = None
+    selected = [time_column] + list(columns) if columns is not None else None
+    if selected is not None and len({isinstance(c, (int, np.integer)) for c in selected}) == 1:
+        usecols = selected
+    reader = pd.read_csv(path, sep=r'\s+' if sep is None else sep, header=header, chunksize=chunk_rows,
+                         engine='c', comment='#', usecols=usecols)
+    binner = LogBinner(points_per_decade) if points_per_decade else None
+    parts_t, parts_values = [], []
+    names = None
+    for chunk in reader:
+        if names is None:
+            labels = list(chunk.columns)
+            # номер столбца файла -> подпись (после usecols столбцы идут в порядке файла)
+            order = sorted(usecols) if usecols is not None else list(range(len(labels)))
+            pick = lambda c: labels[order.index(c)] if isinstance(c, (int, np.integer)) and c not in labels else c
+            time_name = pick(time_column)
+            names = [pick(c) for c in columns] if columns is not None else [c for c in labels if c != time_name]
+        t = _seconds(chunk[time_name], time_scale)
+        values = chunk[names].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+        if t0 is None:
+            finite = np.flatnonzero(np.isfinite(t))
+            if finite.size == 0:
+                continue
+            t0 = t[finite[0]]
+        t = t - t0
+        if binner is not None:
+            binner.add(t, values)
+        else:
+            valid = np.isfinite(t)
+            parts_t.append(t[valid])
+            parts_values.append(values[valid].astype(dtype))
+    if binner is not None:
+        t, values = binner.result()
+        values = values.astype(dtype)
+    elif parts_t:
+        t, values = np.concatenate(parts_t), np.concatenate(parts_values)
+    else:
+        t, values = np.zeros(0), np.zeros((0, len(names or [])), dtype=dtype)
+    names = [str(c) for c in names or []]
+
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        np.save(data_path, np.column_stack([t, values]).astype(dtype))
+        with open(meta_path, 'w', encoding='utf-8') as f:
+            json.dump({'path': os.path.abspath(path), 'columns': names}, f, ensure_ascii=False)
+    return {'t': t, 'values': values, 'columns': names}
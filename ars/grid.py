@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""Расчетная сетка для карт давления.
+
+Сетка задается тремя осями x, y, z; координаты и расстояния до скважин строятся
+broadcast-операциями над осями без циклов Python. Для больших сеток
+(до 1000 x 1000 x 200) расчет ведется блоками по слоям z в пределах бюджета памяти,
+результат можно писать в заранее выделенный массив (в том числе np.memmap).
+"""
+
+import numpy as np
+
+# бюджет памяти на один блок сетки, байт
+CHUNK_BYTES = 64 * 2 ** 20
+
+
+class Grid:
+    # x, y, z - одномерные оси [м]; массивы хранятся в формате (nz, ny, nx)
+    def __init__(self, x, y, z=(0.0,), dtype=np.float64):
+        self.dtype = np.dtype(dtype)
+        self.x = np.asarray(x, dtype=self.dtype).ravel()
+        self.y = np.asarray(y, dtype=self.dtype).ravel()
+        self.z = np.asarray(z, dtype=self.dtype).ravel()
+
+    # Равномерная сетка в квадрате [-r_e, r_e] вокруг center и по толщине пласта [-h/2, h/2]
+    @classmethod
+    def from_extent(cls, r_e, h=0.0, nx=100, ny=None, nz=1, center=(0.0, 0.0, 0.0), dtype=np.float64):
+        ny = nx if ny is None else ny
+        x = np.linspace(center[0] - r_e, center[0] + r_e, nx)
+        y = np.linspace(center[1] - r_e, center[1] + r_e, ny)
+        z = np.linspace(center[2] - h / 2, center[2] + h / 2, nz) if nz > 1 else np.array([center[2]])
+        return cls(x, y, z, dtype=dtype)
+
+    @property
+    def shape(self):
+        return self.z.size, self.y.size, self.x.size
+
+    @property
+    def size(self):
+        return self.z.size * self.y.size * self.x.size
+
+    # Координаты узлов (только представления осей, без копирования) для слоев z[zs]
+    def coords(self, zs=slice(None)):
+        z = self.z[zs]
+        shape = (z.size, self.y.size, self.x.size)
+        return (np.broadcast_to(self.x[None, None, :], shape),
+                np.broadcast_to(self.y[None, :, None], shape),
+                np.broadcast_to(z[:, None, None], shape))
+
+    # Двумерная сетка плоскости XY (как np.meshgrid(x, y))
+    def mesh_xy(self):
+        return np.meshgrid(self.x, self.y)
+
+    # Расстояние от скважины (x, y[, z]) до узлов слоев z[zs]: по умолчанию горизонтальное
+    # (вертикальная скважина на всю толщину), при spherical=True - с учетом z
+    def distance(self, well, zs=slice(None), spherical=False, out=None):
+        well = np.asarray(well, dtype=float)
+        dx2 = (self.x - self.dtype.type(well[0])) ** 2
+        dy2 = (self.y - self.dtype.type(well[1])) ** 2
+        r2 = dy2[:, None] + dx2[None, :]
+        z = self.z[zs]
+        if spherical:
+            wz = well[2] if well.size > 2 else 0.0
+            dz2 = (z - self.dtype.type(wz)) ** 2
+            r2 = dz2[:, None, None] + r2[None, :, :]
+        else:
+            r2 = np.broadcast_to(r2[None, :, :], (z.size,) + r2.shape)
+        return np.sqrt(r2, out=out)
+
+    # Разбиение по слоям z: каждый блок содержит не более chunk_bytes
+    # при values_per_node значениях на узел (например, число времен)
+    def chunks(self, values_per_node=1, chunk_bytes=CHUNK_BYTES):
+        layer = self.y.size * self.x.size * values_per_node * self.dtype.itemsize
+        step = int(max(1, chunk_bytes // max(layer, 1)))
+        for z0 in range(0, self.z.size, step):
+            yield slice(z0, min(z0 + step, self.z.size))
+
+    # Поле func(X, Y, Z) на всей сетке блоками по слоям z.
+    # func получает координаты блока формы (nz_block, ny, nx) и возвращает массив той же формы
+    # (или с дополнительными осями, например по времени: tail_shape)
+    def evaluate(self, func, tail_shape=(), chunk_bytes=CHUNK_BYTES, out=None):
+        tail_shape = tuple(tail_shape)
+        if out is None:
+            out = np.empty(self.shape + tail_shape, dtype=self.dtype)
+        values = int(np.prod(tail_shape)) if tail_shape else 1
+        for zs in self.chunks(values, chunk_bytes):
+            out[zs] = func(*self.coords(zs))
+        return out
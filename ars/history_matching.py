@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""Адаптация модели к замерам давления (history matching).
+
+Подбираются проницаемость каждой скважины и, по желанию, скин-фактор и коэффициент
+влияния ствола скважины (ВСС) по замерам забойного давления из table_model_Q.
+Прямая модель: свертка графиков дебита всех скважин с откликом на единичный дебит
+(ars/rate_history.py), интерференция соседних скважин - решение для линейного источника.
+Невязки минимизируются scipy.optimize.least_squares с ограничениями; столбцы якобиана
+(по одному прямому расчету на параметр) считаются параллельно в пуле процессов.
+В интерфейсе адаптация ставится в фоновую очередь (ars/jobs.py) задачей history_match_job.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from ars.jobs import report_progress
+from ars.laplace import invert_laplace
+from ars.rate_history import convolve_rates
+
+# границы по умолчанию для скина и lg(ВСС [м3/Па])
+SKIN_BOUNDS = (-5.0, 50.0)
+LOG_STORAGE_BOUNDS = (-14.0, -6.0)
+
+
+# Отклик забойного давления [Па] на единичный дебит скважины с учетом скина skin
+# и ВСС storage [м3/Па]. kernel - решение вида pd_ei, kernel_lapl - вида pd_lapl
+def unit_response(kernel, kernel_lapl, rw, k, skin, storage, B, h, mu, f, ct):
+    eta = k / (mu * f * ct)
+    skin_dp = B * mu / (2 * np.pi * k * h) * skin
+    if storage <= 0:
+        return lambda t: kernel(rw, t, q=1.0, B=B, k=k, h=h, mu=mu, eta=eta, f=f) + skin_dp
+
+    # ВСС: p_w(s) = P / (s (1 + C / B * s * P)), P = s * p_sf(s)
+    def lapl(s):
+        P = s * kernel_lapl(s, r=rw, r_w=rw, q=1.0, B=B, k=k, h=h, mu=mu, eta=eta, f=f) + skin_dp
+        return P / (s * (1 + storage / B * s * P))
+
+    return lambda t: invert_laplace(lapl, t)
+
+
+class Problem:
+    # wells - координаты (W, 2); schedules - [(t_change, q)] по скважинам [с, м3/с];
+    # observations - [(t, p)] замеры забойного давления [с, МПа]; rw - радиусы (W,);
+    # k_bounds - (W, 2) [м2]; fit_skin / fit_storage - подбирать ли скин и ВСС
+    def __init__(self, wells, schedules, observations, rw, k_bounds, PI, B, h, mu, f, ct,
+                 kernel, kernel_lapl, fit_skin=False, fit_storage=False,
+                 skin_bounds=SKIN_BOUNDS, log_storage_bounds=LOG_STORAGE_BOUNDS):
+        self.wells = np.asarray(wells, dtype=float)[:, :2]
+        self.schedules = schedules
+        self.observations = observations
+        self.rw = np.broadcast_to(np.asarray(rw, dtype=float), (len(schedules),))
+        self.k_bounds = np.asarray(k_bounds, dtype=float).reshape(-1, 2)
+        self.PI, self.B, self.h, self.mu, self.f, self.ct = PI, B, h, mu, f, ct
+        self.kernel = kernel
+        self.kernel_lapl = kernel_lapl
+        self.fit_skin = fit_skin
+        self.fit_storage = fit_storage
+        self.skin_bounds = skin_bounds
+        self.log_storage_bounds = log_storage_bounds
+
+    @property
+    def n_wells(self):
+        return len(self.schedules)
+
+    # Вектор параметров: lg(k) по скважинам, затем скины и lg(ВСС), если подбираются
+    def bounds(self):
+        lo = [np.log10(self.k_bounds[:, 0])]
+        hi = [np.log10(self.k_bounds[:, 1])]
+        for fit, (a, b) in ((self.fit_skin, self.skin_bounds), (self.fit_storage, self.log_storage_bounds)):
+            if fit:
+                lo.append(np.full(self.n_wells, a))
+                hi.append(np.full(self.n_wells, b))
+        return np.concatenate(lo), np.concatenate(hi)
+
+    def initial(self):
+        lo, hi = self.bounds()
+        x0 = 0.5 * (lo + hi)
+        if self.fit_skin:
+            x0[self.n_wells:2 * self.n_wells] = 0.0
+        return x0
+
+    def unpack(self, theta):
+        n = self.n_wells
+        k = 10 ** theta[:n]
+        pos = n
+        skin = np.zeros(n)
+        storage = np.zeros(n)
+        if self.fit_skin:
+            skin = theta[pos:pos + n]
+            pos += n
+        if self.fit_storage:
+            storage = 10 ** theta[pos:pos + n]
+        return k, skin, storage
+
+    # Расчетное забойное давление [МПа] в моменты замеров каждой скважины
+    def forward(self, theta):
+        k, skin, storage = self.unpack(np.asarray(theta, dtype=float))
+        result = []
+        for i, (t_obs, _) in enumerate(self.observations):
+            dp = np.zeros(np.size(t_obs))
+            eta = k[i] / (self.mu * self.f * self.ct)
+            for j, (t_change, q) in enumerate(self.schedules):
+                if np.size(t_change) == 0:
+                    continue
+                if i == j:
+                    U = unit_response(self.kernel, self.kernel_lapl, self.rw[i], k[i], skin[i], storage[i],
+                                      self.B, self.h, self.mu, self.f, self.ct)
+                else:
+                    r = np.hypot(*(self.wells[i] - self.wells[j]))
+                    U = lambda t, r=r: self.kernel(r, t, q=1.0, B=self.B, k=k[i], h=self.h, mu=self.mu,
+                                                   eta=eta, f=self.f)
+                dp += convolve_rates(U, t_change, q, t_obs)
+            result.append(self.PI - dp / 1000000)
+        return result
+
+    def residuals(self, theta):
+        model = self.forward(theta)
+        return np.concatenate([m - p for m, (_, p) in zip(model, self.observations)])
+
+
+# Невязки для пула процессов (функция верхнего уровня, чтобы передаваться через pickle)
+def _residuals(theta, problem):
+    return problem.residuals(theta)
+
+
+# Якобиан конечными разностями: прямые расчеты для всех параметров - одной пачкой,
+# при заданном executor - параллельно
+def _jacobian(problem, theta, f0, lo, hi, executor=None, step=1e-4):
+    h = step * np.maximum(1.0, np.abs(theta))
+    # у верхней границы шаг делается назад
+    h = np.where(theta + h > hi, -h, h)
+    points = [theta + np.eye(theta.size)[j] * h[j] for j in range(theta.size)]
+    if executor is None:
+        values = [_residuals(p, problem) for p in points]
+    else:
+        values = list(executor.map(_residuals, points, [problem] * len(points)))
+    return np.stack([(v - f0) / hj for v, hj in zip(values, h)], axis=1)
+
+
+# Адаптация: возвращает словарь с подобранными k [м2], скином, ВСС [м3/Па],
+# расчетными давлениями и результатом scipy.optimize.least_squares
+def history_match(problem, executor=None, max_nfev=50, ftol=1e-8):
+    from scipy.optimize import least_squares
+    lo, hi = problem.bounds()
+    x0 = np.clip(problem.initial(), lo, hi)
+    cache = {}
+
+    evaluations = [0]
+
+    def fun(theta):
+        key = theta.tobytes()
+        if key not in cache:
+            cache.clear()
+            cache[key] = _residuals(theta, problem)
+            evaluations[0] += 1
+            report_progress(min(evaluations[0] / max_nfev, 0.99))
+        return cache[key]
+
+    def jac(theta):
+        return _jacobian(problem, theta, fun(theta), lo, hi, executor=executor)
+
+    fit = least_squares(fun, x0, jac=jac, bounds=(lo, hi), max_nfev=max_nfev, ftol=ftol, x_scale='jac')
+    k, skin, storage = problem.unpack(fit.x)
+    return {'k': k, 'skin': skin, 'storage': storage, 'pressure': problem.forward(fit.x),
+            'rmse': float(np.sqrt(np.mean(fit.fun ** 2))) if fit.fun.size else 0.0, 'fit': fit}
+
+
+# Адаптация как задача фоновой очереди: столбцы якобиана считаются в собственном пуле
+# из workers процессов (при workers <= 1 - последовательно). Возвращает результат
+# history_match без объекта least_squares
+def history_match_job(problem, workers=None, max_nfev=50, ftol=1e-8):
+    workers = min(workers or os.cpu_count() or 1, problem.initial().size)
+    if workers <= 1:
+        result = history_match(problem, max_nfev=max_nfev, ftol=ftol)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            result = history_match(problem, executor=executor, max_nfev=max_nfev, ftol=ftol)
+    result.pop('fit')
+    return result
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""Очередь фоновых расчетов.
+
+Тяжелые расчеты выполняются в пуле процессов (или потоков), а callback-и Dash только
+ставят задачу в очередь, опрашивают ее состояние по идентификатору и забирают результат.
+Функция задачи должна быть объявлена на верхнем уровне модуля (передается в процесс
+через pickle); прогресс она сообщает вызовом report_progress(доля от 0 до 1).
+"""
+
+import multiprocessing
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import CancelledError, ProcessPoolExecutor, ThreadPoolExecutor
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+ERROR = 'error'
+CANCELLED = 'cancelled'
+UNKNOWN = 'unknown'
+
+# приемник прогресса текущей задачи в рабочем процессе/потоке: (словарь прогресса, id задачи)
+_progress = threading.local()
+
+
+# Сообщить долю выполнения текущей задачи (вызывается из функции задачи)
+def report_progress(fraction):
+    sink = getattr(_progress, 'sink', None)
+    if sink is not None:
+        progress, job_id = sink
+        try:
+            progress[job_id] = float(fraction)
+        except (OSError, EOFError, BrokenPipeError):
+            pass
+
+
+def _run(fn, job_id, progress, args, kwargs):
+    _progress.sink = (progress, job_id)
+    try:
+        progress[job_id] = 0.0
+        return fn(*args, **kwargs)
+    finally:
+        _progress.sink = None
+
+
+class JobQueue:
+    # kind: 'process' - пул процессов, 'thread' - пул потоков;
+    # max_finished - сколько завершенных задач хранить до вытеснения самых старых
+    def __init__(self, max_workers=None, kind='process', max_finished=100):
+        if kind not in ('process', 'thread'):
+            raise ValueError("kind должен быть 'process' или 'thread', получено {!r}".format(kind))
+        self.max_workers = max_workers
+        self.kind = kind
+        self.max_finished = max_finished
+        self._executor = None
+        self._manager = None
+        self._progress = None
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    # Пул создается при первой задаче, чтобы импорт модуля не порождал процессы
+    def _ensure_executor(self):
+        if self._executor is None:
+            if self.kind == 'process':
+                self._manager = multiprocessing.Manager()
+                self._progress = self._manager.dict()
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._progress = {}
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    # Пул исполнителя очереди (например, для параллельного расчета якобиана при адаптации)
+    def executor(self):
+        with self._lock:
+            return self._ensure_executor()
+
+    # Поставить задачу в очередь, вернуть ее идентификатор
+    def submit(self, fn, *args, **kwargs):
+        with self._lock:
+            executor = self._ensure_executor()
+            job_id = uuid.uuid4().hex
+            future = executor.submit(_run, fn, job_id, self._progress, args, kwargs)
+            self._jobs[job_id] = {'future': future, 'submitted': time.time(), 'cancelled': False}
+            self._evict()
+        return job_id
+
+    def _evict(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job['future'].done() or job['cancelled']]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            self._forget(job_id)
+
+    def _forget(self, job_id):
+        self._jobs.pop(job_id, None)
+        if self._progress is not None:
+            self._progress.pop(job_id, None)
+
+    # Состояние задачи: {'state', 'progress', 'error', 'elapsed'}
+    def status(self, job_id):
+        job = self._jobs.get(job_id)
+        if job is None:
+            return {'state': UNKNOWN, 'progress': 0.0, 'error': None, 'elapsed': 0.0}
+        future = job['future']
+        progress = self._progress.get(job_id, 0.0) if self._progress is not None else 0.0
+        error = None
+        if job['cancelled'] or future.cancelled():
+            state = CANCELLED
+        elif future.done():
+            error = future.exception()
+            state = ERROR if error is not None else DONE
+            progress = 1.0 if error is None else progress
+        elif future.running():
+            state = RUNNING
+        else:
+            state = PENDING
+        return {'state': state, 'progress': progress, 'error': None if error is None else repr(error),
+                'elapsed': time.time() - job['submitted']}
+
+    # Результат задачи; timeout=0 - не ждать (TimeoutError, если не готова).
+    # pop=True - удалить задачу из очереди после получения результата
+    def result(self, job_id, timeout=None, pop=False):
+        job = self._jobs.get(job_id)
+        if job is None:
+            raise KeyError(job_id)
+        if job['cancelled']:
+            raise CancelledError(job_id)
+        value = job['future'].result(timeout=timeout)
+        if pop:
+            with self._lock:
+                self._forget(job_id)
+        return value
+
+    # Отмена ожидающей задачи: она снимается с очереди. Выполняющуюся или завершенную задачу
+    # прервать нельзя - возвращается False, задача остается в очереди со своим состоянием
+    # и вытесняется после завершения, как остальные
+    def cancel(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or not job['future'].cancel():
+                return False
+            job['cancelled'] = True
+            return True
+
+    def jobs(self):
+        return {job_id: self.status(job_id) for job_id in list(self._jobs)}
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait, cancel_futures=True)
+                self._executor = None
+            if self._manager is not None:
+                self._manager.shutdown()
+                self._manager = None
+            self._progress = None
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""Векторизованное численное обращение преобразования Лапласа.
+
+Функция-изображение F(s) вызывается один раз на массиве узлов формы t.shape + (n,),
+поэтому ядра вида pd_lapl на scipy.special вычисляются одним broadcast-вызовом
+вместо цикла по времени через mpmath.invertlaplace.
+"""
+
+import math
+from fractions import Fraction
+from functools import lru_cache
+
+import numpy as np
+
+from ars.metrics import timed
+
+METHODS = ('stehfest', 'talbot', 'dehoog')
+DEFAULT_DEGREE = {'stehfest': 12, 'talbot': 32, 'dehoog': 20}
+
+
+# Веса Стефеста V_k, k = 1..N (считаются точно в рациональных числах один раз на степень)
+@lru_cache(maxsize=None)
+def stehfest_weights(degree=12):
+    if degree % 2 or degree < 2:
+        raise ValueError('Степень метода Стефеста должна быть четной и >= 2, получено {}'.format(degree))
+    n2 = degree // 2
+    weights = []
+    for k in range(1, degree + 1):
+        v = Fraction(0)
+        for j in range((k + 1) // 2, min(k, n2) + 1):
+            v += Fraction(j ** n2 * math.factorial(2 * j),
+                          math.factorial(n2 - j) * math.factorial(j) * math.factorial(j - 1)
+                          * math.factorial(k - j) * math.factorial(2 * j - k))
+        weights.append((-1) ** (k + n2) * v)
+    v = np.array([float(w) for w in weights])
+    v.flags.writeable = False
+    return v
+
+
+# Узлы и веса фиксированного контура Тальбота (Abate-Valko) для единичного времени
+@lru_cache(maxsize=None)
+def talbot_nodes(degree=32):
+    theta = np.pi * np.arange(1, degree) / degree
+    cot = 1 / np.tan(theta)
+    nodes = np.concatenate(([1.0 + 0j], theta * (cot + 1j)))
+    sigma = theta + (theta * cot - 1) * cot
+    weights = np.concatenate(([0.5 + 0j], 1 + 1j * sigma))
+    nodes.flags.writeable = False
+    weights.flags.writeable = False
+    return nodes, weights
+
+
+def _stehfest(F, t, degree):
+    v = stehfest_weights(degree)
+    a = np.log(2) / t[..., None]
+    s = a * np.arange(1, degree + 1)
+    return a[..., 0] * np.sum(v * F(s), axis=-1)
+
+
+def _talbot(F, t, degree):
+    nodes, weights = talbot_nodes(degree)
+    r = 2 * degree / (5 * t[..., None])
+    s = r * nodes
+    terms = weights * np.exp(s * t[..., None]) * F(s)
+    return (r[..., 0] / degree) * np.real(np.sum(terms, axis=-1))
+
+
+# Алгоритм де Хуга - Найта - Стоукса: ряд Фурье с ускорением через QD-алгоритм,
+# все операции векторизованы по оси времени
+def _dehoog(F, t, degree, tol=1e-16, scale=2.0):
+    m = degree
+    T = scale * t[..., None]
+    gamma = -0.5 * np.log(tol) / T
+    s = gamma + 1j * np.pi * np.arange(2 * m + 1) / T
+    a = np.asarray(F(s), dtype=complex).copy()
+    a[..., 0] /= 2
+
+    # QD-алгоритм: e[r][i], q[r][i], первый индекс - номер столбца таблицы
+    # форма берется из изображения: F может транслировать t на дополнительные оси
+    shape = a.shape[:-1]
+    e = [np.zeros(shape + (2 * m + 1,), dtype=complex) for _ in range(m + 1)]
+    q = [np.zeros(shape + (2 * m,), dtype=complex) for _ in range(m + 1)]
+    q[1][..., :2 * m] = a[..., 1:2 * m + 1] / a[..., :2 * m]
+    for r in range(1, m + 1):
+        n = 2 * (m - r) + 1
+        e[r][..., :n] = q[r][..., 1:n + 1] - q[r][..., :n] + e[r - 1][..., 1:n + 1]
+        if r < m:
+            n = 2 * (m - r)
+            q[r + 1][..., :n] = q[r][..., 1:n + 1] * e[r][..., 1:n + 1] / e[r][..., :n]
+
+    # коэффициенты цепной дроби
+    d = [a[..., 0]]
+    for r in range(1, m + 1):
+        d.append(-q[r][..., 0])
+        d.append(-e[r][..., 0])
+
+    # рекуррентное вычисление подходящих дробей A_n / B_n
+    z = np.exp(1j * np.pi * t / T[..., 0])
+    a_prev, a_cur = np.zeros_like(z), d[0] * np.ones_like(z)
+    b_prev, b_cur = np.ones_like(z), np.ones_like(z)
+    for n in range(1, 2 * m):
+        a_prev, a_cur = a_cur, a_cur + d[n] * z * a_prev
+        b_prev, b_cur = b_cur, b_cur + d[n] * z * b_prev
+
+    # ускорение сходимости остаточным членом цепной дроби
+    h2m = 0.5 * (1 + (d[2 * m - 1] - d[2 * m]) * z)
+    r2m = -h2m * (1 - np.sqrt(1 + d[2 * m] * z / h2m ** 2))
+    a_last = a_cur + r2m * a_prev
+    b_last = b_cur + r2m * b_prev
+    return np.exp(gamma[..., 0] * t) / T[..., 0] * np.real(a_last / b_last)
+
+
+_INVERTERS = {'stehfest': _stehfest, 'talbot': _talbot, 'dehoog': _dehoog}
+
+
+# Обращение преобразования Лапласа функции F(s) для массива времен t.
+# F должна принимать массив s формы t.shape + (n,); методы talbot и dehoog
+# используют комплексные s, поэтому ядро должно быть построено на sc.kv, а не на sc.kn
+@timed('kernel:invert_laplace')
+def invert_laplace(F, t, method='stehfest', degree=None):
+    if method not in _INVERTERS:
+        raise ValueError('Неизвестный метод обращения {!r}, доступны: {}'.format(method, ', '.join(METHODS)))
+    if degree is None:
+        degree = DEFAULT_DEGREE[method]
+    t = np.asarray(t, dtype=float)
+    scalar = t.ndim == 0
+    t = np.atleast_1d(t)
+    result = np.zeros(t.shape)
+    positive = t > 0
+    if positive.all():
+        result = _INVERTERS[method](F, t, degree)
+    elif positive.any():
+        result[positive] = _INVERTERS[method](F, t[positive], degree)
+    return result[0] if scalar else result
+
+
+# Аналог anaflow.get_lap_inv: возвращает функцию времени для заданного изображения
+def get_lap_inv(F, method='stehfest', degree=None, **kwargs):
+    if kwargs:
+        kernel = lambda s: F(s, **kwargs)
+    else:
+        kernel = F
+
+    def inverse(t):
+        return invert_laplace(kernel, t, method=method, degree=degree)
+
+    return inverse
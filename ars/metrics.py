@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""Замеры времени обратных вызовов Dash и расчетных ядер.
+
+Для каждого имени хранятся число вызовов, суммарное время и скользящее окно последних
+WINDOW замеров (время и объем результата), по которому считаются процентили.
+    @timed('kernel:pd_ei')      - замер функции (ядра);
+    instrument_app(app)         - замер всех обратных вызовов, объявленных после вызова:
+                                  время функции (расчет и построение графика) и время и
+                                  объем ответа HTTP (вместе с сериализацией JSON), а также
+                                  маршрут METRICS_ROUTE с текущими показателями в JSON
+                                  (сброс - POST METRICS_ROUTE/reset, если разрешен).
+Замеры идут в процессе, где выполняется функция: расчеты в процессах фоновой очереди
+(ars/jobs.py) учитываются только общим временем задания. ARS_METRICS=0 отключает замеры:
+timed тогда возвращает функцию без обертки, и ядра не платят за проверку флага на каждом вызове.
+"""
+
+import functools
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+# размер скользящего окна и процентили
+WINDOW = 1000
+PERCENTILES = (50, 90, 99)
+METRICS_ROUTE = '/metrics'
+
+
+# Объем результата в байтах: массивы numpy, строки и вложенные списки/словари
+def payload_size(value):
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    if isinstance(value, (list, tuple)):
+        return sum(payload_size(v) for v in value)
+    if isinstance(value, dict):
+        return sum(payload_size(v) for v in value.values())
+    return 8
+
+
+class Metrics:
+    def __init__(self, window=WINDOW, enabled=True):
+        self.window = window
+        self.enabled = enabled
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds, nbytes=None):
+        if not self.enabled:
+            return
+        with self._lock:
+            series = self._series.get(name)
+            if series is None:
+                series = self._series[name] = {'count': 0, 'total': 0.0, 'seconds': deque(maxlen=self.window),
+                                               'bytes': deque(maxlen=self.window)}
+            series['count'] += 1
+            series['total'] += seconds
+            series['seconds'].append(seconds)
+            if nbytes is not None:
+                series['bytes'].append(nbytes)
+
+    # Показатели по именам: число вызовов, суммарное время [с], процентили времени [мс]
+    # и объема результата [байт] по скользящему окну
+    def snapshot(self):
+        with self._lock:
+            items = [(name, s['count'], s['total'], np.array(s['seconds']), np.array(s['bytes']))
+                     for name, s in self._series.items()]
+        result = {}
+        for name, count, total, seconds, sizes in sorted(items):
+            entry = {'count': count, 'total_s': total, 'mean_ms': 1000 * total / count,
+                     'max_ms': 1000 * float(seconds.max())}
+            for p, value in zip(PERCENTILES, np.percentile(seconds, PERCENTILES)):
+                entry['p{}_ms'.format(p)] = 1000 * float(value)
+            if sizes.size:
+                entry['bytes_mean'] = float(sizes.mean())
+                entry['bytes_max'] = int(sizes.max())
+                for p, value in zip(PERCENTILES, np.percentile(sizes, PERCENTILES)):
+                    entry['bytes_p{}'.format(p)] = float(value)
+            result[name] = entry
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+
+# Общий реестр процесса
+metrics = Metrics(enabled=os.environ.get('ARS_METRICS', '1') != '0')
+
+
+# Декоратор замера: время вызова и объем результата под именем name (по умолчанию - имя функции).
+# Флаг metrics.enabled проверяется один раз при декорировании: при отключенных замерах
+# функция возвращается как есть
+def timed(name=None, size=True):
+    def decorator(func):
+        if not metrics.enabled:
+            return func
+        label = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            result = func(*args, **kwargs)
+            metrics.record(label, time.perf_counter() - start, payload_size(result) if size else None)
+            return result
+
+        wrapper.metric = label
+        return wrapper
+    return decorator
+
+
+# Первый выход обратного вызова Dash в виде 'id.свойство'
+def _first_output(args, kwargs):
+    for item in list(args) + [kwargs.get('output')]:
+        if isinstance(item, (list, tuple)):
+            item = item[0] if item else None
+        if hasattr(item, 'component_id') and hasattr(item, 'component_property'):
+            if type(item).__name__ == 'Output':
+                return '{}.{}'.format(item.component_id, item.component_property)
+    return '?'
+
+
+# Замеры обратных вызовов приложения Dash и маршрут METRICS_ROUTE (GET - показатели в JSON).
+# allow_reset=True - также POST METRICS_ROUTE/reset для сброса замеров.
+# Вызывается сразу после создания app, до объявления обратных вызовов
+def instrument_app(app, registry=metrics, allow_reset=False):
+    import flask
+
+    register = app.callback
+
+    def callback(*args, **kwargs):
+        decorator = register(*args, **kwargs)
+        output = _first_output(args, kwargs)
+
+        def wrap(func):
+            return decorator(timed('callback:{}[{}]'.format(func.__name__, output), size=False)(func))
+        return wrap
+
+    app.callback = callback
+    server = app.server
+
+    # ключ ответа Dash (body['output']) -> имя замера функции
+    def http_name(output):
+        entry = app.callback_map.get(output, {})
+        func = getattr(entry.get('callback'), '__wrapped__', None)
+        return 'http:{}'.format(getattr(func, 'metric', 'callback:[{}]'.format(output))[len('callback:'):])
+
+    @server.before_request
+    def start_timer():
+        flask.g.ars_metrics_start = time.perf_counter()
+
+    @server.after_request
+    def record_response(response):
+        start = getattr(flask.g, 'ars_metrics_start', None)
+        if registry.enabled and start is not None and flask.request.path.endswith('_dash-update-component'):
+            body = flask.request.get_json(silent=True) or {}
+            size = response.calculate_content_length()
+            registry.record(http_name(body.get('output', '?')), time.perf_counter() - start,
+                            size if size is not None else len(response.get_data()))
+        return response
+
+    @server.route(METRICS_ROUTE, methods=['GET'])
+    def metrics_route():
+        return flask.jsonify(registry.snapshot())
+
+    if allow_reset:
+        @server.route(METRICS_ROUTE + '/reset', methods=['POST'])
+        def metrics_reset():
+            data = registry.snapshot()
+            registry.reset()
+            return flask.jsonify(data)
+
+    return app
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""Расчет модели по параметрам пласта и скважин без интерфейса.
+
+run_model - точка входа для фоновой очереди (ars/jobs.py), пакетных расчетов и тестов:
+модуль не импортирует Dash и matplotlib, поэтому процессы-исполнители стартуют быстро.
+"""
+
+import numpy as np
+
+from ars.adaptive import AdaptiveGrid, log_singularity
+from ars.bounded import circle_pressure, rectangle_pressure, NO_FLOW
+from ars.grid import Grid
+from ars.jobs import report_progress
+from ars.metrics import timed
+from ars.solutions import pd_ei
+from ars.sources import VERTICAL, source_pressure
+from ars.streamlines import map_velocity, well_streamlines
+from ars.superposition import superpose
+
+# Разрешение и тип данных карты давлений
+MAP_SIZE = 100
+MAP_DTYPE = np.float32
+# момент времени карты давлений, с
+MAP_TIME = 100000000
+
+
+# Депрессия [Па] от группы скважин в точках (x, y) на моменты t для выбранной модели пласта.
+# Круговой пласт - с центром в (0, 0) радиуса r_e, прямоугольный - a x b с центром в (0, 0).
+# Горизонтальные скважины, трещины ГРП и частичное вскрытие (geometry, см. ars/sources.py)
+# учитываются в бесконечном пласте; в ограниченных пластах все скважины считаются вертикальными.
+# z - высота точек над подошвой (та же форма, что у x) для скважин с частичным вскрытием
+# и горизонтальных; по умолчанию - на высоте ствола
+def reservoir_pressure(reservoir, boundary, wells, rates, x, y, t, r_e, a, b, geometry=None, z=None, **params):
+    if reservoir == 'circle':
+        return circle_pressure(wells, rates, x, y, t, r_e, boundary, **params)
+    if reservoir == 'rectangle':
+        return rectangle_pressure(wells, rates, x, y, t, a, b, boundary, **params)
+    x = np.asarray(x, dtype=float)
+    t = np.asarray(t, dtype=float)
+    y = np.broadcast_to(np.asarray(y, dtype=float), x.shape)
+    if z is not None:
+        z = np.broadcast_to(np.asarray(z, dtype=float), x.shape).ravel()
+    plain = np.ones(len(rates), dtype=bool)
+    result = 0
+    for i, item in enumerate(geometry or []):
+        p = source_pressure(item, wells[i], rates[i], x.ravel(), y.ravel(), t, z=z, **params)
+        if p is not None:
+            plain[i] = False
+            result = result + p.reshape(x.shape + t.shape)
+    return result + superpose(pd_ei, wells[plain], rates[plain], x, y, t, **params)
+
+
+# Все ли скважины - линейные источники в бесконечном пласте (вертикальные на всю толщину h)
+def line_sources(reservoir, geometry=None, h=None):
+    def plain(item):
+        penetration = item.get('penetration')
+        return item.get('kind', VERTICAL) == VERTICAL and not (penetration and h and penetration < h)
+    return reservoir == 'infinite' and all(plain(item or {}) for item in geometry or [])
+
+
+# Нужна ли карте адаптивная сетка: окупается, когда источник дорог - ограниченный пласт
+# (ряды и обращение Лапласа) или скважины сложной геометрии (ars/sources.py); карта линейных
+# источников в бесконечном пласте быстрее считается в каждом узле
+def adaptive_map(reservoir, geometry=None, h=None):
+    return not line_sources(reservoir, geometry, h)
+
+
+# Полуширина области карты: для бесконечного пласта область охватывает все скважины,
+# для ограниченного - весь пласт
+def map_extent(reservoir, wells, r_e, a, b):
+    if reservoir == 'circle':
+        return r_e
+    if reservoir == 'rectangle':
+        return max(a, b) / 2
+    return max(300, 1.2 * np.abs(wells[:, :2]).max())
+
+
+# Расчет модели по параметрам пласта и скважин (выполняется в фоновой очереди job_queue);
+# rw - радиус скважины [м]: забойное давление считается на стенке первой скважины.
+# map_size=0 - только кривая давления на забое (без карты и линий тока);
+# adaptive=True - давление считается в узлах адаптивной сетки вокруг скважин (ars/adaptive.py)
+# и интерполируется на равномерную сетку карты, False - в каждом узле карты; по умолчанию (None) -
+# адаптивная сетка только для дорогих источников (см. adaptive_map)
+@timed('kernel:run_model')
+def run_model(B, k, h, f, ct, mu, PI, wells, rates, reservoir='infinite', boundary=NO_FLOW, r_e=500, a=1000, b=1000,
+              geometry=None, map_size=MAP_SIZE, adaptive=None, rw=0.1):
+    t = np.logspace(-1, 4, 100)
+    eta = k / (mu * f * ct)
+    model = dict(reservoir=reservoir, boundary=boundary, r_e=r_e, a=a, b=b, geometry=geometry)
+    # давление на стенке первой скважины с учетом интерференции остальных
+    p_well = reservoir_pressure(wells=wells[:, :2], rates=rates, x=np.array([wells[0, 0] + rw]),
+                                y=np.array([wells[0, 1]]), t=t, B = B, k = k, h = h, mu = mu, eta = eta, f = f,
+                                **model)[0] / 1000000
+    result_well_param = []
+    result_well_param.append([i for i in t])
+    result_well_param.append(p_well)
+    report_progress(0.5)
+    if not map_size:
+        return result_well_param, [[], [], np.zeros((0, 0), dtype=MAP_DTYPE)], [[], []]
+
+    # зададим параметры воронки депрессии: для бесконечного пласта область охватывает все скважины,
+    # для ограниченного - весь пласт
+    extent = map_extent(reservoir, wells, r_e, a, b)
+
+    # зададим координатную сетку основываясь на параметрах
+    grid = Grid.from_extent(extent, nx=map_size, dtype=MAP_DTYPE)
+    x, y = grid.x, grid.y
+
+    # рассчитаем значение давлений во всех точках сетки как сумму вкладов всех скважин
+    # (за пределами ограниченного пласта - NaN)
+    def pressure(X, Y, Z=None):
+        return reservoir_pressure(wells=wells[:, :2], rates=rates, x=X, y=Y, t=MAP_TIME, r_min=rw, B = B, k = k,
+                                  h = h, mu = mu, eta = eta, f = f, **model) / 1000000
+    if adaptive is None:
+        adaptive = adaptive_map(reservoir, geometry, h)
+    if adaptive:
+        mesh = AdaptiveGrid(wells, extent, reservoir, r_e, a, b, geometry, rw=rw)
+        # особенность ln r у вертикальных скважин (в ограниченном пласте - у всех) вычитается перед
+        # интерполяцией
+        vertical = [reservoir != 'infinite' or (item or {}).get('kind', VERTICAL) == VERTICAL
+                    for item in geometry or [{}] * len(rates)]
+        singular = log_singularity(wells, -np.where(vertical, rates, 0.0) * B * mu / (2 * np.pi * k * h) / 1000000,
+                                   rw)
+        p_mesh_full = mesh.interpolate(mesh.evaluate(lambda X, Y: pressure(X, Y).ravel()), x, y, dtype=MAP_DTYPE,
+                                       singular=singular)
+    else:
+        p_mesh_full = grid.evaluate(pressure)[0]
+
+    result_contur = []
+    result_contur.append(list(x))
+    result_contur.append(list(y))
+    result_contur.append(p_mesh_full)
+    # удалим значения за контуром, так как в данном случае они не имеют смысла
+    # p_mesh[np.where(p_mesh > pres)] = pres
+    report_progress(0.8)
+
+    # линии тока: для линейных источников в бесконечном пласте - по аналитической скорости фильтрации,
+    # иначе - по градиенту рассчитанной карты (с учетом границ и геометрии скважин)
+    velocity = None if line_sources(reservoir, geometry, h) else map_velocity(x, y, p_mesh_full * 1000000, k, mu)
+    result_line = list(well_streamlines(wells[:, :2], rates, MAP_TIME, B = B, h = h, eta = eta,
+                                        bounds=(x[0], x[-1], y[0], y[-1]), velocity=velocity))
+    return result_well_param, result_contur, result_line
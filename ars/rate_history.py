@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""Суперпозиция во времени для переменного дебита.
+
+Кусочно-постоянный график дебита q_i, действующий с момента t_i, дает депрессию
+dp(t) = sum_i (q_i - q_{i-1}) * U(t - t_i), где U - отклик на единичный дебит
+(pd_ei или pd_lapl при q = 1). Вместо двойной суммы O(N^2) график переносится на
+равномерную сетку и свертывается через БПФ за O(N log N); для небольших задач
+и произвольных моментов вывода есть точный блочный расчет.
+"""
+
+import numpy as np
+
+# предельное число узлов равномерной сетки для свертки через БПФ и число узлов,
+# на которое выбирается шаг по умолчанию
+MAX_GRID = 2 ** 22
+TARGET_GRID = 2 ** 16
+# при числе пар (изменения дебита x моменты вывода) меньше этого считаем напрямую
+DIRECT_LIMIT = 10 ** 6
+# бюджет памяти на блок прямого расчета, байт
+CHUNK_BYTES = 64 * 2 ** 20
+
+
+# Отклик U(t) с нулем при t <= 0 (решения вида pd_ei не определены в нуле)
+def _response(unit_response, t):
+    t = np.asarray(t, dtype=float)
+    result = np.zeros(t.shape)
+    positive = t > 0
+    if positive.any():
+        result[positive] = unit_response(t[positive])
+    return result
+
+
+# Приведение графика дебита: моменты изменения по возрастанию и скачки dq
+def _steps(t_change, q):
+    t_change = np.asarray(t_change, dtype=float).ravel()
+    q = np.asarray(q, dtype=float).ravel()
+    if t_change.shape != q.shape:
+        raise ValueError('Число моментов изменения дебита ({}) не совпадает с числом дебитов ({})'.format(
+            t_change.size, q.size))
+    order = np.argsort(t_change, kind='stable')
+    t_change, q = t_change[order], q[order]
+    dq = np.diff(q, prepend=0.0)
+    return t_change, dq
+
+
+# Точный расчет sum_i dq_i * U(t - t_i) блоками по моментам вывода
+def convolve_direct(unit_response, t_change, q, t_out, chunk_bytes=CHUNK_BYTES):
+    t_change, dq = _steps(t_change, q)
+    t_out = np.asarray(t_out, dtype=float)
+    flat = t_out.ravel()
+    result = np.zeros(flat.size)
+    chunk = int(max(1, chunk_bytes // (8 * max(t_change.size, 1))))
+    for j in range(0, flat.size, chunk):
+        lag = flat[j:j + chunk, None] - t_change[None, :]
+        result[j:j + chunk] = _response(unit_response, lag) @ dq
+    return result.reshape(t_out.shape)
+
+
+# Свертка через БПФ на равномерной сетке с шагом dt (по умолчанию - минимальный интервал
+# между изменениями дебита, но не мельче (t_end - t_0) / target_grid, и всегда не мельче
+# (t_end - t_0) / max_grid); в свертке моменты изменения дебита привязываются к ближайшему
+# узлу сетки, несколько скачков могут попасть в один узел.
+# Для момента t между узлами j и j + 1 вклад скачков последних near узлов считается точно
+# по исходным моментам (в том числе скачков ближе шага сетки), а вклад более ранних
+# (гладкий на интервале) - линейной интерполяцией двух сверток
+def convolve_fft(unit_response, t_change, q, t_out, dt=None, max_grid=MAX_GRID, near=8, target_grid=TARGET_GRID,
+                 chunk_bytes=CHUNK_BYTES):
+    from scipy.signal import fftconvolve
+    t_change, dq = _steps(t_change, q)
+    t_out = np.asarray(t_out, dtype=float)
+    t0 = t_change[0]
+    span = max(t_out.max(), t_change[-1]) - t0
+    if dt is None:
+        gaps = np.diff(t_change)
+        gaps = gaps[gaps > 0]
+        dt = max(gaps.min(), span / target_grid) if gaps.size else max(span, 1.0) / 1000
+    dt = max(dt, span / max_grid)
+    n = int(np.ceil(span / dt)) + 2
+    nodes = np.minimum(np.rint((t_change - t0) / dt).astype(np.intp), n - 1)
+    steps = np.zeros(n)
+    np.add.at(steps, nodes, dq)
+    # смещения скачков от узлов: U(lag - delta) ~ U(lag) - delta * U'(lag) - поправка первого
+    # порядка к привязке, когда шаг сетки крупнее интервалов между изменениями дебита
+    shifts = np.zeros(n)
+    np.add.at(shifts, nodes, dq * (t_change - t0 - nodes * dt))
+
+    # G_m[j] = sum_{k <= j - m} steps[k] * U((j - k) dt) и то же для m + 1
+    kernel = _response(unit_response, dt * np.arange(n))
+    slope = np.gradient(kernel, dt)
+    far, far_slope = kernel.copy(), slope.copy()
+    far[:near] = far_slope[:near] = 0.0
+    g_near = fftconvolve(steps, far)[:n] - fftconvolve(shifts, far_slope)[:n]
+    far[near] = far_slope[near] = 0.0
+    g_next = fftconvolve(steps, far)[:n] - fftconvolve(shifts, far_slope)[:n]
+
+    x = (t_out.ravel() - t0) / dt
+    inside = x >= 0
+    x = np.clip(x, 0, n - 2)
+    j = x.astype(np.intp)
+    w = x - j
+    result = (1 - w) * g_near[j] + w * g_next[j + 1]
+    # точный вклад скачков с узлами j - near + 1 .. j + 1 по их исходным моментам времени;
+    # блоками по моментам вывода (в одном узле может быть много близких скачков)
+    lo = np.searchsorted(nodes, j - near + 1, side='left')
+    hi = np.searchsorted(nodes, j + 1, side='right')
+    count = hi - lo
+    flat = t_out.ravel()
+    start = 0
+    while start < flat.size:
+        # блок, в котором число пар (момент x скачок) укладывается в бюджет памяти
+        width = np.maximum.accumulate(count[start:])
+        stop = start + max(1, int(np.searchsorted(width * np.arange(1, width.size + 1), chunk_bytes // 8)))
+        block = slice(start, stop)
+        start = stop
+        size = count[block].max(initial=0)
+        if size == 0:
+            continue
+        idx = lo[block, None] + np.arange(size)[None, :]
+        valid = idx < hi[block, None]
+        idx = np.minimum(idx, t_change.size - 1)
+        lag = flat[block, None] - t_change[idx]
+        result[block] += np.sum(np.where(valid, dq[idx] * _response(unit_response, lag), 0.0), axis=1)
+    result[~inside] = 0.0
+    return result.reshape(t_out.shape)
+
+
+# Депрессия на моменты t_out для графика дебита (t_change, q).
+# method: 'direct' - точная сумма, 'fft' - свертка на равномерной сетке, 'auto' - выбор по размеру задачи
+def convolve_rates(unit_response, t_change, q, t_out, method='auto', dt=None, max_grid=MAX_GRID):
+    t_out = np.asarray(t_out, dtype=float)
+    if method == 'auto':
+        method = 'direct' if np.size(t_change) * t_out.size <= DIRECT_LIMIT else 'fft'
+    if method == 'direct':
+        return convolve_direct(unit_response, t_change, q, t_out)
+    if method != 'fft':
+        raise ValueError('Неизвестный метод свертки {!r}'.format(method))
+    return convolve_fft(unit_response, t_change, q, t_out, dt=dt, max_grid=max_grid)
+
+
+# График дебита скважины из таблицы table_model_Q: время [ч] -> [с], дебит [м3/сут] -> [м3/с].
+# Также возвращает замеренное давление [МПа] (NaN, если не задано)
+def schedule_from_table(rows_in_model_q, well):
+    t, q, p = [], [], []
+    for row in rows_in_model_q or []:
+        try:
+            time = float(row.get('Время, ч'))
+            rate = float(row.get('Rate {}'.format(well)))
+        except (TypeError, ValueError):
+            continue
+        try:
+            pressure = float(row.get('Pressure {}'.format(well)))
+        except (TypeError, ValueError):
+            pressure = np.nan
+        t.append(time * 3600)
+        q.append(rate / 86400)
+        p.append(pressure)
+    return np.array(t), np.array(q), np.array(p)
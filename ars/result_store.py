@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""Серверное хранилище результатов расчета.
+
+Массивы остаются на сервере, а в dcc.Store браузера передаются только короткие
+описатели {'handle', 'shape', 'dtype'}. Хранилище держит массивы в памяти с
+вытеснением по LRU; при заданном spill_dir вытесненные массивы сохраняются в .npy
+и читаются обратно через np.load(mmap_mode='r'), в том числе другими процессами сервера.
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from ars.transport import decode_array
+
+
+def is_handle(payload):
+    return isinstance(payload, dict) and 'handle' in payload
+
+
+class ResultStore:
+    # max_bytes - объем массивов в памяти; spill_dir - каталог для вытесненных массивов
+    # (None - без записи на диск); max_disk_bytes - предельный объем каталога
+    def __init__(self, max_bytes=256 * 2 ** 20, spill_dir=None, max_disk_bytes=2 * 2 ** 30):
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.nbytes = 0
+        self._memory = OrderedDict()
+        self._lock = threading.RLock()
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.spill_dir, key + '.npy')
+
+    # Сохранить массив, вернуть описатель. Ключ - хэш содержимого, поэтому одинаковые
+    # результаты разных пользователей хранятся один раз
+    def put(self, value, dtype=None):
+        arr = np.ascontiguousarray(value, dtype=dtype)
+        key = hashlib.sha1(arr.dtype.str.encode() + str(arr.shape).encode() + arr.tobytes()).hexdigest()
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+            else:
+                arr.flags.writeable = False
+                self._memory[key] = arr
+                self.nbytes += arr.nbytes
+                self._evict()
+        return {'handle': key, 'shape': list(arr.shape), 'dtype': arr.dtype.name}
+
+    def _evict(self):
+        while self.nbytes > self.max_bytes and len(self._memory) > 1:
+            key, arr = self._memory.popitem(last=False)
+            self.nbytes -= arr.nbytes
+            if self.spill_dir:
+                self._spill(key, arr)
+
+    def _spill(self, key, arr):
+        path = self._path(key)
+        if not os.path.exists(path):
+            tmp = path + '.tmp'
+            with open(tmp, 'wb') as f:
+                np.save(f, arr)
+            os.replace(tmp, path)
+        self._trim_disk()
+
+    # Удаление самых старых файлов при превышении max_disk_bytes
+    def _trim_disk(self):
+        entries = []
+        for name in os.listdir(self.spill_dir):
+            if name.endswith('.npy'):
+                path = os.path.join(self.spill_dir, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    # Массив по описателю (или ключу); KeyError, если он вытеснен без записи на диск
+    def get(self, handle):
+        key = handle['handle'] if is_handle(handle) else handle
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+        if self.spill_dir:
+            try:
+                return np.load(self._path(key), mmap_mode='r')
+            except (OSError, ValueError):
+                pass
+        raise KeyError(key)
+
+    def __contains__(self, handle):
+        try:
+            self.get(handle)
+        except KeyError:
+            return False
+        return True
+
+    # Значение из dcc.Store: описатель, base64-буфер или обычный список
+    def resolve(self, payload):
+        if is_handle(payload):
+            return self.get(payload)
+        return decode_array(payload)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self.nbytes = 0
+            if self.spill_dir:
+                for name in os.listdir(self.spill_dir):
+                    if name.endswith('.npy'):
+                        try:
+                            os.remove(os.path.join(self.spill_dir, name))
+                        except OSError:
+                            pass
+
+    def stats(self):
+        with self._lock:
+            return {'items': len(self._memory), 'nbytes': self.nbytes, 'max_bytes': self.max_bytes,
+                    'spill_dir': self.spill_dir}
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""Параметры расчета из полей интерфейса.
+
+Поля table-geo и params_model_well_table (с единицами интерфейса: мД, 1/МПа, мПа*с,
+м3/сут, м) переводятся в параметры run_model в СИ. Используется и обратным вызовом
+Dash, и пакетным расчетом (ars/batch.py), поэтому сценарии в файле задаются теми же
+названиями полей, что и в таблицах интерфейса.
+"""
+
+import numpy as np
+
+from ars.bounded import BOUNDARIES, CIRCLE_BOUNDARIES, NO_FLOW, CONSTANT_PRESSURE, MIXED
+from ars.sources import parse_geometry
+from ars.superposition import parse_wells, well_rows
+from ars.uncertainty import FIXED, UNIFORM, TRIANGULAR, NORMAL, LOGNORMAL, UNCERTAIN
+
+# Поля table-geo: название, параметр run_model, множитель перевода в СИ, значение по умолчанию
+GEO_FIELDS = [
+    ('Объемный коэффициент, м3/м3', 'B', 1.0, 1.25),
+    ('Проницаемость, мД', 'k', 1e-15, 50),
+    ('Толщина пласта, м', 'h', 1.0, 9.144),
+    ('Пористость', 'f', 1.0, 0.3),
+    ('Полная сжимаемость, 1/МПа', 'ct', 1e-6, 0.00247),
+    ('Вязкость нефти, мПа', 'mu', 1e-3, 3),
+    ('Начальное пластовое давление, МПа', 'PI', 1e6, 34.47),
+    ('Радиус контура питания, м', 'r_e', 1.0, 500),
+    ('Длина пласта X, м', 'a', 1.0, 1000),
+    ('Ширина пласта Y, м', 'b', 1.0, 1000),
+]
+
+# Модели пласта и границ из выпадающих списков (ars/bounded.py)
+RESERVOIR_MODELS = {'Бесконечный': 'infinite', 'Круговой': 'circle', 'Прямоугольный параллелепипед': 'rectangle'}
+BOUNDARY_MODELS = {'Непротекаемые': NO_FLOW, 'Постоянное давление': CONSTANT_PRESSURE, 'Смешанные': MIXED}
+# граничные условия, доступные для модели пласта (для бесконечного граница не используется)
+RESERVOIR_BOUNDARIES = {'infinite': BOUNDARIES, 'circle': CIRCLE_BOUNDARIES, 'rectangle': BOUNDARIES}
+
+# Распределения параметров для расчета Монте-Карло (ars/uncertainty.py)
+UNCERTAINTY_DISTRIBUTIONS = {'Постоянное': FIXED, 'Равномерное': UNIFORM, 'Треугольное': TRIANGULAR,
+                             'Нормальное': NORMAL, 'Логнормальное': LOGNORMAL}
+
+# Дебит по умолчанию, м3/с (одна добывающая скважина в (0, 0), если скважины не заданы)
+DEFAULT_RATE = 0.00092
+# радиус скважины по умолчанию, м
+DEFAULT_RW = 0.1
+
+
+# Параметры пласта в СИ из словаря {название поля table-geo: значение}; пропуски - по умолчанию
+def geo_params(values):
+    params = {}
+    for name, key, scale, default in GEO_FIELDS:
+        value = values.get(name)
+        params[key] = float(default if value in (None, '') else value) * scale
+    return params
+
+
+# Распределения неопределенных параметров в СИ из строк таблицы неопределенности
+# (Parameter - поле table-geo, 'Распределение', 'Мин', 'Мода', 'Макс'); пустая мода - значение из geo.
+# Возвращает {параметр run_model: (вид, мин, мода, макс)} без постоянных параметров
+def uncertainty_specs(rows, geo):
+    fields = {name: (key, scale, default) for name, key, scale, default in GEO_FIELDS}
+    specs = {}
+    for row in rows or []:
+        key, scale, default = fields.get(row.get('Parameter'), (None, 1.0, None))
+        kind = UNCERTAINTY_DISTRIBUTIONS.get(row.get('Распределение'), FIXED)
+        if key not in UNCERTAIN or kind == FIXED:
+            continue
+        mode = row.get('Мода')
+        if mode in (None, ''):
+            mode = geo.get(row['Parameter'])
+        if mode in (None, ''):
+            mode = default
+        low, high = row.get('Мин'), row.get('Макс')
+        low = mode if low in (None, '') else low
+        high = mode if high in (None, '') else high
+        specs[key] = (kind, float(low) * scale, float(mode) * scale, float(high) * scale)
+    return specs
+
+
+# Радиус скважины [м] из table_model_wells ('Радиус скважины, м') для первой скважины table_wells -
+# той, на стенке которой считается забойное давление; без значения - DEFAULT_RW
+def well_radius(rows_in_wells, rows_in_model_wells):
+    first = next((str(row.get('Скважина')) for row, _, _ in well_rows(rows_in_wells)), None)
+    for row in rows_in_model_wells or []:
+        if row.get('Parameter') == 'Радиус скважины, м':
+            try:
+                value = float(row.get(first))
+            except (TypeError, ValueError):
+                break
+            if value > 0:
+                return value
+    return DEFAULT_RW
+
+
+# Названия моделей границ из выпадающего списка, доступные для модели пласта reservoir
+# (название из выпадающего списка)
+def boundary_names(reservoir):
+    allowed = RESERVOIR_BOUNDARIES[RESERVOIR_MODELS.get(reservoir, 'infinite')]
+    return [name for name, boundary in BOUNDARY_MODELS.items() if boundary in allowed]
+
+
+# Параметры run_model по таблицам интерфейса: table-geo (словарь поле -> значение),
+# table_wells, table_model_wells и названия моделей пласта и границ из выпадающих списков.
+# Граница, недоступная для модели пласта (см. RESERVOIR_BOUNDARIES), - ValueError
+def model_params(geo, rows_in_wells, rows_in_model_wells, reservoir=None, boundary=None):
+    if boundary in BOUNDARY_MODELS and boundary not in boundary_names(reservoir):
+        raise ValueError('Модель границ {!r} недоступна для модели пласта {!r}'.format(boundary, reservoir))
+    params = geo_params(geo)
+    # скважины из table_wells (дебиты из table_model_wells); без скважин - одна добывающая в (0, 0)
+    wells, rates = parse_wells(rows_in_wells, rows_in_model_wells, default_q=DEFAULT_RATE)
+    geometry = parse_geometry(rows_in_wells, rows_in_model_wells)
+    if rates.size == 0:
+        wells, rates, geometry = np.zeros((1, 3)), np.array([DEFAULT_RATE]), []
+    params.update(wells=wells, rates=rates, geometry=geometry, rw=well_radius(rows_in_wells, rows_in_model_wells),
+                  reservoir=RESERVOIR_MODELS.get(reservoir, 'infinite'),
+                  boundary=BOUNDARY_MODELS.get(boundary, NO_FLOW))
+    return params
+
+
+# Таблицы интерфейса из описания сценария: поля table-geo, 'Модель пласта', 'Модель границ'
+# и список скважин 'Скважины' - словари с полями table_wells и params_model_well_table.
+# Возвращает (geo, rows_in_wells, rows_in_model_wells, reservoir, boundary)
+def scenario_tables(scenario):
+    geo = {name: scenario[name] for name, *_ in GEO_FIELDS if name in scenario}
+    rows_in_wells, model = [], {}
+    for i, well in enumerate(scenario.get('Скважины') or []):
+        name = str(well.get('Скважина', i + 1))
+        rows_in_wells.append({'Скважина': name, 'Тип скважины': str(well.get('Тип скважины', '0')),
+                              'X координата': well.get('X координата', 0),
+                              'Y координата': well.get('Y координата', 0),
+                              'Z координата': well.get('Z координата', 0)})
+        for parameter, value in well.items():
+            model.setdefault(parameter, {'Parameter': parameter})[name] = value
+    return geo, rows_in_wells, list(model.values()), scenario.get('Модель пласта'), scenario.get('Модель границ')
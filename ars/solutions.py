@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""Решения для вертикальной скважины в бесконечном пласте.
+
+Неустановившийся приток жидкости к вертикальной скважине, полностью вскрывшей
+бесконечный однородный пласт толщины h с начальным давлением pi.
+
+Решение относительно распределения давления (изображение по Лапласу):
+    dp(s) = q B mu / (2 pi k h) * K0(sqrt(s / eta) r) / (s sqrt(s / eta) r_w K1(sqrt(s / eta) r_w))
+Решение для линейного источника:
+    dp(r, t) = -q B mu / (4 pi k h) * Ei(-r^2 / (4 eta t))
+
+Модуль не имеет побочных эффектов при импорте; mpmath загружается только
+в pd_lapl_1 и pd_line_source_lapl.
+"""
+
+import numpy as np
+import scipy.special as sc
+
+from ars.laplace import invert_laplace
+from ars.metrics import timed
+from ars.type_curves import get_type_curve
+
+# Исходные данные
+q = 0.00092  # [m3/c] - дебит скважины
+B = 1.25  # [m3/m3] - объемный коэффициент
+k = 50*1e-15  # [m2] - изотропная проницаемость
+h = 9.144  # [m] - толщина пласта
+f = 0.3  # [] - пористость
+c = 1.47*1e-9  # [1/Pa] - сжимаемость флюида
+cf = 1 * 1e-9  # [1/Pa] - сжимаемость породы
+ct = (c + cf)  # [1/Pa] - общая породы
+rw = 0.1524  # [m] - радиус ствола скважины
+r = 0.1524  # [m] - радиальная координата и расстояние
+mu = 3*1e-3  # [Pa*c] - вязкость
+eta = k / (mu * f * ct)  # коэф пьезопроводности
+l = rw
+PI = 3.44738E+7
+
+
+# Решение для линейного источника
+@timed('kernel:pd_ei')
+def pd_ei (r, t, q = q, B = B, k = k, h = h, mu = mu, eta = eta, f = f):
+    return -q * B * mu /(4 * np.pi * k * h) * sc.expi(-r ** 2 /(4 * eta * t))
+
+# Решение с учетом конечного радиуса скважины
+# (sc.kv вместо sc.kn, чтобы ядро принимало комплексные s для методов Тальбота и де Хуга)
+@timed('kernel:pd_lapl')
+def pd_lapl (s, r = r, r_w = rw, q = q, B = B, k = k, h = h, mu = mu, eta = eta, f = f):
+    return q * B * mu / (2 * np.pi * k * h) * sc.kv(0, r * (s / eta) ** 0.5) /(s * r_w * (s / eta)** 0.5 * sc.kv(1, r_w * (s / eta) ** 0.5))
+
+# Решение с учетом конечного радиуса скважины (mpmath, скалярное s)
+def pd_lapl_1 (s, r = r, r_w = rw, q = q, B = B, k = k, h = h, mu = mu, eta = eta, f = f):
+    from mpmath import besselk
+    return q * B * mu / (2 * np.pi * k * h) * besselk(0, r * (s / eta) ** 0.5) /(s * r_w * (s / eta)** 0.5 * besselk(1, r_w * (s / eta) ** 0.5))
+
+# Решение с учетом конечного радиуса скважины
+def pd_lapl_2 (s, r = r, r_w = rw, q = q, B = B, k = k, h = h, mu = mu, eta = eta, f = f):
+    return q * B * mu / (2 * np.pi * k * h * s) * sc.kv(0, (s) ** 0.5)
+
+# Решение с учетом конечного радиуса скважины по безразмерной эталонной кривой pD(tD, rD):
+# интерполяция по таблице на диске вместо обращения преобразования Лапласа
+def pd_tc (r, t, r_w = rw, q = q, B = B, k = k, h = h, mu = mu, eta = eta, f = f):
+    return q * B * mu / (2 * np.pi * k * h) * get_type_curve()(eta * np.asarray(t) / r_w ** 2, np.asarray(r) / r_w)
+
+# реализация функции расчета безразмерного давления на основе преобразования Лапласа
+def pd_line_source_lapl(r, t):
+    from mpmath import invertlaplace
+    fp = lambda p: pd_lapl_1(p)
+    return invertlaplace(fp, t, method='stehfest', degree = 5)
+
+# векторизованное обращение pd_lapl: одно broadcast-вычисление ядра для всех пар (время, узел)
+# method: 'stehfest', 'talbot' или 'dehoog' (см. ars/laplace.py)
+def pd_ls_func(r, t, method='stehfest', degree=None):
+    return invert_laplace(lambda s: pd_lapl(s, r=r), t, method=method, degree=degree)
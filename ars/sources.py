@@ -0,0 +1,315 @@
+# -*- coding: utf-8 -*-
+"""Источники сложной геометрии: горизонтальная скважина, частичное вскрытие и трещина ГРП.
+
+Горизонтальная скважина и вертикальная скважина с частичным вскрытием считаются
+методом мгновенных источников (Грингартен - Рамей): функция Грина - произведение
+одномерных функций по осям (полоса, точка, пласт с непроницаемыми кровлей и подошвой),
+интеграл по времени берется квадратурой Гаусса - Лежандра на панелях в логарифме
+времени. Узлы квадратуры вычисляются один раз, ядро векторизовано по точкам и узлам,
+границы панелей включают все выходные времена, поэтому весь ряд времен получается
+одной накопленной суммой.
+
+Трещина ГРП конечной проводимости (Синко-Лей): в пространстве Лапласа трещина делится
+на сегменты с постоянной плотностью притока, интегралы K0 по сегментам берутся
+квадратурой Гаусса (для собственного сегмента - на сгущающихся к особенности панелях),
+системы уравнений для всех узлов обращения решаются одним пакетным вызовом.
+"""
+
+from functools import lru_cache
+
+import numpy as np
+import scipy.special as sc
+
+from ars.bounded import _series_sizes
+from ars.laplace import invert_laplace
+from ars.metrics import timed
+from ars.superposition import well_rows
+
+VERTICAL = 'vertical'
+HORIZONTAL = 'horizontal'
+FRACTURE = 'fracture'
+
+# узлов Гаусса на панель и панелей на декаду времени
+GAUSS_NODES = 8
+PANELS_PER_DECADE = 2
+# число сегментов на крыло трещины и уровней сгущения панелей у особенности K0
+FRACTURE_SEGMENTS = 20
+GRADED_LEVELS = 12
+# проницаемость трещины по умолчанию, м2 (100 Д)
+FRACTURE_PERMEABILITY = 1e-10
+
+# бюджет памяти на блок расчета, байт
+CHUNK_BYTES = 64 * 2 ** 20
+
+
+# Узлы и веса Гаусса - Лежандра на [0, 1]
+@lru_cache(maxsize=None)
+def gauss_nodes(n=GAUSS_NODES):
+    x, w = np.polynomial.legendre.leggauss(n)
+    x, w = (x + 1) / 2, w / 2
+    x.flags.writeable = False
+    w.flags.writeable = False
+    return x, w
+
+
+# Составная квадратура на [0, 1] с панелями [4^-(m+1), 4^-m], сгущающимися к нулю
+# (логарифмическая особенность K0), и весом остатка [0, 4^-levels] отдельно
+@lru_cache(maxsize=None)
+def graded_nodes(levels=GRADED_LEVELS, n=GAUSS_NODES):
+    xg, wg = gauss_nodes(n)
+    lo = 4.0 ** -np.arange(1, levels + 1)
+    hi = 4.0 ** -np.arange(levels)
+    x = (lo[:, None] + (hi - lo)[:, None] * xg).ravel()
+    w = ((hi - lo)[:, None] * wg).ravel()
+    x.flags.writeable = False
+    w.flags.writeable = False
+    return x, w, 4.0 ** -levels
+
+
+# Мгновенный точечный источник на прямой: смещение u, tau4 = 4 eta tau
+def _point(u, tau4):
+    return np.exp(-u ** 2 / tau4) / np.sqrt(np.pi * tau4)
+
+
+# Мгновенный источник - полоса полуширины half с центром в 0
+def _strip(u, half, tau4):
+    sq = np.sqrt(tau4)
+    return (sc.erf((half + u) / sq) + sc.erf((half - u) / sq)) / (4 * half)
+
+
+# Мгновенный источник в пласте [0, h] с непроницаемыми кровлей и подошвой:
+# точка (half = 0) или полоса полуширины half с центром в zw.
+# До tau* = split h^2 / eta - отражения, после - ряд Фурье; число членов - по tol
+def _slab(z, zw, h, tau, eta, half=0.0, tol=1e-8, split=0.05):
+    tau_star = split * h ** 2 / eta
+    n_images, n_modes = _series_sizes(h, eta, tau_star, tol)
+    tau4 = 4 * eta * np.minimum(tau, tau_star)
+    source = (lambda u: _strip(u, half, tau4)) if half > 0 else (lambda u: _point(u, tau4))
+    early = 0
+    for m in range(-n_images, n_images + 1):
+        early = early + source(z - zw - 2 * m * h) + source(z + zw - 2 * m * h)
+    n = np.arange(1, n_modes + 1)
+    c = np.sinc(n * half / h) if half > 0 else 1.0
+    modes = c * np.cos(n * np.pi * np.asarray(z)[..., None] / h) * np.cos(n * np.pi * zw / h)
+    late = (1 + 2 * np.sum(modes * np.exp(-(n * np.pi / h) ** 2 * eta * np.maximum(tau, tau_star)[..., None]),
+                           axis=-1)) / h
+    return np.where(tau < tau_star, early, late)
+
+
+# Интеграл по времени int_0^t density(tau) dtau для всех t сразу.
+# density(tau) принимает массив tau (K,) и возвращает (P, K); ниже tau_min плотность пренебрежимо мала.
+# Результат (P, t.size)
+def time_integral(density, t, tau_min, nodes=GAUSS_NODES, per_decade=PANELS_PER_DECADE):
+    tt = np.atleast_1d(np.asarray(t, dtype=float)).ravel()
+    t_max = tt.max(initial=0)
+    if t_max <= tau_min:
+        return np.zeros((1, tt.size))
+    decades = np.log10(t_max / tau_min)
+    grid = np.logspace(np.log10(tau_min), np.log10(t_max), int(np.ceil(decades * per_decade)) + 1)
+    edges = np.unique(np.concatenate([grid, tt[tt > tau_min]]))
+    xg, wg = gauss_nodes(nodes)
+    lo, hi = np.log(edges[:-1]), np.log(edges[1:])
+    tau = np.exp(lo[:, None] + (hi - lo)[:, None] * xg)
+    values = density(tau.ravel()).reshape(-1, *tau.shape)
+    # dtau = tau dln(tau)
+    panels = np.sum(values * tau * wg, axis=-1) * (hi - lo)
+    cumulative = np.concatenate([np.zeros((panels.shape[0], 1)), np.cumsum(panels, axis=-1)], axis=-1)
+    index = np.searchsorted(edges, tt)
+    return np.where(tt > tau_min, cumulative[:, np.minimum(index, edges.size - 1)], 0.0)
+
+
+# Координаты точек в осях скважины: вдоль ствола (азимут azimuth, рад) и поперек
+def _well_axes(x, y, x0, y0, azimuth):
+    dx, dy = x - x0, y - y0
+    return dx * np.cos(azimuth) + dy * np.sin(azimuth), -dx * np.sin(azimuth) + dy * np.cos(azimuth)
+
+
+# Депрессия [Па] от горизонтальной скважины длины length с равномерным притоком (ствол вдоль
+# азимута azimuth на высоте zw от подошвы) или, при length = 0, от вертикальной скважины
+# со вскрытием penetration с центром на zw. Точки (x, y, z), результат (P, t.size)
+@timed('kernel:slab_source_pressure')
+def slab_source_pressure(x, y, t, x0=0.0, y0=0.0, zw=None, z=None, length=0.0, penetration=None, azimuth=0.0,
+                         q=1.0, B=1.0, k=1.0, h=1.0, mu=1.0, eta=1.0, r_min=0.1, tol=1e-8,
+                         chunk_bytes=CHUNK_BYTES, **kwargs):
+    x = np.atleast_1d(np.asarray(x, dtype=float)).ravel()
+    y = np.broadcast_to(np.atleast_1d(np.asarray(y, dtype=float)).ravel(), x.shape)
+    # высота ствола отсчитывается от подошвы; вне пласта (например, глубина) - середина пласта
+    zw = zw if zw is not None and 0 < zw < h else h / 2
+    z = np.broadcast_to(zw if z is None else np.asarray(z, dtype=float).ravel(), x.shape)
+    half_z = 0.0 if penetration is None or penetration >= h else penetration / 2
+    along, across = _well_axes(x, y, x0, y0, azimuth)
+    across = np.maximum(np.abs(across), r_min)
+    # до tau_min вклад меньше tol у ближайшей к стволу точки
+    tau_min = r_min ** 2 / (4 * eta * (-np.log(tol) + 10))
+
+    def density(tau, s):
+        tau4 = 4 * eta * tau
+        sx = _strip(along[s, None], length / 2, tau4) if length > 0 else _point(along[s, None], tau4)
+        if length > 0:
+            sz = _slab(z[s, None], zw, h, tau, eta, tol=tol)
+        elif half_z > 0:
+            sz = _slab(z[s, None], zw, h, tau, eta, half=half_z, tol=tol)
+        else:
+            sz = 1.0 / h
+        return sx * _point(across[s, None], tau4) * sz
+
+    tt = np.atleast_1d(np.asarray(t, dtype=float)).ravel()
+    per_point = 8 * 32 * GAUSS_NODES * (PANELS_PER_DECADE * 20 + tt.size)
+    chunk = int(max(1, chunk_bytes // per_point))
+    result = np.zeros((x.size, tt.size))
+    for p0 in range(0, x.size, chunk):
+        s = slice(p0, p0 + chunk)
+        result[s] = time_integral(lambda tau: density(tau, s), tt, tau_min)
+    # B / (f ct) = B mu eta / k
+    return q * B * mu * eta / k * result
+
+
+# K0 для вещественного (sc.k0, в несколько раз быстрее) и комплексного аргумента
+def _k0(z):
+    return sc.kv(0, z) if np.iscomplexobj(z) else sc.k0(z)
+
+
+# Интегралы int_a^b K0(u sqrt((dx - x')^2 + dy^2)) dx' по сегментам [a, b] квадратурой Гаусса.
+# u (...), dx и dy транслируются с u и a
+def _segment_integral(u, dx, dy, a, b, nodes=GAUSS_NODES):
+    xg, wg = gauss_nodes(nodes)
+    xs = a[..., None] + (b - a)[..., None] * xg
+    rho = np.sqrt((dx[..., None] - xs) ** 2 + dy[..., None] ** 2)
+    return np.sum(wg * _k0(u[..., None] * rho), axis=-1) * (b - a)
+
+
+# int_0^c K0(u v) dv на сгущающихся панелях; остаток [0, c 4^-levels] - по асимптотике K0 в нуле
+def _self_integral(u, c):
+    xg, wg, eps = graded_nodes()
+    head = c * eps * (1 - np.log(u * c * eps / 2) - np.euler_gamma)
+    return head + c * np.sum(wg * _k0(u[..., None] * c * xg), axis=-1)
+
+
+# Матрица сегментов трещины [0, xf]: влияние сегмента j (с зеркальным крылом) на центр сегмента i
+# в пласте (G, зависит от s) и в трещине (M - двойной интеграл потока по длине, от s не зависит).
+# Интеграл K0 по сегменту зависит только от i - j (прямое крыло) и i + j + 1 (зеркальное),
+# поэтому считаются 2N интегралов по ячейкам [(m - 1/2) delta, (m + 1/2) delta], а не 2N^2
+def _fracture_matrices(u, half_length, n_segments):
+    delta = half_length / n_segments
+    a = delta * np.arange(n_segments)
+    b = a + delta
+    m = np.arange(1, 2 * n_segments)
+    cells = np.empty(u.shape + (2 * n_segments,), dtype=np.result_type(u, float))
+    cells[..., 0] = 2 * _self_integral(u, delta / 2)
+    cells[..., 1:] = _segment_integral(u[..., None], np.zeros(m.size), np.zeros(m.size), (m - 0.5) * delta,
+                                       (m + 0.5) * delta)
+    i, j = np.meshgrid(np.arange(n_segments), np.arange(n_segments), indexing='ij')
+    G = cells[..., np.abs(i - j)] + cells[..., i + j + 1]
+    # int_0^{x_i} int_{x''}^{xf} q dx' dx'' для кусочно-постоянной плотности притока
+    X, A = (a + delta / 2)[:, None], a[None, :]
+    M = np.where(X <= A, delta * X,
+                 np.where(X >= A + delta, delta * A + delta ** 2 / 2,
+                          delta * A + (A + delta) * (X - A) - (X ** 2 - A ** 2) / 2))
+    return G, M, a, b
+
+
+# Изображение депрессии [Па*с] трещины ГРП конечной проводимости (полудлина half_length,
+# раскрытие width, проницаемость kf, трещина на всю толщину) для массива s (..., n).
+# Возвращает изображения забойной депрессии и плотностей притока сегментов (..., n, N)
+def fracture_lapl(s, half_length, width, kf=FRACTURE_PERMEABILITY, q=1.0, B=1.0, k=1.0, h=1.0, mu=1.0, eta=1.0,
+                  n_segments=FRACTURE_SEGMENTS):
+    s = np.asarray(s)
+    u = (s / eta) ** 0.5
+    G, M, a, b = _fracture_matrices(u, half_length, n_segments)
+    # система (безразмерная форма, множитель B mu / (2 pi k h) вынесен):
+    # sum_j (G_ij + 2 pi k / (kf w) M_ij) q_j - P_w = 0, 2 delta sum_j q_j = q / s
+    n = n_segments
+    system = np.zeros(s.shape + (n + 1, n + 1), dtype=np.result_type(u, float))
+    system[..., :n, :n] = G + 2 * np.pi * k / (kf * width) * M
+    system[..., :n, n] = -1
+    system[..., n, :n] = 2 * half_length / n_segments
+    rhs = np.zeros(s.shape + (n + 1,), dtype=system.dtype)
+    rhs[..., n] = q / s
+    solution = np.linalg.solve(system, rhs[..., None])[..., 0]
+    scale = B * mu / (2 * np.pi * k * h)
+    return scale * solution[..., n], solution[..., :n], a, b
+
+
+# Депрессия [Па] от трещины ГРП: на забое (x = None) или в точках (x, y), трещина вдоль азимута
+# azimuth с центром в (x0, y0). Результат (t.size,) для забоя или (P, t.size) для точек
+@timed('kernel:fracture_pressure')
+def fracture_pressure(t, half_length, width, kf=FRACTURE_PERMEABILITY, x=None, y=None, x0=0.0, y0=0.0,
+                      azimuth=0.0, q=1.0, B=1.0, k=1.0, h=1.0, mu=1.0, eta=1.0, r_min=0.1,
+                      n_segments=FRACTURE_SEGMENTS, method='stehfest', degree=None, chunk_bytes=CHUNK_BYTES,
+                      **kwargs):
+    tt = np.atleast_1d(np.asarray(t, dtype=float)).ravel()
+    params = dict(kf=kf, q=q, B=B, k=k, h=h, mu=mu, eta=eta, n_segments=n_segments)
+    if x is None:
+        return invert_laplace(lambda s: fracture_lapl(s, half_length, width, **params)[0], tt, method=method,
+                              degree=degree)
+    x = np.atleast_1d(np.asarray(x, dtype=float)).ravel()
+    y = np.broadcast_to(np.atleast_1d(np.asarray(y, dtype=float)).ravel(), x.shape)
+    along, across = _well_axes(x, y, x0, y0, azimuth)
+    across = np.maximum(np.abs(across), r_min)
+    scale = B * mu / (2 * np.pi * k * h)
+    result = np.zeros((x.size, tt.size))
+    nodes = 2 * (degree or 20) + 1
+    chunk = int(max(1, chunk_bytes // (16 * nodes * tt.size * n_segments * GAUSS_NODES * 4)))
+    for p0 in range(0, x.size, chunk):
+        px = along[p0:p0 + chunk, None, None, None]
+        py = across[p0:p0 + chunk, None, None, None]
+
+        def F(s):
+            _, flux, a, b = fracture_lapl(s, half_length, width, **params)
+            u = ((s / eta) ** 0.5)[..., None]
+            # поле давления - сумма вкладов сегментов обоих крыльев
+            field = _segment_integral(u, px, py, a, b) + _segment_integral(u, -px, py, a, b)
+            return scale * np.sum(flux * field, axis=-1)
+
+        result[p0:p0 + chunk] = invert_laplace(F, tt, method=method, degree=degree)
+    return result
+
+
+# Геометрия скважин из table_model_wells в порядке parse_wells: список словарей с ключами
+# kind (VERTICAL, HORIZONTAL, FRACTURE), length, penetration, width, half_length, kf, zw
+def parse_geometry(rows_in_wells, rows_in_model_wells=None, kf=FRACTURE_PERMEABILITY):
+    values = {}
+    for row in rows_in_model_wells or []:
+        parameter = row.get('Parameter')
+        for name, value in row.items():
+            if name == 'Parameter':
+                continue
+            try:
+                values.setdefault(str(name), {})[parameter] = float(value)
+            except (TypeError, ValueError):
+                pass
+    geometry = []
+    for row, xyz, kind in well_rows(rows_in_wells):
+        well = values.get(str(row.get('Скважина')), {})
+        length = well.get('Длина горизонтального ствола м', 0.0)
+        width = well.get('Ширина трещины ГРП м', 0.0)
+        half_length = well.get('Полудлина трещины ГРП м', 0.0)
+        item = dict(kind=VERTICAL, length=length, penetration=well.get('Толщина вскрытия м'), width=width,
+                    half_length=half_length, kf=well.get('Проницаемость трещины ГРП мД', kf * 1e15) * 1e-15,
+                    zw=xyz[2] or None)
+        if length > 0:
+            item['kind'] = HORIZONTAL
+        elif width > 0 and half_length > 0:
+            item['kind'] = FRACTURE
+        geometry.append(item)
+    return geometry
+
+
+# Депрессия [Па] от одной скважины заданной геометрии в точках (x, y); для вертикальной скважины
+# на всю толщину - None (считается обычным ядром через superpose). z - высота точек над подошвой
+# (для горизонтальных скважин и частичного вскрытия), по умолчанию - на высоте ствола
+def source_pressure(geometry, well, rate, x, y, t, B=1.0, k=1.0, h=1.0, mu=1.0, eta=1.0, r_min=0.1, z=None,
+                    **kwargs):
+    params = dict(q=rate, B=B, k=k, h=h, mu=mu, eta=eta, r_min=r_min)
+    x0, y0 = well[0], well[1]
+    if geometry['kind'] == FRACTURE:
+        return fracture_pressure(t, geometry['half_length'], geometry['width'], geometry['kf'], x=x, y=y,
+                                 x0=x0, y0=y0, **params, **kwargs)
+    if geometry['kind'] == HORIZONTAL:
+        return slab_source_pressure(x, y, t, x0, y0, zw=geometry['zw'], z=z, length=geometry['length'], **params,
+                                    **kwargs)
+    penetration = geometry.get('penetration')
+    if penetration and penetration < h:
+        return slab_source_pressure(x, y, t, x0, y0, zw=geometry['zw'], z=z, penetration=penetration, **params,
+                                    **kwargs)
+    return None
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""Линии тока для системы скважин.
+
+Для вертикальных скважин в бесконечном пласте скорость фильтрации считается
+аналитически из суперпозиции решений для линейного источника: по закону Дарси
+v = -(k / mu) grad p, для pd_ei v = -q B / (2 pi h r) * exp(-r^2 / (4 eta t)) * e_r.
+Для остальных моделей (ограниченные пласты, трещины ГРП, горизонтальные стволы)
+скорость - градиент той же карты давления, что выводится на график (map_velocity),
+поэтому линии тока не противоречат карте и не пересекают непротекаемые границы.
+Линии интегрируются методом Рунге-Кутты 4-го порядка (или Эйлера) сразу для всех
+начальных точек и выдаются одной ломаной с разделителями NaN, готовой для go.Scatter.
+"""
+
+import numpy as np
+
+from ars.metrics import timed
+
+
+# Скорость фильтрации [м/с] в точках (x, y) от скважин wells (W, 2) с дебитами rates (W,) [м3/с]
+def darcy_velocity(wells, rates, x, y, t, B, h, eta, r_min=1e-3):
+    wells = np.asarray(wells, dtype=float)
+    rates = np.asarray(rates, dtype=float)
+    dx = np.asarray(x, dtype=float)[..., None] - wells[:, 0]
+    dy = np.asarray(y, dtype=float)[..., None] - wells[:, 1]
+    r2 = np.maximum(dx ** 2 + dy ** 2, r_min ** 2)
+    # -q B / (2 pi h) * exp(-r^2 / 4 eta t) / r^2 * (dx, dy)
+    c = -rates * B / (2 * np.pi * h) * np.exp(-r2 / (4 * eta * t)) / r2
+    return np.sum(c * dx, axis=-1), np.sum(c * dy, axis=-1)
+
+
+# Скорость фильтрации [м/с] по карте депрессии dp [Па] (y.size, x.size) на равномерной сетке осей
+# x, y: v = (k / mu) grad dp (grad p = -grad dp), производные по узлам карты интерполируются
+# билинейно; вне карты и за пределами пласта (NaN на карте) - NaN. Возвращает velocity(px, py)
+def map_velocity(x, y, dp, k, mu):
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    gy, gx = np.gradient(np.asarray(dp, dtype=float), y, x)
+    gx, gy = k / mu * gx, k / mu * gy
+
+    def velocity(px, py):
+        px = np.asarray(px, dtype=float)
+        py = np.asarray(py, dtype=float)
+        inside = (px >= x[0]) & (px <= x[-1]) & (py >= y[0]) & (py <= y[-1])
+        i = np.clip(np.searchsorted(x, px) - 1, 0, x.size - 2)
+        j = np.clip(np.searchsorted(y, py) - 1, 0, y.size - 2)
+        wx = np.clip((px - x[i]) / (x[i + 1] - x[i]), 0, 1)
+        wy = np.clip((py - y[j]) / (y[j + 1] - y[j]), 0, 1)
+
+        def bilinear(g):
+            value = ((1 - wy) * ((1 - wx) * g[j, i] + wx * g[j, i + 1])
+                     + wy * ((1 - wx) * g[j + 1, i] + wx * g[j + 1, i + 1]))
+            return np.where(inside, value, np.nan)
+        return bilinear(gx), bilinear(gy)
+    return velocity
+
+
+# Начальные точки: кольцо радиуса radius вокруг каждой скважины, n точек на скважину
+def ring_seeds(wells, radius, n=16):
+    wells = np.asarray(wells, dtype=float)
+    angle = 2 * np.pi * (np.arange(n) + 0.5) / n
+    x = wells[:, 0, None] + radius * np.cos(angle)
+    y = wells[:, 1, None] + radius * np.sin(angle)
+    return x.ravel(), y.ravel()
+
+
+# Интегрирование линий поля направлений v / |v| из точек (x0, y0) с шагом ds по длине.
+# direction: +1 - по потоку, -1 - против, массив - свое направление для каждой точки.
+# Линия обрывается при выходе за bounds = (xmin, xmax, ymin, ymax), при остановке потока
+# и при подходе к скважине ближе stop_radius.
+# Возвращает массивы (n_steps + 1, n_seeds) с NaN после обрыва
+def integrate(velocity, x0, y0, ds, n_steps, bounds, direction=1.0, wells=None, stop_radius=None,
+              method='rk4'):
+    x = np.array(x0, dtype=float).ravel()
+    y = np.array(y0, dtype=float).ravel()
+    sign = np.broadcast_to(np.asarray(direction, dtype=float), x.shape)
+    xs = np.full((n_steps + 1, x.size), np.nan)
+    ys = np.full((n_steps + 1, x.size), np.nan)
+    xs[0], ys[0] = x, y
+    alive = np.ones(x.size, dtype=bool)
+    wells = None if wells is None else np.asarray(wells, dtype=float)
+    stop_radius = 2 * ds if stop_radius is None else stop_radius
+
+    def field(px, py, s):
+        u, v = velocity(px, py)
+        speed = np.hypot(u, v)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return s * u / speed, s * v / speed, speed
+
+    for step in range(1, n_steps + 1):
+        if not alive.any():
+            break
+        idx = np.flatnonzero(alive)
+        px, py, s = x[idx], y[idx], sign[idx]
+        k1x, k1y, speed = field(px, py, s)
+        if method == 'rk4':
+            k2x, k2y, _ = field(px + 0.5 * ds * k1x, py + 0.5 * ds * k1y, s)
+            k3x, k3y, _ = field(px + 0.5 * ds * k2x, py + 0.5 * ds * k2y, s)
+            k4x, k4y, _ = field(px + ds * k3x, py + ds * k3y, s)
+            nx = px + ds / 6 * (k1x + 2 * k2x + 2 * k3x + k4x)
+            ny = py + ds / 6 * (k1y + 2 * k2y + 2 * k3y + k4y)
+        elif method == 'euler':
+            nx = px + ds * k1x
+            ny = py + ds * k1y
+        else:
+            raise ValueError("Неизвестный метод интегрирования {!r}, доступны 'rk4' и 'euler'".format(method))
+        ok = np.isfinite(nx) & np.isfinite(ny) & (speed > 0)
+        ok &= (nx >= bounds[0]) & (nx <= bounds[1]) & (ny >= bounds[2]) & (ny <= bounds[3])
+        x[idx], y[idx] = nx, ny
+        xs[step, idx] = np.where(ok, nx, np.nan)
+        ys[step, idx] = np.where(ok, ny, np.nan)
+        if wells is not None and wells.size:
+            near = np.min(np.hypot(nx[:, None] - wells[:, 0], ny[:, None] - wells[:, 1]), axis=1) < stop_radius
+            # точку у скважины оставляем - линия доходит до нее
+            ok &= ~near
+        alive[idx] = ok
+    return xs, ys
+
+
+# Ломаная для go.Scatter: все линии подряд, разделенные NaN
+def to_polyline(xs, ys):
+    xs = np.vstack([xs, np.full((1, xs.shape[1]), np.nan)])
+    ys = np.vstack([ys, np.full((1, ys.shape[1]), np.nan)])
+    x, y = xs.T.ravel(), ys.T.ravel()
+    # убираем повторяющиеся NaN, оставляя по одному разделителю
+    keep = np.isfinite(x) | np.concatenate(([False], np.isfinite(x[:-1])))
+    return x[keep], y[keep]
+
+
+# Линии тока для системы скважин в квадрате bounds: старт у каждой скважины,
+# от добывающих - против потока, от нагнетательных - по потоку.
+# velocity(px, py) - поле скорости (например, map_velocity по карте давления),
+# по умолчанию - аналитическое для линейных источников в бесконечном пласте (darcy_velocity)
+@timed('kernel:well_streamlines')
+def well_streamlines(wells, rates, t, B, h, eta, bounds, n_per_well=16, n_steps=None, ds=None, method='rk4',
+                     velocity=None):
+    wells = np.asarray(wells, dtype=float)[:, :2]
+    rates = np.asarray(rates, dtype=float)
+    size = max(bounds[1] - bounds[0], bounds[3] - bounds[2])
+    ds = size / 200 if ds is None else ds
+    n_steps = int(2 * size / ds) if n_steps is None else n_steps
+    x0, y0 = ring_seeds(wells, 2.5 * ds, n_per_well)
+    direction = np.repeat(np.where(rates > 0, -1.0, 1.0), n_per_well)
+    if velocity is None:
+        velocity = lambda px, py: darcy_velocity(wells, rates, px, py, t, B, h, eta)
+    xs, ys = integrate(velocity, x0, y0, ds, n_steps, bounds, direction=direction, wells=wells,
+                       stop_radius=2 * ds, method=method)
+    return to_polyline(xs, ys)
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""Суперпозиция решений от нескольких скважин.
+
+Давление в точке - сумма вкладов всех скважин: dp(x, y, t) = sum_w q_w * K(r_w(x, y), t),
+где K - решение для единичного дебита (pd_ei, pd_lapl через обращение, pd_tc).
+Тензор (скважины x точки x времена) считается одним векторизованным вызовом ядра
+на блок, размер блока ограничен бюджетом памяти.
+"""
+
+import numpy as np
+
+from ars.metrics import timed
+
+# бюджет памяти на один блок тензора (скважины x точки x времена), байт
+CHUNK_BYTES = 64 * 2 ** 20
+
+# коды типа скважины в table_wells
+PRODUCER = '0'
+INJECTOR = '1'
+
+
+# Скважины из таблиц table_wells и table_model_wells.
+# Возвращает координаты (W, 3) [м] и дебиты (W,) [м3/с]: добывающие со знаком +, нагнетательные -.
+# Скважины с неверным типом или без координат пропускаются.
+def parse_wells(rows_in_wells, rows_in_model_wells=None, default_q=0.00092):
+    rates = {}
+    for row in rows_in_model_wells or []:
+        if row.get('Parameter') == 'Дебит скважины, м3/сут':
+            for name, value in row.items():
+                if name == 'Parameter':
+                    continue
+                try:
+                    rates[name] = float(value) / 86400
+                except (TypeError, ValueError):
+                    pass
+    coords = []
+    q = []
+    for row, xyz, kind in well_rows(rows_in_wells):
+        rate = abs(rates.get(str(row.get('Скважина')), default_q))
+        coords.append(xyz)
+        q.append(rate if kind == PRODUCER else -rate)
+    return np.array(coords, dtype=float).reshape(-1, 3), np.array(q, dtype=float)
+
+
+# Строки table_wells с верным типом и координатами: (строка, [x, y, z], тип)
+def well_rows(rows_in_wells):
+    for row in rows_in_wells or []:
+        kind = str(row.get('Тип скважины', '')).strip()
+        if kind not in (PRODUCER, INJECTOR):
+            continue
+        try:
+            xyz = [float(row.get('X координата')), float(row.get('Y координата')),
+                   float(row.get('Z координата') or 0)]
+        except (TypeError, ValueError):
+            continue
+        yield row, xyz, kind
+
+
+# Поле давления от группы скважин.
+# kernel(r, t, q=1, **params) - решение для единичного дебита, линейное по q;
+# wells - координаты (W, 2) или (W, 3), rates - дебиты (W,);
+# x, y (и z) - координаты точек любой одинаковой формы; t - скаляр или массив.
+# Результат имеет форму x.shape + t.shape.
+@timed('kernel:superpose')
+def superpose(kernel, wells, rates, x, y, t, z=None, r_min=None, chunk_bytes=CHUNK_BYTES,
+              dtype=np.float64, **params):
+    wells = np.asarray(wells, dtype=float)
+    rates = np.asarray(rates, dtype=float)
+    t = np.asarray(t, dtype=float)
+    x = np.asarray(x, dtype=float)
+    shape = x.shape
+    points = [x.ravel(), np.asarray(y, dtype=float).ravel()]
+    if z is not None:
+        points.append(np.broadcast_to(np.asarray(z, dtype=float), shape).ravel())
+    points = np.stack(points, axis=1)
+    ndim = points.shape[1]
+    if wells.shape[1] < ndim:
+        wells = np.pad(wells, ((0, 0), (0, ndim - wells.shape[1])))
+    wells = wells[:, :ndim]
+
+    tt = t.ravel()
+    result = np.zeros((points.shape[0], tt.size), dtype=dtype)
+    n_wells = wells.shape[0]
+    if n_wells == 0 or points.shape[0] == 0:
+        return result.reshape(shape + t.shape)
+
+    # размер блоков: сначала по скважинам, затем по точкам
+    per_item = 8 * tt.size
+    well_chunk = int(max(1, min(n_wells, chunk_bytes // per_item)))
+    point_chunk = int(max(1, chunk_bytes // (per_item * well_chunk)))
+    for w0 in range(0, n_wells, well_chunk):
+        w = wells[w0:w0 + well_chunk]
+        q = rates[w0:w0 + well_chunk]
+        for p0 in range(0, points.shape[0], point_chunk):
+            p = points[p0:p0 + point_chunk]
+            r = np.sqrt(np.sum((p[None, :, :] - w[:, None, :]) ** 2, axis=-1))
+            if r_min is not None:
+                r = np.maximum(r, r_min)
+            unit = kernel(r[..., None], tt, q=1.0, **params)
+            result[p0:p0 + point_chunk] += np.tensordot(q, unit, axes=1)
+    return result.reshape(shape + t.shape)
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""Компактная передача сеточных результатов в браузер.
+
+Массивы кодируются как base64 от float32 в формате типизированных массивов plotly.js
+({'dtype', 'bdata', 'shape'}), вместо списков чисел в JSON. Для карт предусмотрено
+прореживание до заданного числа узлов и вырезка окна при увеличении (zoom).
+"""
+
+import base64
+
+import numpy as np
+
+# максимальное число узлов по каждой оси карты, отправляемой в график
+DISPLAY_SIZE = 200
+
+
+# Массив -> словарь с base64-буфером
+def encode_array(arr, dtype=np.float32):
+    arr = np.ascontiguousarray(arr, dtype=dtype)
+    return {'dtype': arr.dtype.name, 'shape': list(arr.shape),
+            'bdata': base64.b64encode(arr.tobytes()).decode('ascii')}
+
+
+# Обратное преобразование; обычные списки (старый формат хранилища) тоже принимаются
+def decode_array(payload):
+    if isinstance(payload, dict) and 'bdata' in payload:
+        arr = np.frombuffer(base64.b64decode(payload['bdata']), dtype=np.dtype(payload['dtype']))
+        return arr.reshape(payload['shape'])
+    return np.asarray(payload, dtype=float)
+
+
+def is_encoded(payload):
+    return isinstance(payload, dict) and 'bdata' in payload
+
+
+# Прореживание по каждой оси с шагом, при котором узлов не больше max_size
+# (последний узел сохраняется, чтобы не терять границу области)
+def downsample_index(n, max_size):
+    if max_size is None or n <= max_size:
+        return np.arange(n)
+    idx = np.unique(np.linspace(0, n - 1, max_size).round().astype(np.intp))
+    return idx
+
+
+# Карта (оси x, y и поле z формы (ny, nx)), прореженная до max_size узлов по оси
+def downsample_grid(x, y, z, max_size=DISPLAY_SIZE):
+    x, y, z = np.asarray(x), np.asarray(y), np.asarray(z)
+    ix = downsample_index(x.size, max_size)
+    iy = downsample_index(y.size, max_size)
+    return x[ix], y[iy], z[np.ix_(iy, ix)]
+
+
+# Окно карты для диапазонов осей x_range, y_range (из relayoutData графика)
+# с прореживанием до max_size: при увеличении видны все узлы исходной сетки
+def crop_grid(x, y, z, x_range=None, y_range=None, max_size=DISPLAY_SIZE):
+    x, y, z = np.asarray(x), np.asarray(y), np.asarray(z)
+    ix = np.arange(x.size)
+    iy = np.arange(y.size)
+    if x_range is not None:
+        lo, hi = sorted(x_range)
+        ix = ix[(x >= lo) & (x <= hi)]
+        ix = np.arange(max(ix.min() - 1, 0), min(ix.max() + 2, x.size)) if ix.size else np.arange(x.size)
+    if y_range is not None:
+        lo, hi = sorted(y_range)
+        iy = iy[(y >= lo) & (y <= hi)]
+        iy = np.arange(max(iy.min() - 1, 0), min(iy.max() + 2, y.size)) if iy.size else np.arange(y.size)
+    x, y, z = x[ix], y[iy], z[np.ix_(iy, ix)]
+    return downsample_grid(x, y, z, max_size)
+
+
+# Диапазоны осей из relayoutData (None - полный вид)
+def zoom_ranges(relayout):
+    if not relayout or relayout.get('xaxis.autorange') or relayout.get('autosize'):
+        return None, None
+    x_range = y_range = None
+    if 'xaxis.range[0]' in relayout:
+        x_range = (relayout['xaxis.range[0]'], relayout['xaxis.range[1]'])
+    elif 'xaxis.range' in relayout:
+        x_range = tuple(relayout['xaxis.range'])
+    if 'yaxis.range[0]' in relayout:
+        y_range = (relayout['yaxis.range[0]'], relayout['yaxis.range[1]'])
+    elif 'yaxis.range' in relayout:
+        y_range = tuple(relayout['yaxis.range'])
+    return x_range, y_range
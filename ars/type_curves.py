@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""Безразмерные эталонные кривые pD(tD, rD) для скважины конечного радиуса.
+
+В безразмерных переменных tD = eta * t / rw^2, rD = r / rw решение с учетом конечного
+радиуса скважины - одно семейство кривых. Таблица рассчитывается один раз обращением
+преобразования Лапласа и поставляется с пакетом (ars/data, .npz; после изменения
+build_table пересчитывается через TypeCurve.build().save()), а далее давление для любых
+k / h / mu / ct получается билинейной интерполяцией lg(pD) по lg(tD), lg(rD).
+"""
+
+import os
+import threading
+
+import numpy as np
+import scipy.special as sc
+
+from ars.laplace import invert_laplace
+
+TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'type_curve_finite_rw.npz')
+
+# границы и плотность таблицы (точек на декаду); PD_FLOOR - нижняя граница pD для логарифма
+PD_FLOOR = 1e-300
+# выше этого значения pD интерполируется линейно, ниже - в логарифме
+LINEAR_PD = 0.5
+LOG_TD_RANGE = (-2.0, 12.0)
+LOG_RD_RANGE = (0.0, 5.0)
+POINTS_PER_DECADE = 20
+
+
+# Безразмерное решение с учетом конечного радиуса скважины в пространстве Лапласа
+def pd_lapl_dimensionless(s, rD=1.0):
+    return sc.kv(0, rD * s ** 0.5) / (s * s ** 0.5 * sc.kv(1, s ** 0.5))
+
+
+# Решение для линейного источника в безразмерном виде (асимптотика за пределами таблицы)
+def pd_ei_dimensionless(tD, rD):
+    return -0.5 * sc.expi(-rD ** 2 / (4 * tD))
+
+
+# Расчет таблицы pD на равномерной сетке по lg(tD) и lg(rD)
+def build_table(log_td_range=LOG_TD_RANGE, log_rd_range=LOG_RD_RANGE, points_per_decade=POINTS_PER_DECADE,
+                method='dehoog', degree=None):
+    n_td = int(round((log_td_range[1] - log_td_range[0]) * points_per_decade)) + 1
+    n_rd = int(round((log_rd_range[1] - log_rd_range[0]) * points_per_decade)) + 1
+    log_td = np.linspace(log_td_range[0], log_td_range[1], n_td)
+    log_rd = np.linspace(log_rd_range[0], log_rd_range[1], n_rd)
+    tD = 10 ** log_td
+    rD = 10 ** log_rd
+    # одно broadcast-вычисление ядра для всех (tD, rD, узел): tD по строкам, rD по столбцам
+    tD_grid = np.broadcast_to(tD[:, None], (n_td, n_rd))
+    with np.errstate(over='ignore', under='ignore', invalid='ignore'):
+        pD = invert_laplace(lambda s: pd_lapl_dimensionless(s, rD[None, :, None]), tD_grid,
+                            method=method, degree=degree)
+    pD = np.nan_to_num(pD, nan=0.0)
+    # численный шум обращения до прихода возмущения обнуляем, кривые по tD - неубывающие
+    pD = np.maximum.accumulate(np.clip(pD, 0.0, None), axis=0)
+    return log_td, log_rd, pD
+
+
+class TypeCurve:
+    # Таблица pD на равномерной сетке в логарифмических координатах с билинейной
+    # интерполяцией lg(pD) на фронте возмущения (exp(-rD^2 / 4tD) в логарифме почти линеен)
+    # и самой pD на поздних временах
+    def __init__(self, log_td, log_rd, pD):
+        self.log_td = np.asarray(log_td, dtype=float)
+        self.log_rd = np.asarray(log_rd, dtype=float)
+        self.pD = np.asarray(pD, dtype=float)
+        self._log_pd = np.log(np.maximum(self.pD, PD_FLOOR))
+        self._td0, self._dtd = self.log_td[0], self.log_td[1] - self.log_td[0]
+        self._rd0, self._drd = self.log_rd[0], self.log_rd[1] - self.log_rd[0]
+
+    @classmethod
+    def build(cls, **kwargs):
+        return cls(*build_table(**kwargs))
+
+    @classmethod
+    def load(cls, path=TABLE_PATH):
+        with np.load(path) as data:
+            return cls(data['log_td'], data['log_rd'], data['pD'])
+
+    def save(self, path=TABLE_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + '.tmp.npz'
+        np.savez_compressed(tmp, log_td=self.log_td, log_rd=self.log_rd, pD=self.pD)
+        os.replace(tmp, path)
+
+    def __call__(self, tD, rD=1.0):
+        tD, rD = np.broadcast_arrays(np.asarray(tD, dtype=float), np.asarray(rD, dtype=float))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x = (np.log10(tD) - self._td0) / self._dtd
+            y = (np.log10(np.maximum(rD, 1.0)) - self._rd0) / self._drd
+        nx, ny = self.pD.shape
+        xc = np.clip(np.nan_to_num(x, nan=0.0, neginf=0.0), 0, nx - 1)
+        yc = np.clip(y, 0, ny - 1)
+        i = np.minimum(xc.astype(np.intp), nx - 2)
+        j = np.minimum(yc.astype(np.intp), ny - 2)
+        wx = xc - i
+        wy = yc - j
+        w00, w10, w01, w11 = (1 - wx) * (1 - wy), wx * (1 - wy), (1 - wx) * wy, wx * wy
+        p = self._log_pd
+        result = np.exp(w00 * p[i, j] + w10 * p[i + 1, j] + w01 * p[i, j + 1] + w11 * p[i + 1, j + 1])
+        result[result <= 10 * PD_FLOOR] = 0.0
+        # после прихода возмущения pD почти линейна по lg(tD) - там интерполируем саму pD.
+        # Выбор делается по минимальному узлу ячейки (i, j + 1): признак монотонен по tD и rD,
+        # а на общей грани линейная интерполяция не меньше геометрической, поэтому
+        # монотонность по обеим осям сохраняется
+        late = self.pD[i, j + 1] > LINEAR_PD
+        if late.any():
+            p = self.pD
+            il, jl = i[late], j[late]
+            result[late] = (w00[late] * p[il, jl] + w10[late] * p[il + 1, jl]
+                            + w01[late] * p[il, jl + 1] + w11[late] * p[il + 1, jl + 1])
+        # за пределами таблицы по tD (поздние времена) и rD (далеко от скважины)
+        # решение совпадает с линейным источником
+        outside = (x > nx - 1) | (y > ny - 1)
+        if outside.any():
+            result[outside] = pd_ei_dimensionless(tD[outside], rD[outside])
+        result[~(tD > 0)] = 0.0
+        return result if result.ndim else float(result)
+
+
+_default_curve = None
+_default_lock = threading.Lock()
+
+
+# Таблица по умолчанию: читается из ars/data, при отсутствии рассчитывается и сохраняется
+def get_type_curve(path=TABLE_PATH):
+    global _default_curve
+    if _default_curve is None:
+        with _default_lock:
+            if _default_curve is None:
+                try:
+                    _default_curve = TypeCurve.load(path)
+                except (OSError, KeyError, ValueError):
+                    _default_curve = TypeCurve.build()
+                    try:
+                        _default_curve.save(path)
+                    except OSError:
+                        pass
+    return _default_curve
+
+
+# Перевод размерных параметров (таблица table-geo, СИ) в масштабы эталонной кривой:
+# tD = t_scale * t, rD = r / rw, dp = p_scale * pD
+def dimensionless_scales(q, B, k, h, mu, f, ct, rw):
+    eta = k / (mu * f * ct)
+    t_scale = eta / rw ** 2
+    p_scale = q * B * mu / (2 * np.pi * k * h)
+    return t_scale, p_scale
+
+
+# Депрессия [Па] по эталонной кривой для произвольного набора параметров
+def pd_type_curve(r, t, q, B, k, h, mu, f, ct, rw, curve=None):
+    curve = curve or get_type_curve()
+    t_scale, p_scale = dimensionless_scales(q, B, k, h, mu, f, ct, rw)
+    return p_scale * curve(t_scale * np.asarray(t, dtype=float), np.asarray(r, dtype=float) / rw)
+
+
+if __name__ == '__main__':
+    TypeCurve.build().save()
+    print('Таблица сохранена в', TABLE_PATH)
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""Оценка неопределенности прогноза давления методом Монте-Карло.
+
+Параметры пласта k, h, f, ct, mu (table-geo) задаются распределениями; выборка
+строится одним вызовом генератора на параметр, а депрессия на забое считается
+сразу для всех реализаций и времен одним broadcast-вычислением формы
+(реализации, скважины, времена). Реализации обрабатываются блоками, размер которых
+ограничен бюджетом памяти на промежуточные массивы. Результат - кривые
+P10 / P50 / P90 (процентили депрессии по реализациям).
+
+Распределение задается кортежем (вид, мин, мода, макс):
+    fixed      - постоянное значение мода;
+    uniform    - равномерное на [мин, макс];
+    triangular - треугольное (мин, мода, макс);
+    normal     - нормальное со средним мода, мин и макс - его P10 и P90 (усекается на 0);
+    lognormal  - логнормальное с медианой мода, мин и макс - его P10 и P90.
+"""
+
+import numpy as np
+
+from ars.laplace import DEFAULT_DEGREE, invert_laplace
+from ars.metrics import timed
+from ars.solutions import pd_ei, pd_lapl
+from ars.type_curves import pd_type_curve
+
+FIXED = 'fixed'
+UNIFORM = 'uniform'
+TRIANGULAR = 'triangular'
+NORMAL = 'normal'
+LOGNORMAL = 'lognormal'
+DISTRIBUTIONS = (FIXED, UNIFORM, TRIANGULAR, NORMAL, LOGNORMAL)
+
+# неопределенные параметры (ключи run_model) и процентили результата
+UNCERTAIN = ('k', 'h', 'f', 'ct', 'mu')
+PERCENTILES = (10, 50, 90)
+# квантиль уровня 0.9 стандартного нормального распределения
+Z90 = 1.2815515655446004
+
+N_SAMPLES = 10000
+TIME_POINTS = 200
+# бюджет памяти на промежуточные массивы одного блока реализаций, байт
+CHUNK_BYTES = 64 * 2 ** 20
+
+
+# Выборка размера n из распределения spec = (вид, мин, мода, макс)
+def sample(spec, n, rng):
+    kind, low, mode, high = spec
+    if kind not in DISTRIBUTIONS:
+        raise ValueError('Неизвестное распределение {!r}, доступны: {}'.format(kind, ', '.join(DISTRIBUTIONS)))
+    if kind == FIXED or not high > low:
+        return np.full(n, float(mode))
+    if kind == UNIFORM:
+        return rng.uniform(low, high, n)
+    if kind == TRIANGULAR:
+        return rng.triangular(low, mode, high, n)
+    if kind == NORMAL:
+        sigma = (high - low) / (2 * Z90)
+        values = rng.normal(mode, sigma, n)
+        # усечение на нуле: неположительные значения перевыбираются
+        bad = values <= 0
+        while bad.any():
+            values[bad] = rng.normal(mode, sigma, bad.sum())
+            bad = values <= 0
+        return values
+    if kind == LOGNORMAL:
+        if not low > 0:
+            raise ValueError('Для логнормального распределения минимум должен быть положительным')
+        return rng.lognormal(np.log(mode), np.log(high / low) / (2 * Z90), n)
+
+
+# Выборка параметров: specs - {параметр: (вид, мин, мода, макс)} в СИ, base - значения
+# остальных параметров. Возвращает {параметр: массив (n,)}
+def sample_params(specs, base, n=N_SAMPLES, seed=None):
+    rng = np.random.default_rng(seed)
+    samples = {}
+    for key in UNCERTAIN:
+        spec = specs.get(key)
+        samples[key] = sample(spec, n, rng) if spec else np.full(n, float(base[key]))
+    samples['f'] = np.minimum(samples['f'], 1.0)
+    return samples
+
+
+# Депрессия [Па] на стенке первой скважины для всех реализаций: массив (реализации, времена).
+# distances - расстояния от точки на стенке до скважин (для самой скважины - rw), rates - их дебиты.
+# kernel='ei' - линейный источник (pd_ei); kernel='lapl' - решение с конечным радиусом скважины:
+# по эталонной кривой pD(tD, rD) (ars/type_curves.py) или при exact=True - обращением pd_lapl
+# для всех реализаций, скважин, времен и узлов обращения сразу
+def well_drawdown(samples, t, distances, rates, B, rw=0.1, kernel='ei', exact=False, method='stehfest',
+                  chunk_bytes=CHUNK_BYTES):
+    t = np.asarray(t, dtype=float)
+    r = np.asarray(distances, dtype=float)[:, None]
+    q = np.asarray(rates, dtype=float)[:, None]
+    n = samples['k'].size
+    # промежуточных массивов формы (блок, скважины, времена[, узлы]) в одной реализации
+    width = r.size * t.size * (DEFAULT_DEGREE[method] if kernel == 'lapl' and exact else 1)
+    rows = max(1, int(chunk_bytes // (8 * 6 * width)))
+    result = np.empty((n, t.size))
+    for start in range(0, n, rows):
+        k, h, f, ct, mu = (samples[key][start:start + rows, None, None] for key in UNCERTAIN)
+        eta = k / (mu * f * ct)
+        with np.errstate(under='ignore'):
+            if kernel == 'ei':
+                dp = pd_ei(r, t, q=q, B=B, k=k, h=h, mu=mu, eta=eta)
+            elif exact:
+                shape = np.broadcast_shapes(k.shape, r.shape, t.shape)
+                params = dict(r=r[..., None], r_w=rw, q=q[..., None], B=B, k=k[..., None], h=h[..., None],
+                              mu=mu[..., None], eta=eta[..., None])
+                dp = invert_laplace(lambda s: pd_lapl(s, **params), np.broadcast_to(t, shape), method=method)
+            else:
+                dp = pd_type_curve(r, t, q, B, k, h, mu, f, ct, rw)
+        result[start:start + rows] = dp.sum(axis=1)
+    return result
+
+
+# Расчет Монте-Карло для группы скважин в бесконечном пласте (точка - стенка первой скважины).
+# specs и base - как в sample_params (СИ), wells (n, 2+) и rates - как в run_model.
+# Возвращает словарь: t, p10 / p50 / p90 [Па] (времена,) и число реализаций
+@timed('kernel:monte_carlo')
+def monte_carlo(specs, base, wells, rates, n_samples=N_SAMPLES, t=None, kernel='ei', exact=False, seed=None,
+                rw=0.1, chunk_bytes=CHUNK_BYTES):
+    if t is None:
+        t = np.logspace(-1, 4, TIME_POINTS)
+    wells = np.asarray(wells, dtype=float)
+    distances = np.hypot(wells[:, 0] - wells[0, 0] - rw, wells[:, 1] - wells[0, 1])
+    samples = sample_params(specs, base, n_samples, seed)
+    dp = well_drawdown(samples, t, distances, rates, base['B'], rw, kernel, exact, chunk_bytes=chunk_bytes)
+    bands = np.percentile(dp, PERCENTILES, axis=0)
+    result = {'t': t, 'n_samples': n_samples}
+    for percentile, band in zip(PERCENTILES, bands):
+        result['p{}'.format(percentile)] = band
+    return result
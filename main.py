@@ -8,83 +8,47 @@ Original file is located at
 """
 
 import numpy as np
-import anaflow
-import scipy.special as sc
-import matplotlib.pyplot as plt
-from mpmath import *
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-from scipy.special import kn, iv, expi
-mp.dps = 15; mp.pretty = True
-
-"""##Задача
-###Рассмотрим неустановившийся приток жидкости к вертикальной скважине, полностью вскрывшей бесконечный однородный пласт толщины h с начальным давлением pi.
-
-###Исходные данные
-"""
-
-q = 0.00092  # [m3/c] - дебит скважины
-B = 1.25  # [m3/m3] - объемный коэффициент
-k = 50*1e-15  # [m2] - изотропная проницаемость
-h = 9.144  # [m] - толщина пласта
-f = 0.3  # [] - пористость
-c = 1.47*1e-9  # [1/Pa] - сжимаемость флюида
-cf = 1 * 1e-9  # [1/Pa] - сжимаемость породы
-ct = (c + cf)  # [1/Pa] - общая породы
-rw = 0.1524  # [m] - радиус ствола скважины
-r = 0.1524  # [m] - радиальная координата и расстояние
-mu = 3*1e-3  # [Pa*c] - вязкость
-eta = k / (mu * f * ct)  # коэф пьезопроводности
-l = rw
-PI = 3.44738E+7
-
-"""# Решение относительно распределения давления
-$$ \Delta p(s) = \dfrac {qB\mu}{2\pi k h} \dfrac{K_0 (\sqrt{\dfrac{s}{\eta}}r)}{s\sqrt{\dfrac{s}{\eta}}r_w K_1(\sqrt{\dfrac{s}{\eta}}r_w)}$$
-
-## Решение для линейного источника
-$$ \Delta p(r,t) = - \dfrac {q B \mu} {4 \pi k h} E_i(- \dfrac {r^2} {4 \eta t})$$
-"""
-
-# Решение для линейного источника
-def pd_ei (r, t, q = q, B = B, k = k, h = h, mu = mu, eta = eta, f = f):
-    return -q * B * mu /(4 * np.pi * k * h) * sc.expi(-r ** 2 /(4 * eta * t))
-
-# Решение с учетом конечного радиуса скважины
-def pd_lapl (s, r = r, r_w = rw, q = q, B = B, k = k, h = h, mu = mu, eta = eta, f = f):
-    return q * B * mu / (2 * np.pi * k * h) * sc.kn(0, r * (s / eta) ** 0.5) /(s * r_w * (s / eta)** 0.5 * sc.kn(1, r_w * (s / eta) ** 0.5))
-
-# Решение с учетом конечного радиуса скважины
-def pd_lapl_1 (s, r = r, r_w = rw, q = q, B = B, k = k, h = h, mu = mu, eta = eta, f = f):
-    return q * B * mu / (2 * np.pi * k * h) * besselk(0, r * (s / eta) ** 0.5) /(s * r_w * (s / eta)** 0.5 * besselk(1, r_w * (s / eta) ** 0.5))
-
-# Решение с учетом конечного радиуса скважины
-def pd_lapl_2 (s, r = r, r_w = rw, q = q, B = B, k = k, h = h, mu = mu, eta = eta, f = f):
-    return q * B * mu / (2 * np.pi * k * h * s) * sc.kn(0, (s) ** 0.5)
-
-# реализация функции расчета безразмерного давления на основе преобразования Лапласа
-def pd_line_source_lapl(r, t):
-    fp = lambda p: pd_lapl_1(p)
-    return invertlaplace(fp, t, method='stehfest', degree = 5)
-
-pd_ls_func = np.vectorize(pd_line_source_lapl)
-
-#path = 'https://raw.githubusercontent.com/AvtomonovPavel/Method-of-sources/main/Examples/example_3.1.1'
-#df = pd.read_table(path, sep='\s+', engine = 'python')
-
-t = np.logspace(-1, 4, 100)
-fig, ax1 = plt.subplots()
-fig.set_size_inches(16, 8)
-pd_ls = anaflow.get_lap_inv(pd_lapl)
-ax1.plot(t, pd_ls(t)/100000, label = 'Конечный радиус ')
-plt.title("Вертикальная скважина")
-ax1.plot(t, pd_ei(r, t)/100000, label = ' Линейный источник')
-#ax1.plot(df['dTime'], (df['p-p@dt=0'])/100000,'o', label = 'Результаты коммерческого симмулятора')
-#ax1.set_xscale('log')
-#ax1.set_yscale('log')
-ax1.legend()
-ax1.grid()
-plt.xlabel("t, c")
-plt.ylabel("dP, Па")
+from ars.laplace import get_lap_inv
+from ars.solutions import pd_ei, pd_lapl, r
+from ars.model import run_model
+from ars.field import PressureField
+from ars.animation import TimeLapse
+from ars.cache import ResultCache, make_key, digest
+from ars.scenarios import (GEO_FIELDS, BOUNDARY_MODELS, UNCERTAINTY_DISTRIBUTIONS, boundary_names, geo_params,
+                           model_params, uncertainty_specs)
+from ars.forecast import constant_pressure_rates, parse_forecast, DEFAULT_HORIZON
+from ars.economics import evaluate, parse_economics, ECONOMY_FIELDS
+from ars.uncertainty import monte_carlo, N_SAMPLES, UNCERTAIN
+from ars.rate_history import convolve_rates, schedule_from_table
+from ars.transport import crop_grid, zoom_ranges
+from ars.diagnostics import diagnostic, DEFAULT_WINDOW, STORAGE, RADIAL, BOUNDARY
+from ars.gauge import read_gauge
+from ars.history_matching import Problem, history_match_job, SKIN_BOUNDS
+from ars.result_store import ResultStore
+from ars.jobs import JobQueue, DONE, ERROR, CANCELLED, UNKNOWN
+from ars.metrics import instrument_app, metrics, METRICS_ROUTE
+
+
+# График для ноутбука: конечный радиус и линейный источник (строится по запросу, не при импорте)
+def plot_vertical_well():
+    import matplotlib.pyplot as plt
+    t = np.logspace(-1, 4, 100)
+    fig, ax1 = plt.subplots()
+    fig.set_size_inches(16, 8)
+    pd_ls = get_lap_inv(pd_lapl)
+    ax1.plot(t, pd_ls(t)/100000, label = 'Конечный радиус ')
+    plt.title("Вертикальная скважина")
+    ax1.plot(t, pd_ei(r, t)/100000, label = ' Линейный источник')
+    #path = 'https://raw.githubusercontent.com/AvtomonovPavel/Method-of-sources/main/Examples/example_3.1.1'
+    #df = pd.read_table(path, sep='\s+', engine = 'python')
+    #ax1.plot(df['dTime'], (df['p-p@dt=0'])/100000,'o', label = 'Результаты коммерческого симмулятора')
+    ax1.legend()
+    ax1.grid()
+    plt.xlabel("t, c")
+    plt.ylabel("dP, Па")
+    return fig
 
 # !/usr/bin/env python
 # coding: utf-8
@@ -92,50 +56,65 @@ plt.ylabel("dP, Па")
 # In[1]:
 
 
+import base64
+import io
 import os
+import tempfile
 import dash
 from dash import html
 import numpy as np
 from dash import dcc
-import pprint
 from dash import Dash, dash_table, dcc, html
 from dash.dependencies import Input, Output
 import dash_bootstrap_components as dbc
 from plotly.subplots import make_subplots
 from dash.exceptions import PreventUpdate
-import plotly.figure_factory as ff
+from dash import no_update, Patch
 from dash.dependencies import Input, Output, State
 
 
-params_geo_table = [
-    'Объемный коэффициент, м3/м3', 'Проницаемость, мД', 'Толщина пласта, м', 'Пористость',
-    'Полная сжимаемость, 1/МПа', 'Вязкость нефти, мПа', 'Начальное пластовое давление, МПа'
-]
-values_geo_table = [1.25, 50, 9.144, 0.3, 0.00247, 3, 34.47 ]
+params_geo_table = [name for name, *_ in GEO_FIELDS]
+values_geo_table = [default for *_, default in GEO_FIELDS]
 params_well_table = [
     'Тип скважины', 'X координата', 'Y координата', 'Z координата',
 ]
 params_model_well_table = [
     'Тип скважины','Радиус скважины, м', 'Дебит скважины, м3/сут','Время, ч', 'Длина горизонтального ствола м',
-    'Толщина вскрытия м', 'Ширина трещины ГРП м'
+    'Толщина вскрытия м', 'Ширина трещины ГРП м', 'Полудлина трещины ГРП м', 'Проницаемость трещины ГРП мД'
 ]
 params_model_Q_table = [
     'Время, ч'
 ]
 params_adapt_table = [
-    'Проницаемость мин, мД','Проницаемость макс, мД'
+    'Проницаемость мин, мД','Проницаемость макс, мД', 'Скин-фактор мин', 'Скин-фактор макс',
+    'Коэффициент ВСС мин, м3/МПа', 'Коэффициент ВСС макс, м3/МПа'
 ]
 params_predict_table = [
     'Время прогноза, ч','Забойное давление, МПа'
 ]
-params_predict_econom_table = [
-    'Стоимость нефти, руб/т','Стоимость проведения ГТМ, тыс. руб'
-]
+params_predict_econom_table = [name for name, *_ in ECONOMY_FIELDS]
+ECONOMY_RESULT_COLUMNS = ['Скважина', 'Добыча, т', 'Выручка, тыс. руб', 'NPV, тыс. руб', 'Срок окупаемости, сут']
+# Кэш результатов расчета (общий для всех сессий сервера)
+model_cache = ResultCache(maxsize=64, max_bytes=256 * 2 ** 20)
+# Ленивые трехмерные поля давления рассчитанных моделей (срезы для graph_teplo) по ключу расчета
+model_fields = ResultCache(maxsize=16)
+# Анимации карты давления во времени по ключу параметров (кадры дополняются по мере расчета)
+timelapse_cache = ResultCache(maxsize=8)
+# Серверное хранилище массивов результатов (в браузер передаются только описатели)
+result_store = ResultStore(max_bytes=256 * 2 ** 20, spill_dir=os.path.join(tempfile.gettempdir(), 'ars_results'))
+# Предельный размер загружаемого файла манометра, байт (содержимое разбирается в памяти)
+GAUGE_MAX_BYTES = 200 * 2 ** 20
+# Очередь фоновых расчетов (пул процессов создается при первом расчете)
+job_queue = JobQueue(kind='process')
+
 # Инициализация
 app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP] , suppress_callback_exceptions = True)
+# Замеры обратных вызовов и ядер (маршрут METRICS_ROUTE); ARS_DEBUG_PANEL=1 - таблица замеров на странице
+# расчета и сброс замеров (POST METRICS_ROUTE/reset)
+DEBUG_PANEL = os.environ.get('ARS_DEBUG_PANEL', '0') != '0'
+instrument_app(app, allow_reset=DEBUG_PANEL)
 def change_wells_graph(value):
     trace_list = []
-    print(value)
     trace_list.append(go.Scatter(visible=True, x=value,
                                  y=[1, 21, 31], line=dict(color='red', dash='dot'), name="Клапан 1"))
 
@@ -161,6 +140,21 @@ def change_wells_graph(value):
               }
 
     return figure
+
+
+# Таблица замеров (ars/metrics.py) под страницей расчета, если задано ARS_DEBUG_PANEL
+METRICS_COLUMNS = ['Имя', 'Вызовов', 'Среднее, мс', 'p50, мс', 'p90, мс', 'p99, мс', 'Макс., мс', 'Объем p50, байт']
+def metrics_panel():
+    if not DEBUG_PANEL:
+        return []
+    return [html.Details([
+        html.Summary('Замеры времени ({})'.format(METRICS_ROUTE)),
+        dcc.Interval(id='metrics_poll', interval=2000),
+        dash_table.DataTable(id='table_metrics', columns=[{'name': c, 'id': c} for c in METRICS_COLUMNS],
+                             sort_action='native', style_cell={'textAlign': 'left'}),
+    ], style={'margin': 14})]
+
+
 def change_pagecontent(pathname):
     if pathname == "/":
         return [
@@ -197,6 +191,10 @@ def change_pagecontent(pathname):
                 dcc.Store(id='local_contur', storage_type='local'),
                 dcc.Store(id='local_teplo', storage_type='local'),
                 dcc.Store(id='local_line', storage_type='local'),
+                dcc.Store(id='local_job'),
+                dcc.Store(id='local_uncertainty'),
+                dcc.Store(id='local_predict'),
+                dcc.Interval(id='job_poll', interval=500, disabled=True),
                 dbc.Row([
                     dbc.Col([html.Div('Анализ работы скважины')], width=12,
                             style={'font-size': 48, 'textAlign': 'center', 'font-style': 'oblique', 'margin-top': 10,
@@ -254,6 +252,36 @@ def change_pagecontent(pathname):
                                 dcc.Dropdown(id='dropdown-model-boundary', options = ['Непротекаемые', 'Постоянное давление', 'Смешанные'], value = 'Непротекаемые')
                                 ]),
                             ]),
+                        dbc.Row([
+                            dbc.Col([html.Div('Неопределенность параметров (Монте-Карло)')], width=12,
+                                    style={'font-size': 24, 'textAlign': 'left', 'font-style': 'oblique',
+                                           'margin-top': 10,
+                                           'color': 'black'}),
+                        ]),
+                        dbc.Row([
+                            dash_table.DataTable(
+                                id='table-uncertainty',
+                                columns=(
+                                    [{'id': 'Parameter', 'name': 'Parameter', 'editable': False}] +
+                                    [{'id': 'Распределение', 'name': 'Распределение', 'presentation': 'dropdown'}] +
+                                    [{'id': p, 'name': p} for p in ['Мин', 'Мода', 'Макс']]
+                                ),
+                                data=[
+                                    dict(Parameter=name, Распределение='Постоянное')
+                                    for name, key, scale, default in GEO_FIELDS if key in UNCERTAIN
+                                ],
+                                dropdown={'Распределение': {'options': [
+                                    {'label': name, 'value': name} for name in UNCERTAINTY_DISTRIBUTIONS]}},
+                                editable=True
+                            ),
+                        ]),
+                        dbc.Row([
+                            dbc.Col([
+                                dcc.Input(id='uncertainty-samples', type='number', min=100, step=100, value=N_SAMPLES),
+                                dbc.Button('P10 / P50 / P90', id='button_uncertainty', n_clicks=0,
+                                           style={'margin-left': 10}),
+                                html.Div(id='uncertainty-status')]),
+                        ], style={'margin-top': 10}),
 
                         ], style = {'margin-top': 60}),
             ]),
@@ -392,7 +420,16 @@ def change_pagecontent(pathname):
                             dcc.Graph(id="graph_diagnostic", figure=go.Figure(
                                 data=[go.Scatter(x=[100, 200, 300], y=[300, 200, 300], marker=dict(size=18))],
                                 layout=go.Layout(height=500, width=700, paper_bgcolor="rgba(0, 0, 0, 0)",
-                                                 margin=dict(l=0, r=0, t=0, b=0))))
+                                                 margin=dict(l=0, r=0, t=0, b=0)))),
+                            html.Div(['Окно сглаживания производной, ln t: ',
+                                      dcc.Input(id='diagnostic-window', type='number', value=DEFAULT_WINDOW,
+                                                min=0.01, max=1, step=0.05)]),
+                            html.Div(['Файл манометра (время, ч; давление, МПа): ',
+                                      dcc.Input(id='gauge-well', type='text', placeholder='скважина'),
+                                      dcc.Upload(dbc.Button('Загрузить'), id='gauge-upload',
+                                                 max_size=GAUGE_MAX_BYTES)]),
+                            html.Div(id='gauge-status'),
+                            dcc.Store(id='local_gauge'),
                         ])]),
                 ]),
                 dbc.Row([
@@ -424,6 +461,10 @@ def change_pagecontent(pathname):
                                 editable=True,
                                 row_deletable=True,
                             ),
+                            dbc.Button('Адаптация', id='button_adapt_run', n_clicks=0),
+                            html.Div(id='adapt-status'),
+                            dcc.Store(id='local_adapt'),
+                            dcc.Interval(id='adapt_poll', interval=500, disabled=True),
 
                         ])], width=6, style={'margin-left': 14}),
 
@@ -519,6 +560,19 @@ def change_pagecontent(pathname):
                     dbc.Col([
                         dbc.Row([
                             html.Div('Дополнительная добыча')
+                        ]),
+                        dbc.Row([
+                            dcc.Graph(id="graph_predict_econom", figure=go.Figure(
+                                layout=go.Layout(height=400, width=700, paper_bgcolor="rgba(0, 0, 0, 0)",
+                                                 margin=dict(l=0, r=0, t=0, b=0))))
+                        ]),
+                        dbc.Row([
+                            html.Div(id='econom-status'),
+                            dash_table.DataTable(
+                                id='table_econom_result',
+                                columns=[{'id': c, 'name': c} for c in ECONOMY_RESULT_COLUMNS],
+                                data=[],
+                            ),
                         ])]),
                 ]),
                 dbc.Row([
@@ -530,7 +584,8 @@ def change_pagecontent(pathname):
                     dbc.Col([
                         dbc.Button( "Start / Stop", id='submit-val', n_clicks=0),
                         html.Div(id='container-button-basic',
-                                 children='Press submit')],  style={"margin-left":14})
+                                 children='Press submit'),
+                        html.Div(id='job-status')],  style={"margin-left":14})
                     ]),
                 dbc.Row([
                     dbc.Col([
@@ -574,6 +629,17 @@ def change_pagecontent(pathname):
                                     layout=go.Layout(height=500, width=700, paper_bgcolor="rgba(0, 0, 0, 0)", margin=dict(l=0, r=0, t=0, b=0))))
                             ], style={}),
                         ]),
+                        dbc.Row([
+                            dbc.Col([
+                                dbc.Button('Анимация во времени', id='button_timelapse', n_clicks=0),
+                                html.Div(id='timelapse-status'),
+                                dcc.Store(id='local_timelapse'),
+                                dcc.Interval(id='timelapse_poll', interval=300, disabled=True),
+                                dcc.Graph(id='graph_timelapse', figure=go.Figure(
+                                    layout=go.Layout(height=500, width=700, paper_bgcolor="rgba(0, 0, 0, 0)",
+                                                     margin=dict(l=0, r=0, t=0, b=0))))
+                            ], style={'margin-left': 20}),
+                        ]),
 
                     ]),
                 ]),
@@ -593,6 +659,14 @@ def change_pagecontent(pathname):
                                 style={'font-size': 24, 'textAlign': 'center', 'font-style': 'oblique',
                                        'margin-top': 10,
                                        'color': 'black'}),
+                            dbc.Col([
+                                html.Div('Положение среза'),
+                                dcc.Slider(id='teplo-position', min=0, max=1, step=0.01, value=0.5,
+                                           marks={0: '0', 0.5: '0.5', 1: '1'}, updatemode='drag'),
+                            ], width=6,
+                                style={'font-size': 24, 'textAlign': 'center', 'font-style': 'oblique',
+                                       'margin-top': 10,
+                                       'color': 'black'}),
                         ]),
                         dbc.Row([
                             dbc.Col([
@@ -619,6 +693,7 @@ def change_pagecontent(pathname):
 
                     ]),
                 ]),
+                *metrics_panel(),
 
             ], style=CONTSTYLE_new),
         ]
@@ -702,7 +777,6 @@ def update_columns(rows, n_clicks,  existing_columns):
     i = 1
     if n_clicks == 1:
         for row in rows:
-            print(row.get('Скважина', None))
             if (row.get('Тип скважины', None) != "a"):
                 existing_columns.append({
                 'id': "Pressure {}".format(row.get('Скважина', None)), 'name': "Preessure {}".format(row.get('Скважина', None)),
@@ -839,77 +913,138 @@ def add_row(n_clicks, rows, columns):
     return rows
 
 
-@app.callback(Output('local_param', 'data'),
-              Output('local_contur', 'data'),
+# Модели границ, доступные для выбранной модели пласта (остальные - неактивны в списке);
+# недоступная выбранная граница заменяется непротекаемой
+@app.callback(Output('dropdown-model-boundary', 'options'),
+              Output('dropdown-model-boundary', 'value'),
+              Input('dropdown-model-reservoir', 'value'),
+              State('dropdown-model-boundary', 'value'))
+def on_reservoir(reservoir, boundary):
+    allowed = boundary_names(reservoir)
+    options = [{'label': name, 'value': name, 'disabled': name not in allowed} for name in BOUNDARY_MODELS]
+    return options, boundary if boundary in allowed else allowed[0]
+
+
+@app.callback(Output('local_job', 'data'),
               Input('table-geo', 'data'),
               Input('table_wells', 'data'),
-              Input('submit-val', 'n_clicks'))
-def on_data(rows_in_geo, rows_in_wells, n_clicks):
+              Input('submit-val', 'n_clicks'),
+              State('table_model_wells', 'data'),
+              State('local_job', 'data'),
+              State('dropdown-model-reservoir', 'value'),
+              State('dropdown-model-boundary', 'value'))
+def on_data(rows_in_geo, rows_in_wells, n_clicks, rows_in_model_wells, job, reservoir, boundary):
     if n_clicks is None:
         # prevent the None callbacks is important with the store component.
         # you don't want to update the store for nothing.
         raise PreventUpdate
-    # Data from geoTable
-    B = float(rows_in_geo[0]['Value'])
-    k = float(rows_in_geo[1]['Value']) * 10 ** (-15)  # [m2]
-    h = float(rows_in_geo[2]['Value'])
-    f = float(rows_in_geo[3]['Value'])
-    ct = float(rows_in_geo[4]['Value']) * 10 ** (-6)
-    mu = float(rows_in_geo[5]['Value']) * 10 ** (-3)
-    PI = float(rows_in_geo[6]['Value']) * 10 ** (6)
+    # предыдущий расчет больше не нужен
+    if job and job.get('id'):
+        job_queue.cancel(job['id'])
+    if (n_clicks %2 == 0):
+        return None
+    # параметры пласта (table-geo), скважин и модели пласта в СИ (см. ars/scenarios.py)
+    geo = {row['Parameter']: row['Value'] for row in rows_in_geo}
+    try:
+        params = model_params(geo, rows_in_wells, rows_in_model_wells, reservoir, boundary)
+    except ValueError as error:
+        return {'id': None, 'key': None, 'error': str(error)}
+    # готовый результат берется из кэша (ключ - параметры пласта/скважин и модель),
+    # иначе расчет ставится в очередь
+    key = digest(make_key(run_model, [], **params))
+    if key not in model_fields:
+        model_fields.put(key, PressureField(**params))
+    if key in model_cache:
+        return {'id': None, 'key': key}
+    return {'id': job_queue.submit(run_model, **params), 'key': key}
+
+
+# Результаты для dcc.Store: массивы остаются в result_store на сервере,
+# в браузер уходят только их описатели
+def encode_result(*results):
+    return tuple([result_store.put(i, dtype=np.float32) for i in result] for result in results)
+
+
+# Массивы из dcc.Store по описателям; если результат уже вытеснен - обновление пропускается
+def resolve_store(data):
+    try:
+        return [result_store.resolve(i) for i in data]
+    except KeyError:
+        raise PreventUpdate
+
+
+@app.callback(Output('local_param', 'data'),
+              Output('local_contur', 'data'),
+              Output('local_line', 'data'),
+              Output('job_poll', 'disabled'),
+              Output('job-status', 'children'),
+              Input('job_poll', 'n_intervals'),
+              Input('local_job', 'data'))
+def on_job(n_intervals, job):
+    if job is None:
+        return [[0], [0]], [[0], [0], [0]], [[], []], True, ''
+    if job.get('error'):
+        return no_update, no_update, no_update, True, 'Расчет не запущен: {}'.format(job['error'])
+    result = model_cache.get(job['key'])
+    if result is not None:
+        return *encode_result(*result), True, 'Расчет завершен'
+    status = job_queue.status(job['id'])
+    if status['state'] == DONE:
+        result = model_cache.put(job['key'], job_queue.result(job['id'], pop=True))
+        # run_model выполняется в процессе очереди: его замеры туда и попадают, здесь - общее время
+        metrics.record('job:run_model', status['elapsed'])
+        return *encode_result(*result), True, 'Расчет завершен за {:.1f} с'.format(status['elapsed'])
+    if status['state'] in (ERROR, CANCELLED, UNKNOWN):
+        return no_update, no_update, no_update, True, 'Расчет прерван: {}'.format(status['error'] or status['state'])
+    return no_update, no_update, no_update, False, 'Расчет: {:.0f}%'.format(100 * status['progress'])
+
+# Полосы P10 / P50 / P90 депрессии на забое по выборке параметров table-uncertainty (ars/uncertainty.py)
+@app.callback(Output('local_uncertainty', 'data'),
+              Output('uncertainty-status', 'children'),
+              Input('button_uncertainty', 'n_clicks'),
+              State('table-uncertainty', 'data'),
+              State('uncertainty-samples', 'value'),
+              State('table-geo', 'data'),
+              State('table_wells', 'data'),
+              State('table_model_wells', 'data'))
+def on_uncertainty(n_clicks, rows_in_uncertainty, n_samples, rows_in_geo, rows_in_wells, rows_in_model_wells):
+    if not n_clicks:
+        raise PreventUpdate
+    geo = {row['Parameter']: row['Value'] for row in rows_in_geo}
+    try:
+        params = model_params(geo, rows_in_wells, rows_in_model_wells)
+        specs = uncertainty_specs(rows_in_uncertainty, geo)
+        result = monte_carlo(specs, params, params['wells'], params['rates'], int(n_samples or N_SAMPLES),
+                             rw=params['rw'])
+    except (ValueError, TypeError) as error:
+        return None, 'Ошибка в параметрах неопределенности: {}'.format(error)
+    bands = [result['t']] + [result[name] / 1000000 for name in ('p10', 'p50', 'p90')]
+    return encode_result(bands)[0], 'Реализаций: {} (бесконечный пласт)'.format(result['n_samples'])
 
-    #q = [row.get('Дебит скважины, м3/сут', None) / 86400 for row in rows_in_wells]
-    #rw = [row.get('Радиус скважины, м', None) for row in rows_in_wells]
-    #r = rw[0]
-    t = np.logspace(-1, 4, 100)
-    result_well_param = []
-    result_well_param.append([i for i in t])
-    result_well_param.append(pd_ei(0.1, t, q = 0.00092, B = B, k = k, h = h, mu = mu, eta = eta, f = f) / 1000000)
-
-    # зададим параметры воронки депрессии
-    r_e = 300
-
-    # зададим координатную сетку основываясь на параметрах
-    x = np.linspace(-r_e, r_e, 100)
-    y = np.linspace(-r_e, r_e, 100)
-    z = np.linspace(-h / 2, h / 2, 100)
-    # рассчитаем вспомогательные вектора для построения сетки
-    xv, yv = np.meshgrid(x, y)
-    xvz, zvz = np.meshgrid(x, z)
-    # зададим координаты скважины
-    xwell1 = 0
-    ywell1 = 0
-    zwell1 = z
-    # рассчитаем значение давлений во всех точках сетки
-    p_mesh_full = pd_ei(r=((xv - xwell1) ** 2 + (yv - ywell1) ** 2 + (
-    [[(zvz[i][j] - zwell1[i]) ** 2 for i in range(x.size)] for j in range(y.size)])) ** 0.5,
-                        t=100000000, q = 0.00092, B = B, k = k, h = h, mu = mu, eta = eta, f = f)/1000000
-
-    result_contur = []
-    result_contur.append(list(x))
-    result_contur.append(list(y))
-    result_contur.append(p_mesh_full)
-    # удалим значения за контуром, так как в данном случае они не имеют смысла
-    # p_mesh[np.where(p_mesh > pres)] = pres
-    if (n_clicks %2 == 1):
-        return result_well_param, result_contur
-    else:
-        return [[0], [0]], [[0], [0], [0]]
 
 @app.callback(Output("graph_param_wells", 'figure'),
               Input('submit-val', 'n_clicks'),
               Input('local_param', 'modified_timestamp'),
+              Input('local_uncertainty', 'data'),
               State('local_param', 'data'))
-def on_data(n_clicks, ts, data):
+def on_data(n_clicks, ts, bands, data):
     if n_clicks is None:
         # prevent the None callbacks is important with the store component.
         # you don't want to update the store for nothing.
         raise PreventUpdate
     if ts is None:
         raise PreventUpdate
+    data = resolve_store(data)
+    traces = []
+    if bands:
+        t, p10, p50, p90 = resolve_store(bands)
+        traces = [go.Scatter(x=t, y=p90, mode='lines', line=dict(width=0), name='P90'),
+                  go.Scatter(x=t, y=p10, mode='lines', line=dict(width=0), fill='tonexty',
+                             fillcolor='rgba(99, 110, 250, 0.2)', name='P10 - P90'),
+                  go.Scatter(x=t, y=p50, mode='lines', line=dict(dash='dash'), name='P50')]
     return {
         'data':
-            [go.Scatter(x=data[0],
+            traces + [go.Scatter(x=data[0],
                         y=data[1],
                         marker=dict(size=18))
              ],
@@ -917,29 +1052,158 @@ def on_data(n_clicks, ts, data):
                    'plot_bgcolor': "rgba(0, 0, 0, 0)", 'margin': dict(l=20, r=0, t=20, b=15)}
     }
 
+# Срез трехмерного поля давления (XY, XZ или YZ) в выбранном положении: считается только
+# плоскость среза, недавние срезы берутся из кэша поля
+@app.callback(Output('local_teplo', 'data'),
+              Input('dropdown-teplo', 'value'),
+              Input('teplo-position', 'value'),
+              Input('local_job', 'data'))
+def on_teplo(plane, position, job):
+    if not job:
+        raise PreventUpdate
+    field = model_fields.get(job['key'])
+    if field is None:
+        raise PreventUpdate
+    return {'plane': plane, 'slice': encode_result(field.slice(plane or 'XY', position or 0.0))[0]}
+
+
+@app.callback(Output("graph_teplo", 'figure'),
+              Input('local_teplo', 'data'))
+def on_data(data):
+    if not data:
+        raise PreventUpdate
+    u, v, values = resolve_store(data['slice'])
+    plane = data['plane']
+    fig = go.Figure(data=[go.Heatmap(x=u, y=v, z=values, colorscale='Jet', colorbar=dict(title='dp, МПа'))])
+    fig.update_layout(height=500, width=700, paper_bgcolor="rgba(0, 0, 0, 0)", margin=dict(l=0, r=0, t=0, b=0))
+    fig.update_xaxes(title_text='{}, м'.format(plane[0].lower()))
+    fig.update_yaxes(title_text='{}, м'.format(plane[1].lower()))
+    return fig
+
+
+# Анимация карты давления: по кнопке создается (или берется из кэша) TimeLapse для текущих
+# параметров, и каждая порция кадров ставится в фоновую очередь. Опрос timelapse_poll
+# собирает готовые порции; пока расчет идет, в браузер уходит только последний готовый
+# кадр (Patch одного массива), а анимация со всеми кадрами - один раз по готовности
+@app.callback(Output('local_timelapse', 'data'),
+              Output('timelapse_poll', 'disabled'),
+              Input('button_timelapse', 'n_clicks'),
+              State('local_timelapse', 'data'),
+              State('table-geo', 'data'),
+              State('table_wells', 'data'),
+              State('table_model_wells', 'data'),
+              State('dropdown-model-reservoir', 'value'),
+              State('dropdown-model-boundary', 'value'))
+def on_timelapse_start(n_clicks, data, rows_in_geo, rows_in_wells, rows_in_model_wells, reservoir, boundary):
+    if not n_clicks:
+        raise PreventUpdate
+    # порции предыдущей анимации больше не нужны
+    for _, job_id in (data or {}).get('jobs', []):
+        job_queue.cancel(job_id)
+    geo = {row['Parameter']: row['Value'] for row in rows_in_geo}
+    try:
+        params = model_params(geo, rows_in_wells, rows_in_model_wells, reservoir, boundary)
+    except ValueError as error:
+        return {'error': str(error)}, False
+    key = digest(make_key(TimeLapse, [], **params))
+    timelapse = timelapse_cache.get(key)
+    if timelapse is None:
+        timelapse = timelapse_cache.put(key, TimeLapse(**params))
+    jobs = [[start, job_queue.submit(timelapse.compute, start, stop)] for start, stop in timelapse.batches()
+            if start >= len(timelapse.frames)]
+    return {'key': key, 'jobs': jobs, 'preview': False}, False
+
+
+# Карта одного кадра (предпросмотр) или анимация по всем кадрам
+def timelapse_figure(timelapse, frames, animate=False):
+    zmax = float(np.nanmax(np.abs(frames[-1]))) or 1.0
+    contour = lambda z: go.Contour(x=timelapse.x, y=timelapse.y, z=z, colorscale='Jet', zmin=-zmax, zmax=zmax,
+                                   zauto=not animate, colorbar=dict(title='dp, МПа'))
+    layout = dict(height=500, width=700, paper_bgcolor="rgba(0, 0, 0, 0)", margin=dict(l=0, r=0, t=0, b=0))
+    if not animate:
+        return go.Figure(data=[contour(frames[-1])], layout=layout)
+    labels = ['{:.3g} ч'.format(t / 3600) for t in timelapse.times[:len(frames)]]
+    fig = go.Figure(data=[contour(frames[0])],
+                    frames=[go.Frame(data=[contour(z)], name=label) for z, label in zip(frames, labels)])
+    fig.update_layout(
+        **layout,
+        updatemenus=[dict(type='buttons', showactive=False, x=0, y=0, xanchor='left', yanchor='top', buttons=[
+            dict(label='▶', method='animate',
+                 args=[None, dict(frame=dict(duration=300, redraw=True), fromcurrent=True)]),
+            dict(label='❚❚', method='animate',
+                 args=[[None], dict(frame=dict(duration=0, redraw=False), mode='immediate')])])],
+        sliders=[dict(x=0.1, len=0.9, y=0, currentvalue=dict(prefix='t = '), steps=[
+            dict(label=label, method='animate',
+                 args=[[label], dict(frame=dict(duration=0, redraw=True), mode='immediate')])
+            for label in labels])])
+    return fig
+
+
+@app.callback(Output('graph_timelapse', 'figure'),
+              Output('timelapse_poll', 'disabled', allow_duplicate=True),
+              Output('timelapse-status', 'children'),
+              Output('local_timelapse', 'data', allow_duplicate=True),
+              Input('timelapse_poll', 'n_intervals'),
+              State('local_timelapse', 'data'),
+              prevent_initial_call=True)
+def on_timelapse(n_intervals, data):
+    if data and data.get('error'):
+        return no_update, True, 'Анимация не запущена: {}'.format(data['error']), no_update
+    timelapse = timelapse_cache.get(data['key']) if data else None
+    if timelapse is None:
+        return no_update, True, 'Анимация недоступна, запустите снова', no_update
+    # готовые порции - в кадры TimeLapse (общие для всех, кто запросил те же параметры)
+    ready, waiting = len(timelapse.frames), []
+    for start, job_id in data['jobs']:
+        job = job_queue.status(job_id)
+        if job['state'] == DONE:
+            ready = timelapse.collect(start, job_queue.result(job_id, pop=True))
+        elif job['state'] in (ERROR, CANCELLED, UNKNOWN):
+            if start >= len(timelapse.frames):
+                return no_update, True, 'Расчет анимации прерван: {}'.format(job['error'] or job['state']), no_update
+        else:
+            waiting.append([start, job_id])
+    status = 'Кадров: {} из {}'.format(ready, timelapse.times.size)
+    if timelapse.done:
+        return timelapse_figure(timelapse, timelapse.frames, animate=True), True, status, dict(data, jobs=[])
+    if ready == 0 or (len(waiting) == len(data['jobs']) and data['preview']):
+        return no_update, False, status, no_update
+    # предпросмотр: первый раз - карта одного кадра, далее - замена только массива z
+    if data['preview']:
+        fig = Patch()
+        # массив в двоичном виде plotly (как в полной фигуре), а не списком чисел
+        fig['data'][0]['z'] = go.Figure(go.Contour(z=timelapse.frames[ready - 1])).to_dict()['data'][0]['z']
+    else:
+        fig = timelapse_figure(timelapse, timelapse.frames[:ready])
+    return fig, False, status, dict(data, jobs=waiting, preview=True)
+
+
 @app.callback(Output("graph_contur", 'figure'),
               Input('dropdown-contur', 'value'),
               Input('submit-val', 'n_clicks'),
               Input('local_contur', 'modified_timestamp'),
-              State('local_contur', 'data'))
-def on_data(type_map, n_clicks, ts, data):
+              Input('graph_contur', 'relayoutData'),
+              State('local_contur', 'data'),
+              State('local_line', 'data'))
+def on_data(type_map, n_clicks, ts, relayout, data, lines):
     if n_clicks is None:
         # prevent the None callbacks is important with the store component.
         # you don't want to update the store for nothing.
         raise PreventUpdate
     if ts is None:
         raise PreventUpdate
-    #print(data[0])
-    #print(data[1])
-    #print(np.gradient(data[2],axis=1))
-    #print([i for i in np.array(data[0])])
+    data = resolve_store(data)
+    if data[2].ndim == 2:
+        # в график уходит видимое окно карты, прореженное до DISPLAY_SIZE узлов по оси
+        data = crop_grid(*data, *zoom_ranges(relayout))
     if (type_map == "Контурная карта"):
         return {
         'data':[go.Contour( x = data[0],
                             y = data[1],
                             z = data[2])
              ],
-        'layout' : {'height':'300', 'width':'700', 'paper_bgcolor':"rgba(0, 0, 0, 0)",'plot_bgcolor':"rgba(0, 0, 0, 0)", 'margin':dict(l=30, r=0, t=10, b=30)}
+        'layout' : {'height':'300', 'width':'700', 'paper_bgcolor':"rgba(0, 0, 0, 0)",'plot_bgcolor':"rgba(0, 0, 0, 0)", 'margin':dict(l=30, r=0, t=10, b=30),
+                    'uirevision': 'contur'}
         }
     elif (type_map == "Тепловая карта"):
         return {
@@ -948,29 +1212,361 @@ def on_data(type_map, n_clicks, ts, data):
                                 z=data[2])
                      ],
             'layout': {'height': '300', 'width': '700', 'paper_bgcolor': "rgba(0, 0, 0, 0)",
-                       'plot_bgcolor': "rgba(0, 0, 0, 0)", 'margin': dict(l=30, r=0, t=10, b=30)}
+                       'plot_bgcolor': "rgba(0, 0, 0, 0)", 'margin': dict(l=30, r=0, t=10, b=30),
+                       'uirevision': 'contur'}
         }
     else:
-        x1 = data[0]
-        x11 = data[0]
-        y1 = data[1]
-        u1 = (np.gradient(data[2], axis=1))
-        v1 = (np.gradient(data[2], axis=0))
-        print(data[0])
-        print(data[1])
-        print((np.gradient(list(data[2]), axis=1)))
-        print((np.gradient(list(data[2]), axis=0)))
-        fig = go.Figure(ff.create_streamline(
-                                x=x1,
-                                y=y1,
-                                u=u1,
-                                v=v1,
-                                arrow_scale=10))
-        fig.update_layout({'paper_bgcolor': "rgba(0, 0, 0, 0)",
-                       'plot_bgcolor': "rgba(0, 0, 0, 0)", 'margin': dict(l=30, r=0, t=10, b=30)})
-        return fig
+        # линии тока рассчитаны вместе с картой (ars/streamlines.py) - поверх контурной карты
+        lines = resolve_store(lines) if lines else [[], []]
+        return {
+            'data': [go.Contour(x=data[0], y=data[1], z=data[2], opacity=0.6, showscale=False),
+                     go.Scatter(x=lines[0], y=lines[1], mode='lines', line=dict(color='black', width=1),
+                                hoverinfo='skip', showlegend=False)],
+            'layout': {'height': '300', 'width': '700', 'paper_bgcolor': "rgba(0, 0, 0, 0)",
+                       'plot_bgcolor': "rgba(0, 0, 0, 0)", 'margin': dict(l=30, r=0, t=10, b=30),
+                       'uirevision': 'contur'}
+        }
+
+@app.callback(Output("graph_line", 'figure'),
+              Input('submit-val', 'n_clicks'),
+              Input('local_line', 'modified_timestamp'),
+              State('local_line', 'data'))
+def on_data(n_clicks, ts, data):
+    if n_clicks is None:
+        raise PreventUpdate
+    if ts is None or not data:
+        raise PreventUpdate
+    data = resolve_store(data)
+    return {
+        'data': [go.Scatter(x=data[0], y=data[1], mode='lines', line=dict(color='black', width=1))],
+        'layout': {'height': '500', 'width': '700', 'paper_bgcolor': "rgba(0, 0, 0, 0)",
+                   'plot_bgcolor': "rgba(0, 0, 0, 0)", 'margin': dict(l=30, r=0, t=10, b=30),
+                   'yaxis': {'scaleanchor': 'x'}}
+    }
+
+# Значения параметра parameter по скважинам из таблиц вида table_model_wells / table_adapt_param
+def table_values(rows, parameter):
+    values = {}
+    for row in rows or []:
+        if row.get('Parameter') == parameter:
+            for name, value in row.items():
+                try:
+                    values[name] = float(value)
+                except (TypeError, ValueError):
+                    pass
+    return values
+
+
+# Адаптация ставится в фоновую очередь (как расчет модели в on_data); замеры для графика
+# передаются вместе с идентификатором задачи, результат забирает on_adapt_job
+@app.callback(Output('local_adapt', 'data'),
+              Output('adapt_poll', 'disabled'),
+              Output('adapt-status', 'children'),
+              Input('button_adapt_run', 'n_clicks'),
+              State('local_adapt', 'data'),
+              State('table_adapt_param', 'data'),
+              State('table_model_Q', 'data'),
+              State('table-geo', 'data'),
+              State('table_wells', 'data'),
+              State('table_model_wells', 'data'))
+def on_adapt(n_clicks, job, rows_in_adapt, rows_in_q, rows_in_geo, rows_in_wells, rows_in_model_wells):
+    if not n_clicks or not rows_in_q or not rows_in_wells:
+        raise PreventUpdate
+    # предыдущая адаптация больше не нужна
+    if job and job.get('id'):
+        job_queue.cancel(job['id'])
+    B = float(rows_in_geo[0]['Value'])
+    k = float(rows_in_geo[1]['Value']) * 10 ** (-15)  # [m2]
+    h = float(rows_in_geo[2]['Value'])
+    f = float(rows_in_geo[3]['Value'])
+    ct = float(rows_in_geo[4]['Value']) * 10 ** (-6)
+    mu = float(rows_in_geo[5]['Value']) * 10 ** (-3)
+    PI = float(rows_in_geo[6]['Value'])  # [МПа]
+    k_min = table_values(rows_in_adapt, 'Проницаемость мин, мД')
+    k_max = table_values(rows_in_adapt, 'Проницаемость макс, мД')
+    s_min = table_values(rows_in_adapt, 'Скин-фактор мин')
+    s_max = table_values(rows_in_adapt, 'Скин-фактор макс')
+    c_min = table_values(rows_in_adapt, 'Коэффициент ВСС мин, м3/МПа')
+    c_max = table_values(rows_in_adapt, 'Коэффициент ВСС макс, м3/МПа')
+    radii = table_values(rows_in_model_wells, 'Радиус скважины, м')
+
+    names, wells, schedules, observations, k_bounds, rw = [], [], [], [], [], []
+    for row in rows_in_wells:
+        well = str(row.get('Скважина', None))
+        t_change, rate, p_meas = schedule_from_table(rows_in_q, well)
+        try:
+            xy = [float(row.get('X координата')), float(row.get('Y координата'))]
+        except (TypeError, ValueError):
+            continue
+        if t_change.size == 0:
+            continue
+        names.append(well)
+        wells.append(xy)
+        schedules.append((t_change, rate))
+        measured = np.isfinite(p_meas)
+        observations.append((t_change[measured], p_meas[measured]))
+        k_bounds.append([k_min.get(well, k * 1e15 / 10) * 1e-15, k_max.get(well, k * 1e15 * 10) * 1e-15])
+        rw.append(radii.get(well, 0.1))
+    if not names or not any(p.size for _, p in observations):
+        return no_update, True, 'Нет замеров давления для адаптации'
+    # скин и ВСС подбираются, если для них заданы границы
+    fit_skin = bool(s_min and s_max)
+    fit_storage = bool(c_min and c_max)
+    skin_bounds = (min(s_min.values(), default=SKIN_BOUNDS[0]), max(s_max.values(), default=SKIN_BOUNDS[1]))
+    # ВСС подбирается в логарифме: [м3/МПа] -> lg([м3/Па])
+    log_storage_bounds = (np.log10(max(min(c_min.values(), default=1e-8), 1e-8) * 1e-6),
+                          np.log10(max(max(c_max.values(), default=1.0), 1e-7) * 1e-6))
+    problem = Problem(wells, schedules, observations, rw, k_bounds, PI, B, h, mu, f, ct,
+                      kernel=pd_ei, kernel_lapl=pd_lapl, fit_skin=fit_skin, fit_storage=fit_storage,
+                      skin_bounds=skin_bounds, log_storage_bounds=log_storage_bounds)
+    job = {'id': job_queue.submit(history_match_job, problem), 'names': names,
+           'observations': [[t_obs.tolist(), p_obs.tolist()] for t_obs, p_obs in observations],
+           'fit_skin': fit_skin, 'fit_storage': fit_storage}
+    return job, False, 'Адаптация: в очереди'
+
+
+@app.callback(Output("graph_apadt_press", 'figure'),
+              Output('adapt_poll', 'disabled', allow_duplicate=True),
+              Output('adapt-status', 'children', allow_duplicate=True),
+              Input('adapt_poll', 'n_intervals'),
+              State('local_adapt', 'data'),
+              prevent_initial_call=True)
+def on_adapt_job(n_intervals, job):
+    if not job or not job.get('id'):
+        return no_update, True, no_update
+    status = job_queue.status(job['id'])
+    if status['state'] in (ERROR, CANCELLED, UNKNOWN):
+        return no_update, True, 'Адаптация прервана: {}'.format(status['error'] or status['state'])
+    if status['state'] != DONE:
+        return no_update, False, 'Адаптация: {:.0f}%'.format(100 * status['progress'])
+    result = job_queue.result(job['id'], pop=True)
+    names, fit_skin, fit_storage = job['names'], job['fit_skin'], job['fit_storage']
+    observations = [(np.array(t_obs), np.array(p_obs)) for t_obs, p_obs in job['observations']]
+
+    fig = go.Figure()
+    for i, well in enumerate(names):
+        t_obs, p_obs = observations[i]
+        fig.add_trace(go.Scatter(x=t_obs / 3600, y=p_obs, mode='markers', name="Замер {}".format(well)))
+        fig.add_trace(go.Scatter(x=t_obs / 3600, y=result['pressure'][i],
+                                 name="Модель {}: k = {:.1f} мД".format(well, result['k'][i] * 1e15)))
+    fig.update_layout(height=500, width=700, paper_bgcolor="rgba(0, 0, 0, 0)", margin=dict(l=0, r=0, t=0, b=0),
+                      xaxis_title="t, ч", yaxis_title="Давление, МПа")
+    summary = ', '.join('{}: k = {:.1f} мД{}{}'.format(
+        well, result['k'][i] * 1e15,
+        ', S = {:.2f}'.format(result['skin'][i]) if fit_skin else '',
+        ', C = {:.3g} м3/МПа'.format(result['storage'][i] * 1e6) if fit_storage else '')
+        for i, well in enumerate(names))
+    return fig, True, 'Адаптация: {} (СКО {:.3f} МПа)'.format(summary, result['rmse'])
+
+
+@app.callback(Output("graph_press_rate", 'figure'),
+              Input('table_model_Q', 'data'),
+              Input('table-geo', 'data'),
+              State('table_wells', 'data'),
+              State('table_model_wells', 'data'))
+def on_rate_history(rows_in_q, rows_in_geo, rows_in_wells, rows_in_model_wells):
+    if not rows_in_q or not rows_in_wells:
+        raise PreventUpdate
+    B = float(rows_in_geo[0]['Value'])
+    k = float(rows_in_geo[1]['Value']) * 10 ** (-15)  # [m2]
+    h = float(rows_in_geo[2]['Value'])
+    f = float(rows_in_geo[3]['Value'])
+    ct = float(rows_in_geo[4]['Value']) * 10 ** (-6)
+    mu = float(rows_in_geo[5]['Value']) * 10 ** (-3)
+    PI = float(rows_in_geo[6]['Value'])  # [МПа]
+    eta_geo = k / (mu * f * ct)
+    # радиусы скважин из table_model_wells
+    radii = table_values(rows_in_model_wells, 'Радиус скважины, м')
+
+    fig = make_subplots(specs=[[{"secondary_y": True}]])
+    for row in rows_in_wells:
+        well = row.get('Скважина', None)
+        t_change, rate, p_meas = schedule_from_table(rows_in_q, well)
+        if t_change.size == 0:
+            continue
+        r_w = radii.get(str(well), 0.1)
+        # забойное давление по графику дебита: свертка отклика на единичный дебит
+        t_out = np.linspace(t_change.min(), t_change.max() * 1.1, 500)
+        dp = convolve_rates(lambda tt: pd_ei(r_w, tt, q = 1, B = B, k = k, h = h, mu = mu, eta = eta_geo, f = f),
+                            t_change, rate, t_out)
+        fig.add_trace(go.Scatter(x=t_out / 3600, y=PI - dp / 1000000, name="Модель {}".format(well)))
+        if np.isfinite(p_meas).any():
+            fig.add_trace(go.Scatter(x=t_change / 3600, y=p_meas, mode='markers', name="Замер {}".format(well)))
+        fig.add_trace(go.Scatter(x=np.append(t_change, t_out[-1]) / 3600, y=np.append(rate, rate[-1]) * 86400,
+                                 line=dict(shape='hv', dash='dot'), name="Дебит {}".format(well)), secondary_y=True)
+    fig.update_layout(height=500, width=700, paper_bgcolor="rgba(0, 0, 0, 0)", margin=dict(l=0, r=0, t=0, b=0))
+    fig.update_xaxes(title_text="t, ч")
+    fig.update_yaxes(title_text="Давление, МПа", secondary_y=False)
+    fig.update_yaxes(title_text="Дебит, м3/сут", secondary_y=True)
+    return fig
+
+
+
+# Чтение загруженного файла манометра: первый столбец - время [ч], второй - давление [МПа];
+# содержимое разбирается в памяти блоками с прореживанием в логарифме времени (файловая система
+# сервера не затрагивается), массивы остаются в result_store
+@app.callback(Output('local_gauge', 'data'),
+              Output('gauge-status', 'children'),
+              Input('gauge-upload', 'contents'),
+              State('gauge-upload', 'filename'),
+              State('gauge-well', 'value'))
+def on_gauge(contents, filename, well):
+    if not contents:
+        raise PreventUpdate
+    filename = os.path.basename(filename or 'gauge')
+    try:
+        text = base64.b64decode(contents.split(',', 1)[1]).decode('utf-8', errors='replace')
+        sep = ',' if filename.lower().endswith('.csv') else None
+        gauge = read_gauge(io.StringIO(text), columns=[1], time_column=0, sep=sep, time_scale=3600)
+    except (ValueError, KeyError, IndexError) as error:
+        return no_update, 'Не удалось прочитать {}: {}'.format(filename, error)
+    if gauge['t'].size == 0:
+        return no_update, 'В файле {} нет замеров'.format(filename)
+    data = {'well': well or os.path.splitext(filename)[0], 't': result_store.put(gauge['t']),
+            'p': result_store.put(gauge['values'][:, 0])}
+    return data, 'Загружено {} узлов ({})'.format(gauge['t'].size, gauge['columns'][0])
+
+
+# Подписи режимов течения на диагностическом графике
+REGIME_NAMES = {STORAGE: 'ВСС', RADIAL: 'Радиальный режим', BOUNDARY: 'Влияние границ'}
 
 
+@app.callback(Output("graph_diagnostic", 'figure'),
+              Input('local_param', 'modified_timestamp'),
+              Input('table_model_Q', 'data'),
+              Input('diagnostic-window', 'value'),
+              Input('local_gauge', 'data'),
+              State('local_param', 'data'),
+              State('table-geo', 'data'),
+              State('table_wells', 'data'))
+def on_diagnostic(ts, rows_in_q, window, gauge, data, rows_in_geo, rows_in_wells):
+    window = float(window or DEFAULT_WINDOW)
+    PI = float(rows_in_geo[6]['Value'])  # [МПа]
+    series = []
+    # модель: депрессия на забое первой скважины (t в секундах, dp в МПа)
+    if data is not None:
+        try:
+            t, dp = resolve_store(data)
+        except PreventUpdate:
+            t, dp = [], []
+        if len(t) > 2:
+            series.append(('Модель', np.asarray(t) / 3600, np.asarray(dp)))
+    # замеры: депрессия относительно начального пластового давления
+    for row in rows_in_wells or []:
+        well = row.get('Скважина', None)
+        t_change, rate, p_meas = schedule_from_table(rows_in_q, well)
+        if np.isfinite(p_meas).sum() > 2:
+            series.append(('Замер {}'.format(well), t_change / 3600, PI - p_meas))
+    # файл манометра (уже прореженный при чтении)
+    if gauge is not None:
+        try:
+            t, p = resolve_store([gauge['t'], gauge['p']])
+            series.append(('Манометр {}'.format(gauge['well']), np.asarray(t) / 3600, PI - np.asarray(p)))
+        except PreventUpdate:
+            pass
+    if not series:
+        raise PreventUpdate
+
+    fig = go.Figure()
+    regimes = []
+    for name, t, dp in series:
+        result = diagnostic(t, dp, window=window)
+        mode = 'lines' if name == 'Модель' else 'markers'
+        fig.add_trace(go.Scatter(x=result['t'], y=result['dp'], mode=mode, name="dp {}".format(name)))
+        fig.add_trace(go.Scatter(x=result['t'], y=result['derivative'], mode=mode, name="dp' {}".format(name),
+                                 line=dict(dash='dash')))
+        # режимы показываются по замерам, если они есть, иначе по модели
+        regimes = result['regimes']
+    for regime, t_start, t_end in regimes:
+        fig.add_vrect(x0=t_start, x1=t_end, opacity=0.1, line_width=0, fillcolor='gray',
+                      annotation_text=REGIME_NAMES.get(regime, regime), annotation_position='top left')
+    fig.update_layout(height=500, width=700, paper_bgcolor="rgba(0, 0, 0, 0)", margin=dict(l=0, r=0, t=0, b=0))
+    fig.update_xaxes(type='log', title_text="t, ч")
+    fig.update_yaxes(type='log', title_text="dp, dp', МПа")
+    return fig
+
+
+
+# Прогноз дебитов при постоянном забойном давлении (table_predict_param: время прогноза и
+# забойное давление по скважинам) с учетом интерференции скважин (ars/forecast.py).
+# Шаг прогноза - сутки (час для прогноза короче 10 суток); ряды остаются в result_store
+@app.callback(Output('graph_predict_param', 'figure'),
+              Output('local_predict', 'data'),
+              Input('table_predict_param', 'data'),
+              Input('table_predict_param', 'columns'),
+              State('table-geo', 'data'),
+              State('table_wells', 'data'))
+def on_forecast(rows_in_predict, columns, rows_in_geo, rows_in_wells):
+    names, wells, pwf, horizon = parse_forecast(rows_in_wells, rows_in_predict)
+    if not names:
+        raise PreventUpdate
+    params = geo_params({row['Parameter']: row['Value'] for row in rows_in_geo})
+    horizon = horizon or DEFAULT_HORIZON
+    step = 86400 if horizon >= 10 * 86400 else 3600
+    t = np.arange(1, int(np.ceil(horizon / step)) + 1) * float(step)
+    rate, cumulative = constant_pressure_rates(t, params['PI'] - pwf, wells, B=params['B'], k=params['k'],
+                                               h=params['h'], mu=params['mu'], f=params['f'], ct=params['ct'])
+
+    days = t / 86400
+    fig = make_subplots(specs=[[{"secondary_y": True}]])
+    for i, name in enumerate(names):
+        fig.add_trace(go.Scatter(x=days, y=rate[:, i] * 86400, name="Дебит {}".format(name)))
+    fig.add_trace(go.Scatter(x=days, y=cumulative.sum(axis=1), name="Накопленная добыча",
+                             line=dict(dash='dash', color='black')), secondary_y=True)
+    fig.update_layout(height=500, width=700, paper_bgcolor="rgba(0, 0, 0, 0)", margin=dict(l=0, r=0, t=0, b=0))
+    fig.update_xaxes(title_text="t, сут")
+    fig.update_yaxes(title_text="Дебит, м3/сут", secondary_y=False)
+    fig.update_yaxes(title_text="Накопленная добыча, м3", secondary_y=True)
+    data = {'names': names, 'series': encode_result([t, rate.T, cumulative.T])[0]}
+    return fig, data
+
+
+# Экономика прогноза: накопленная добыча, выручка, NPV и срок окупаемости ГТМ по скважинам
+# (параметры - table_predict_econom, профили добычи - local_predict из прогноза)
+@app.callback(Output('graph_predict_econom', 'figure'),
+              Output('table_econom_result', 'data'),
+              Output('econom-status', 'children'),
+              Input('local_predict', 'data'),
+              Input('table_predict_econom', 'data'),
+              Input('table_predict_econom', 'columns'))
+def on_economics(predict, rows_in_econom, columns):
+    if not predict:
+        raise PreventUpdate
+    names = predict['names']
+    t, rate, cumulative = resolve_store(predict['series'])
+    try:
+        params = parse_economics(rows_in_econom, names)
+    except ValueError as error:
+        return no_update, [], 'Экономика не рассчитана: {}'.format(error)
+    result = evaluate(t, cumulative=cumulative, **params)
+
+    days = t / 86400
+    fig = go.Figure()
+    for i, name in enumerate(names):
+        fig.add_trace(go.Scatter(x=days, y=result['cash_flow'][i] / 1000, name="ДДП {}".format(name)))
+    fig.update_layout(height=400, width=700, paper_bgcolor="rgba(0, 0, 0, 0)", margin=dict(l=0, r=0, t=0, b=0))
+    fig.update_xaxes(title_text="t, сут")
+    fig.update_yaxes(title_text="Накопленный дисконтированный поток, тыс. руб")
+    table = [dict(zip(ECONOMY_RESULT_COLUMNS, [name, round(float(result['production'][i, -1]), 1),
+                                                round(float(result['revenue'][i]) / 1000, 1),
+                                                round(float(result['npv'][i]) / 1000, 1),
+                                                round(float(result['payback'][i]) / 86400, 1)
+                                                if np.isfinite(result['payback'][i]) else 'не окупается']))
+             for i, name in enumerate(names)]
+    return fig, table, 'NPV по скважинам: {:.1f} тыс. руб'.format(result['npv'].sum() / 1000)
+
+
+@app.callback(Output('table_metrics', 'data'),
+              Input('metrics_poll', 'n_intervals'))
+def on_metrics(n_intervals):
+    rows = []
+    for name, entry in metrics.snapshot().items():
+        values = [name, entry['count']] + [round(entry[key], 2) for key in
+                                           ('mean_ms', 'p50_ms', 'p90_ms', 'p99_ms', 'max_ms')]
+        values.append(round(entry['bytes_p50']) if 'bytes_p50' in entry else '')
+        rows.append(dict(zip(METRICS_COLUMNS, values)))
+    return rows
+
 
 # Запуск
 if __name__ == '__main__':
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+from ars.bounded import circle_pressure
+from ars.diagnostics import BOUNDARY, RADIAL, STORAGE, diagnostic
+from ars.history_matching import unit_response
+from ars.solutions import B, eta, h, k, mu, pd_ei, pd_lapl, q, rw
+
+
+def regimes(t, dp):
+    return [regime for regime, _, _ in diagnostic(t, dp)['regimes']]
+
+
+# Закрытый круговой пласт: наклон 1 псевдоустановившегося режима - граница, а не ВСС,
+# и с радиальным участком в начале, и без него (ряд начинается после ухода с радиального)
+def test_closed_circle_is_boundary_not_storage():
+    for first in (1, 4):
+        t = np.logspace(first, 8, 200)
+        dp = circle_pressure(np.zeros((1, 2)), [q], np.array([rw]), np.array([0.0]), t, r_e=30, B=B, k=k, h=h,
+                             mu=mu, eta=eta, r_min=rw)[0]
+        found = regimes(t, dp)
+        assert STORAGE not in found
+        assert found[-1] == BOUNDARY
+        assert (found[0] == RADIAL) == (first == 1)
+
+
+# ВСС в начале ряда по-прежнему определяется
+def test_wellbore_storage_then_radial():
+    U = unit_response(pd_ei, pd_lapl, rw, k, 0.0, 1e-7, B, h, mu, 0.3, 2.47e-9)
+    t = np.logspace(0, 7, 250)
+    assert regimes(t, q * U(t)) == [STORAGE, RADIAL]
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+import threading
+
+from ars.jobs import CANCELLED, DONE, PENDING, RUNNING, JobQueue
+
+
+def wait(event):
+    event.wait(5)
+    return 'done'
+
+
+# Выполняющуюся задачу отменить нельзя: cancel возвращает False, результат остается доступен;
+# ожидающая в очереди задача снимается
+def test_cancel_running_and_pending():
+    queue = JobQueue(max_workers=1, kind='thread')
+    started, release = threading.Event(), threading.Event()
+    try:
+        running = queue.submit(lambda: (started.set(), wait(release))[1])
+        pending = queue.submit(wait, release)
+        assert started.wait(5)
+        assert queue.status(running)['state'] == RUNNING
+        assert queue.status(pending)['state'] == PENDING
+        assert not queue.cancel(running)
+        assert queue.cancel(pending)
+        assert queue.status(running)['state'] == RUNNING
+        assert queue.status(pending)['state'] == CANCELLED
+        release.set()
+        assert queue.result(running, timeout=5) == 'done'
+        assert queue.status(running)['state'] == DONE
+        assert not queue.cancel(running)
+        assert not queue.cancel('missing')
+    finally:
+        release.set()
+        queue.shutdown()
@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from ars.bounded import CONSTANT_PRESSURE, MIXED
+from ars.scenarios import boundary_names, model_params
+
+
+# Смешанные границы не определены для кругового пласта: отказ до постановки расчета в очередь
+def test_circle_rejects_mixed_boundary():
+    assert 'Смешанные' not in boundary_names('Круговой')
+    with pytest.raises(ValueError):
+        model_params({}, [], [], 'Круговой', 'Смешанные')
+
+
+def test_supported_boundaries_pass():
+    assert model_params({}, [], [], 'Круговой', 'Постоянное давление')['boundary'] == CONSTANT_PRESSURE
+    assert model_params({}, [], [], 'Прямоугольный параллелепипед', 'Смешанные')['boundary'] == MIXED